@@ -3,6 +3,7 @@ import os
 import pathlib
 import re
 import sys
+from typing import Dict, Tuple
 
 import loguru
 from loguru import logger as log
@@ -13,7 +14,7 @@ from myTunes.service.util import create_dirs
 __all__ = ('cfg', 'log', 'KNOWN_FORMAT', 'LOSSLESS_FORMAT', 'ROOT_DIR')
 
 
-LOSSLESS_FORMAT = set('wav,flac,aiff,ape'.split(','))
+LOSSLESS_FORMAT = set('wav,flac,aiff,ape,wv'.split(','))
 KNOWN_FORMAT = set('aac,m4a,mp3,ogg,mp4,wma,opus,m4r,mp2'.split(',')).union(LOSSLESS_FORMAT)
 ROOT_DIR = pathlib.Path(__file__).parent.parent
 sys.path.append(os.path.join(os.getcwd(), ".."))
@@ -69,6 +70,31 @@ class Settings:
     ffmpeg: str
     qaac: str
     threads: int
+    pipeWav: bool
+    batchDuration: float
+    batchSize: int
+    timeout: float
+    schedule: str
+    costFile: str
+    autotune: bool
+    autotuneMin: int
+    autotuneMax: int
+    autotuneFile: str
+    segmentDuration: float
+    journalFile: str
+    sync: bool
+    syncDelete: bool
+    retag: bool
+    cachePath: str
+    cacheSize: int
+    copyMode: str
+    tagPadding: int
+    profiles: Dict[str, Dict[str, str]]
+    ioThreads: int
+    saveThreads: int
+    deviceLimit: int
+    encoderLimits: Dict[str, int]
+    devices: Dict[str, Tuple[str, int]]
 
     def __init__(self, inifile: str):
         self.config = configparser.RawConfigParser(allow_no_value=True)
@@ -89,6 +115,57 @@ class Settings:
         self.ffmpeg = self.config.get('converter', 'ffmpeg')
         self.qaac = self.config.get('converter', 'qaac')
         self.threads = self.config.getint('converter', 'threads')
+        self.pipeWav = self.config.getboolean('converter', 'pipe_wav', fallback=True)
+        self.batchDuration = self.config.getfloat('converter', 'batch_duration', fallback=30)
+        self.batchSize = self.config.getint('converter', 'batch_size', fallback=16)
+        self.timeout = self.config.getfloat('converter', 'timeout', fallback=300)
+        self.schedule = self.config.get('converter', 'schedule', fallback='lpt').lower()
+        self.costFile = self.config.get('converter', 'cost_file', fallback='costs.json')
+        self.autotune = self.config.getboolean('converter', 'autotune', fallback=False)
+        self.autotuneMin = self.config.getint('converter', 'autotune_min', fallback=1)
+        self.autotuneMax = self.config.getint('converter', 'autotune_max', fallback=0)
+        self.autotuneFile = self.config.get('converter', 'autotune_file', fallback='autotune.json')
+        # long sources are encoded by segments at once
+        self.segmentDuration = self.config.getfloat('converter', 'segment_duration', fallback=0)
+        # finished outputs are recorded, so interrupted conversion is resumed. Empty name disables
+        self.journalFile = self.config.get('converter', 'journal_file', fallback='journal.jsonl')
+        # sources not changed since last sync into output folder are skipped
+        self.sync = self.config.getboolean('converter', 'sync', fallback=False)
+        self.syncDelete = self.config.getboolean('converter', 'sync_delete', fallback=False)
+        # synced source with new tags and the same audio gives tags to outputs without conversion
+        self.retag = self.config.getboolean('converter', 'retag', fallback=True)
+        # store of encoded outputs. Empty path disables
+        self.cachePath = self.config.get('converter', 'cache_path', fallback='')
+        self.cacheSize = self.config.getint('converter', 'cache_size_mb', fallback=4096) * 1024 * 1024
+        # how sources which are not encoded are copied, see service.copier
+        self.copyMode = self.config.get('converter', 'copy_mode', fallback='auto').lower()
+        # free space after tags, so next tag edits don't rewrite whole file
+        self.tagPadding = self.config.getint('converter', 'tag_padding_kb', fallback=64) * 1024
+
+        # extra outputs from [profile <name>] sections
+        self.profiles = {}
+        for section in self.config.sections():
+            if section.startswith('profile '):
+                self.profiles[section[8:].strip()] = dict(self.config.items(section))
+
+        # copies and encodes have own workers and limits
+        self.ioThreads = self.config.getint('limits', 'io_threads', fallback=2)
+        self.deviceLimit = self.config.getint('limits', 'device', fallback=2)
+        # tag saves at once
+        self.saveThreads = self.config.getint('limits', 'save_threads', fallback=4)
+        self.encoderLimits = {}
+        if self.config.has_section('limits'):
+            for key, value in self.config.items('limits'):
+                if key not in ('io_threads', 'device', 'save_threads'):
+                    self.encoderLimits[key] = int(value)
+
+        # [device <name>] sections: path on device and copies limit for it
+        self.devices = {}
+        for section in self.config.sections():
+            if section.startswith('device '):
+                self.devices[section[7:].strip()] = (
+                    self.config.get(section, 'path'),
+                    self.config.getint(section, 'limit', fallback=self.deviceLimit))
 
     def save(self):
         self.config.set('converter', 'ffmpeg', self.ffmpeg)
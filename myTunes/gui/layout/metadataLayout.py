@@ -21,6 +21,7 @@ from myTunes.gui.layout.popup import ErrorBox
 from .coverLayout import CoverLayout
 from myTunes.model.settings import CoverSettings
 from myTunes.service.afileState import AfileState
+from myTunes.service.util import convert_to_jpeg
 
 __all__ = ('MetadataLayout',)
 
@@ -52,6 +53,11 @@ class MetadataLayout(QVBoxLayout):
         self.buttonSave.accepted.connect(self.save_afile_meta)
         group.addWidget(self.buttonSave)
 
+        self.buttonPlan = QDialogButtonBox()
+        self.buttonPlan.addButton('Dry run', QDialogButtonBox.ButtonRole.ApplyRole)
+        self.buttonPlan.clicked.connect(lambda: self.start(dryRun=True))
+        group.addWidget(self.buttonPlan)
+
         self.buttonStart = QDialogButtonBox()
         self.buttonStart.addButton('Start', QDialogButtonBox.ButtonRole.AcceptRole)
         self.buttonStart.accepted.connect(self.start)
@@ -201,16 +207,43 @@ class MetadataLayout(QVBoxLayout):
                 tasks.append(ConverterTask(
                     afile=self._afileState.afiles[afileId],
                     qTreePath=path,
-                    ext=ext
+                    ext=ext,
+                    edits=self._pending_edits(afileId)
                 ))
         return tasks
 
+    def _pending_edits(self, afileId: int) -> Dict[str, any]:
+        """
+        tags and cover of file which are edited and not saved. Outputs get them, source is not changed
+        """
+        afile = self._afileState.afiles[afileId]
+        selected = self._afileState.selectedAfilesId
+        edits: Dict[str, any] = {}
+        if afileId in selected:
+            # fields show the first selected file, only values common for all files are edited for few files
+            for tag in TAGS:
+                if not (tag.multiTag or len(selected) == 1):
+                    continue
+                text = self._treeView.tagsLayout.tags[tag.name].text()
+                value = afile[tag.name].first
+                if text != ('' if value is None else str(value)):
+                    edits[tag.name] = text
+
+        acover = self._afileState.acovers.get(afileId)
+        if acover is not None and acover.path and not acover.saved:
+            with open(acover.path, 'rb') as f:
+                img = f.read()
+            if acover.quality < 100:
+                img = convert_to_jpeg(img, progressive=acover.jpegNext, quality=acover.quality)
+            edits['artwork'] = img
+        return edits
+
     def set_output_folder(self) -> None:
         dir = QFileDialog.getExistingDirectory()
         if dir:
             self.outputFolder.setText(dir)
 
-    def start(self) -> None:
+    def start(self, dryRun=False) -> None:
         paramMap = self._activeEncoder.settings.guiSettings
         settings: Dict[str, any] = {}
         # coverSettings = CoverSettings(
@@ -255,11 +288,15 @@ class MetadataLayout(QVBoxLayout):
             tasks = self._take_tasks_recursive(self._treeView.rootParent, [])
             self.enable_controls(False)
             self.processWindow.create_window()
-            self.processWindow.process(tasks, self.outputFolder.text())
+            if dryRun:
+                self.processWindow.plan(tasks, self.outputFolder.text())
+            else:
+                self.processWindow.process(tasks, self.outputFolder.text())
             self.enable_controls(True)
 
     def enable_controls(self, on:bool):
         self.buttonStart.setEnabled(on)
+        self.buttonPlan.setEnabled(on)
         self.buttonSave.setEnabled(on)
         self.buttonRename.setEnabled(on)
         self.processWindow.buttonClose.setEnabled(on)
@@ -279,11 +316,7 @@ class MetadataLayout(QVBoxLayout):
         encoder = self._converter.encoderName[self.encoder.itemText(index)]
         print('set encoder', encoder.name)
 
-        if encoder.name == 'QAAC':
-            self._activeEncoder = self._converter.qaac
-        else:
-            self._activeEncoder = self._converter.ffmpeg
-        
+        self._activeEncoder = encoder
         self._converter.encoder = self._activeEncoder
 
         for lo in self._parameterLayout:
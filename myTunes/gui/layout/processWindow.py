@@ -1,14 +1,15 @@
 import time
-from queue import Queue
-from typing import List, Dict, Tuple
+from typing import List, Dict
 
-from PyQt6.QtCore import Qt, QThread
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QColor
 from PyQt6.QtWidgets import QWidget, QHBoxLayout, QDialogButtonBox, QVBoxLayout, QLabel, \
-    QListWidget, QProgressBar, QScrollBar, QScrollArea, QApplication
+    QListWidget, QListWidgetItem, QProgressBar, QScrollBar, QScrollArea, QApplication
 
 from config import log, cfg
 from service.converter import Converter
-from service.converterTask import ConverterTask
+from service.converterTask import ConverterTask, ConverterBatch
+from service.engine import Engine, EngineEvent
 from service.handler import Handler
 
 
@@ -44,37 +45,90 @@ class ProcessWindow(QWidget):
         self.buttonStop.addButton('Stop', QDialogButtonBox.ButtonRole.AcceptRole)
         self.buttonStop.clicked.connect(self.break_process)
         group.addWidget(self.buttonStop)
+
+        self.buttonPause = QDialogButtonBox()
+        self.pauseButton = self.buttonPause.addButton('Pause', QDialogButtonBox.ButtonRole.ActionRole)
+        self.buttonPause.clicked.connect(self.pause_process)
+        group.addWidget(self.buttonPause)
         layout.addLayout(group)
         
+        self.colors = {
+            'white': '#ffffff',
+            'black': '#000000',
+            'red': '#de5d70',
+            'blue': '#badeff',
+            'yellow': '#faef5a'
+        }
         self.progressBar: Dict[int, QProgressBar] = {}
         self.progressName: Dict[int, QLabel] = {}
         self.converter = converter
-        self.queue: Queue[ConverterTask | str] = Queue()
-        self.handlers: Dict[int, QThread] = {}
+        self.engine: Engine | None = None
+        self.handler: Handler | None = None
         self.replaceOutfile = True
         self.allDone = True
     
     def break_process(self):
         self.buttonStop.setEnabled(False)
+        self.buttonPause.setEnabled(False)
         
-        n = 0
-        while n < len(self.handlers):
-            task: str = self.queue.get()
-            self.queue.task_done()
-            if task == '--stop--':
-                self.queue.put(task)
-                n += 1
-            else:
-                log.info(f'cancel: {task.afile.filename}')
-                self.logPage.insertItem(0, f'Cancel: {task.fileOut}')
+        # running encoders are killed, their partial outputs and temp files are removed
+        if self.engine is not None:
+            self.engine.cancel(kill=True)
+
+    def pause_process(self):
+        if self.engine is None:
+            return
+
+        # encoders are stopped and continue from the same place
+        if self.engine.token.paused:
+            self.engine.resume()
+            self.pauseButton.setText('Pause')
+        else:
+            self.engine.pause()
+            self.pauseButton.setText('Resume')
 
     def close(self):
         if self.allDone:
             self.destroy()
 
-    def set_progress(self, values: Tuple[int, int]):
-        name, value = values
-        self.progressBar[name].setValue(value)
+    def log_item(self, msg: str, color: str = 'transparent'):
+        item = QListWidgetItem(msg)
+
+        item.setBackground(QColor(self.colors.get(color, 'transparent')))
+        self.logPage.insertItem(0, item)
+
+    def on_event(self, event: EngineEvent):
+        if event.kind == 'progress':
+            self.set_progress(event.slot, event.progress.percent, event.progress.speed, event.progress.eta)
+        elif event.kind == 'start':
+            self.progressName[event.slot].setText(event.name)
+            self.set_progress(event.slot, 0, 0.0, -1.0)
+        elif event.kind == 'done':
+            self.log_item(f'Done: {event.name}')
+        elif event.kind == 'remux':
+            self.log_item(f'Remux: {event.name}')
+        elif event.kind == 'copy':
+            self.log_item(f'Copy: {event.name}')
+        elif event.kind == 'exists':
+            self.log_item(f'Exists: {event.name}', 'blue')
+        elif event.kind == 'unchanged':
+            self.log_item(f'Unchanged: {event.message}', 'blue')
+        elif event.kind == 'retag':
+            self.log_item(f'Tags: {event.name}')
+        elif event.kind == 'delete':
+            self.log_item(f'Delete: {event.name}', 'yellow')
+        elif event.kind == 'error':
+            self.log_item(f'Error: {event.name}: {event.message}', 'red')
+        elif event.kind == 'cancel':
+            self.log_item(f'Cancel: {event.name}')
+
+    def set_progress(self, slot: int, value: int, speed: float, eta: float):
+        self.progressBar[slot].setValue(value)
+
+        if speed and eta >= 0:
+            self.progressBar[slot].setFormat(f'%p% {speed:.1f}x ETA {eta:.0f}s')
+        else:
+            self.progressBar[slot].setFormat('%p%')
     
     def create_window(self):
         self.logPage.clear()
@@ -88,7 +142,8 @@ class ProcessWindow(QWidget):
         self.progressBar.clear()
         self.progressName.clear()
         
-        for i in range(cfg.threads):
+        # encode workers, then copy workers
+        for i in range(Engine.slot_count(cfg.threads)):
             self.progressName[i] = QLabel('')
             self.progressGroup.addWidget(self.progressName[i])
             self.progressBar[i] = QProgressBar()
@@ -99,30 +154,41 @@ class ProcessWindow(QWidget):
             self.progressGroup.addWidget(self.progressBar[i])
         self.show()
     
+    def plan(self, files: List[ConverterTask], outPath: str):
+        """
+        show what process would do with files, nothing is written
+        """
+        plan = Engine(self.converter, outPath, self.replaceOutfile, cfg.threads).make_plan(files)
+        colors = {'exists': 'blue', 'skip': 'yellow', 'unchanged': 'blue'}
+        for item in plan.items:
+            outputs = item.outputs or ((item.kind, item.task.afile.filename, 0),)
+            for kind, fileName, _ in outputs:
+                self.log_item(f'{kind.capitalize()}: {fileName}', colors.get(kind, 'transparent'))
+        for line in reversed(plan.report()):
+            self.log_item(line, 'yellow' if line.startswith('renamed') else 'transparent')
+
     def process(self, files: List[ConverterTask], outPath: str):
-        assert self.queue.qsize() == 0, 'task queue is not empty'
+        assert self.handler is None or self.handler.isFinished(), 'previous process is running'
         self.buttonStop.setEnabled(True)
+        self.buttonPause.setEnabled(True)
+        self.pauseButton.setText('Pause')
         self.allDone = False
         
-        if outPath and outPath[-1] not in ('/', '\\'):
-            outPath += '/'
-        
-        for i in range(cfg.threads):
-            th = Handler(i, self.queue, self.progressName[i], self.logPage, self.converter,
-                         outPath, self.replaceOutfile)
-            th.setProgress.connect(self.set_progress)
-            self.handlers[i] = th
-            th.start()
-        
-        for i in files:
-            self.queue.put(i)
-        
-        for i in range(cfg.threads):
-            self.queue.put('--stop--')
+        # batches have one output, profiles are converted file by file
+        tasks: List[ConverterTask | ConverterBatch] = files
+        if self.converter.encoder.batch and cfg.batchDuration > 0 and not self.converter.profiles:
+            tasks = ConverterBatch.group(files, cfg.batchDuration, cfg.batchSize)
+
+        self.engine = Engine(self.converter, outPath, self.replaceOutfile, cfg.threads)
+        self.handler = Handler(self.engine, tasks)
+        self.handler.event.connect(self.on_event)
+        self.handler.start()
         
-        while not self.queue.empty():
+        while not self.handler.isFinished():
             QApplication.processEvents()
             time.sleep(.1)
-            
-        self.queue.join()
+        
+        # events queued by handler before finish
+        QApplication.processEvents()
+        self.buttonPause.setEnabled(False)
         self.allDone = True
@@ -1,6 +1,6 @@
 import os.path
 import time
-from typing import List, Generator, Any
+from typing import Dict, List
 
 from PyQt6.QtCore import Qt
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QProgressBar, QDialogButtonBox, QListWidget, QScrollBar, QApplication
@@ -8,8 +8,10 @@ from music_tag import AudioFile
 
 from service.util import convert_to_jpeg, ImageInfo, get_afile_img
 from service.afileState import AfileState, Acover
-from service.tagEditor import TAGS
-from config import log
+from service.tagEditor import TAGS, Tag
+from service.saveEngine import SaveEngine, SaveJob, SaveResult
+from service.handler import SaveHandler
+from config import log, cfg
 
 
 class SaveWindow(QWidget):
@@ -18,6 +20,12 @@ class SaveWindow(QWidget):
         self.allDone = True
         self.stop = False
         self._afileState = afileState
+        self.engine: SaveEngine | None = None
+        self.handler: SaveHandler | None = None
+        self._tags: Dict[str, Tag] = {i.name: i for i in TAGS}
+        self._coverFormat = ''
+        self._rewrites = 0
+        self._cancelled = 0
 
         self.setWindowTitle('Saving')
 
@@ -50,12 +58,14 @@ class SaveWindow(QWidget):
     def break_process(self):
         self.buttonStop.setEnabled(False)
         self.stop = True
+        # saves being written are finished, files are not left half written
+        if self.engine is not None:
+            self.engine.cancel()
         msg = 'cancel by user'
         log.info(msg)
         self.logPage.insertItem(0, msg)
 
-    def _process_cover(self, afiles: List[AudioFile], treeView: 'MetadataLayout') -> Generator[
-        AudioFile, AudioFile, None]:
+    def _cover_jobs(self, afiles: List[AudioFile]) -> List[SaveJob]:
         acoverMaster: Acover = self._afileState.acovers[int(afiles[0].qTreeViewRow[-1].text())]
 
         if acoverMaster.path:
@@ -66,75 +76,91 @@ class SaveWindow(QWidget):
             img = get_afile_img(afiles[0])
 
         if not img:
-            return
+            return []
 
         if acoverMaster.quality < 100:
             log.info('convert to jpeg with quality %s' % (acoverMaster.quality))
             img = convert_to_jpeg(img, progressive=acoverMaster.jpegNext, quality=acoverMaster.quality)
             QApplication.processEvents()
 
-        for n, afile in enumerate(afiles):
-            if self.stop:
-                break
+        self._coverFormat = ImageInfo(img).format
+        return [SaveJob(afile, {'artwork': img}) for afile in afiles]
 
-            afileId = int(afile.qTreeViewRow[-1].text())
-            self._afileState.acovers[afileId].saved = True
-            self._afileState.acovers[afileId].path = None
-            afile['artwork'] = img
-            afile.qTreeViewRow[19].setText(ImageInfo(afile['artwork'].first.data).format)
-            yield afile
-
-    def _process_meta(self, afiles: List[AudioFile], treeView: 'MetadataLayout') -> Generator[AudioFile, Any, None]:
+    def _meta_jobs(self, afiles: List[AudioFile], treeView: 'MetadataLayout') -> List[SaveJob]:
         fewFiles = len(afiles) > 1
-        for n, afile in enumerate(afiles):
-            if self.stop:
-                break
-
-            for tag in TAGS:
-                QApplication.processEvents()
+        # the same values are written into all files
+        tags = {tag.name: treeView.tagsLayout.tags[tag.name].text() for tag in TAGS
+                if tag.multiTag or not fewFiles}
+        return [SaveJob(afile, dict(tags)) for afile in afiles]
+
+    def on_batch(self, results: List[SaveResult]) -> None:
+        """
+        show saved files. Saved tags are set to files in memory and shown in tree
+        """
+        for result in results:
+            afile = result.job.afile
+            filename = os.path.basename(afile.filename)
 
-                if fewFiles and not tag.multiTag:
-                    continue
+            if result.kind == 'error':
+                log.error('save metadata %s: %s' % (filename, result.message))
+                self.logPage.insertItem(0, f'error: {filename}')
+                continue
+            if result.kind == 'cancel':
+                self._cancelled += 1
+                continue
+
+            log.debug('save %s' % filename)
+            if result.kind == 'rewritten':
+                self._rewrites += 1
+                self.logPage.insertItem(0, f'save (rewritten): {filename}')
+            else:
+                self.logPage.insertItem(0, f'save: {filename}')
 
-                val = treeView.tagsLayout.tags[tag.name].text()
-                if val == '':
-                    if tag.name in afile:
-                        del afile[tag.name]
+            result.job.apply(afile)
+            for name in result.job.tags:
+                if name == 'artwork':
+                    afileId = int(afile.qTreeViewRow[-1].text())
+                    self._afileState.acovers[afileId].saved = True
+                    self._afileState.acovers[afileId].path = None
+                    afile.qTreeViewRow[19].setText(self._coverFormat)
                 else:
-                    val = afile.get(tag.name).type(val)
-                    afile[tag.name] = val
-
-                afile.qTreeViewRow[tag.index].setText(str(val))
+                    afile.qTreeViewRow[self._tags[name].index].setText(str(afile[name]))
 
-            yield afile
+        self.progressBar.setValue(int(100 * self.engine.done / max(self.engine.total, 1)))
 
     def process(self, afiles: List[AudioFile], treeView: 'MetadataLayout', coverMode=False) -> None:
+        assert self.handler is None or self.handler.isFinished(), 'previous save is running'
         self.buttonStop.setEnabled(True)
         self.allDone = False
         self.stop = False
         self.logPage.clear()
+        self._rewrites = 0
+        self._cancelled = 0
 
         if coverMode:
-            processor = self._process_cover
+            jobs = self._cover_jobs(afiles)
         else:
-            processor = self._process_meta
+            jobs = self._meta_jobs(afiles, treeView)
 
-        for n, afile in enumerate(processor(afiles, treeView)):
-            filename = os.path.basename(afile.filename)
-
-            try:
-                afile.save()
-            except Exception as e:
-                log.error('save metadata %s: %s' % (filename, e))
-                self.logPage.insertItem(0, f'error: {filename}')
-            else:
-                log.debug('save %s' % filename)
-                self.logPage.insertItem(0, f'save: {filename}')
+        # files are saved by engine threads, GUI only gets results
+        self.engine = SaveEngine(treeView.tagEditor.load_file, treeView.tagEditor.save, cfg.saveThreads)
+        self.handler = SaveHandler(self.engine, jobs)
+        self.handler.batch.connect(self.on_batch)
+        self.handler.start()
 
-            self.progressBar.setValue(int(100 / len(afiles) * n))
+        while not self.handler.isFinished():
             QApplication.processEvents()
-            time.sleep(.1)
+            time.sleep(.05)
+
+        # batches queued by handler before finish
+        QApplication.processEvents()
 
+        if self._rewrites:
+            msg = f'{self._rewrites} files rewritten, tags did not fit into their padding'
+            log.info(msg)
+            self.logPage.insertItem(0, msg)
+        if self._cancelled:
+            self.logPage.insertItem(0, f'{self._cancelled} files not saved')
         self.progressBar.setValue(100)
         self.allDone = True
         self.buttonStop.setEnabled(False)
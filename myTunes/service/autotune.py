@@ -0,0 +1,137 @@
+import json
+import os
+from typing import Dict, Tuple
+
+
+__all__ = ('Autotuner', 'CpuSampler')
+
+
+class CpuSampler:
+    """
+    CPU busy and I/O wait fractions between samples. Read from /proc/stat, so values are known only
+    on Linux. Other platforms get zeros and tuning use throughput only.
+    """
+
+    def __init__(self):
+        self._last = self._read()
+
+    @staticmethod
+    def _read() -> Tuple[int, int, int] | None:
+        """
+        :return: total, idle and iowait jiffies of all CPUs
+        """
+        try:
+            with open('/proc/stat', 'r') as f:
+                values = [int(i) for i in f.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+
+        # user nice system idle iowait irq softirq steal ...
+        idle = values[3]
+        iowait = values[4] if len(values) > 4 else 0
+        return sum(values[:8]), idle, iowait
+
+    def sample(self) -> Tuple[float, float]:
+        """
+        :return: busy and iowait fractions [0-1] since last sample
+        """
+        current = self._read()
+        last, self._last = self._last, current
+        if current is None or last is None:
+            return 0.0, 0.0
+
+        total = current[0] - last[0]
+        if total <= 0:
+            return 0.0, 0.0
+
+        idle = current[1] - last[1]
+        iowait = current[2] - last[2]
+        return max(total - idle - iowait, 0) / total, iowait / total
+
+
+class Autotuner:
+    """
+    Tune worker count by measured throughput: audio seconds converted by all workers in one second.
+
+    Hill climbing: worker count is changed by one in the same direction while throughput grows
+    more than GAIN. When throughput falls direction is reversed, when it stays the same tuner
+    returns to the best count and stops. Saturated CPU stops growth, high I/O wait shrinks the pool.
+    The best count of each encoder profile is saved for next run.
+
+    Attributes:
+        key: encoder profile, like encoder name and settings
+        minWorkers:
+        maxWorkers:
+        workers: current count
+        best: count with best throughput
+        path: JSON file with best counts. Empty path means they are not saved
+    """
+    # seconds between measures
+    INTERVAL = 10.0
+    GAIN = 0.05
+    CPU_BUSY = 0.95
+    IO_WAIT = 0.3
+
+    def __init__(self, key: str, minWorkers: int, maxWorkers: int, default: int, path: str = ''):
+        self.key = key
+        self.minWorkers = max(minWorkers, 1)
+        self.maxWorkers = max(maxWorkers, self.minWorkers)
+        self.path = path
+        self._saved: Dict[str, int] = {}
+
+        if path and os.path.isfile(path):
+            try:
+                with open(path, 'r') as f:
+                    self._saved = {k: int(v) for k, v in json.load(f).items()}
+            except (OSError, ValueError, AttributeError):
+                self._saved = {}
+
+        self.workers = self._clamp(self._saved.get(key, default))
+        self.best = self.workers
+        self._bestThroughput = 0.0
+        self._last: float | None = None
+        self._direction = 1
+
+    def _clamp(self, workers: int) -> int:
+        return min(max(workers, self.minWorkers), self.maxWorkers)
+
+    def update(self, throughput: float, busy: float = 0.0, iowait: float = 0.0) -> int:
+        """
+        take measure of current worker count
+
+        :param throughput: audio seconds per second
+        :param busy: CPU busy fraction
+        :param iowait: CPU I/O wait fraction
+        :return: worker count for next interval
+        """
+        # more workers must give real gain to be the best
+        if throughput > self._bestThroughput * (1 + self.GAIN):
+            self.best, self._bestThroughput = self.workers, throughput
+
+        if self._last is not None and self._direction:
+            if throughput < self._last * (1 - self.GAIN):
+                self._direction = -self._direction
+            elif throughput < self._last * (1 + self.GAIN):
+                # no gain, stay with the best
+                self._direction = 0
+                self.workers = self.best
+        self._last = throughput
+
+        direction = self._direction
+        if iowait > self.IO_WAIT:
+            direction = -1
+        elif busy >= self.CPU_BUSY and direction > 0:
+            direction = 0
+
+        self.workers = self._clamp(self.workers + direction)
+        return self.workers
+
+    def save(self) -> None:
+        if not self.path:
+            return
+
+        self._saved[self.key] = self.best
+        tmpName = f'{self.path}.tmp'
+        with open(tmpName, 'w') as f:
+            json.dump(self._saved, f, indent=2, sort_keys=True)
+        os.replace(tmpName, self.path)
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict
+from uuid import uuid4
+
+
+__all__ = ('EncodeCache',)
+
+
+class EncodeCache:
+    """
+    Content addressed store of encoded outputs before tags are set. Key is audio payload hash of source
+    (see payload.payload_hash), encoder name, settings and output extension, so the same source
+    converted into other folder, renamed or restored from backup is not encoded again.
+    Store is limited by size, least recently used files are evicted. Index is written by save once per run,
+    files stored without index are overwritten by next store.
+
+    Outputs are copied, not hard linked: tags are written into output in place and would change
+    cached file through the shared inode.
+    Stored outputs may have tags which encoder copied from source, so tags of fetched output are replaced,
+    not merged (see TagEditor.save_file clear).
+
+    Attributes:
+        root: store directory
+        maxSize: max bytes of stored files
+        entries: key -> {file, size, used}. file is relative to root, used is time of last store or fetch
+        hits: outputs taken from store, kept between runs
+        misses: outputs not found in store
+    """
+    INDEX = 'index.json'
+
+    def __init__(self, root: str, maxSize: int):
+        self.root = root
+        self.maxSize = maxSize
+        self.entries: Dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        path = os.path.join(root, self.INDEX)
+        if os.path.isfile(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                self.entries = dict(index['entries'])
+                self.hits, self.misses = int(index['hits']), int(index['misses'])
+            except (OSError, ValueError, KeyError, TypeError):
+                # files without index are not used and are overwritten by next store
+                self.entries = {}
+        # limit may be lowered in settings
+        self._evict()
+
+    @property
+    def size(self) -> int:
+        return sum(i['size'] for i in self.entries.values())
+
+    @staticmethod
+    def key(payload: str, encoder: str, settings: str, ext: str) -> str:
+        """
+        :param payload: audio payload hash of source
+        :param encoder: encoder name
+        :param settings: encoder settings, see encoder.Settings.stringify
+        :param ext: output extension
+        """
+        return hashlib.sha1(f'{payload}|{encoder}|{settings}|{ext.lower()}'.encode('utf-8')).hexdigest()
+
+    def fetch(self, key: str, fileOut: str) -> bool:
+        """
+        copy stored output
+
+        :return: False if key is not in store
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False
+            entry['used'] = time.time()
+
+        try:
+            shutil.copyfile(os.path.join(self.root, entry['file']), fileOut)
+        except FileNotFoundError:
+            # removed by user
+            with self._lock:
+                self.entries.pop(key, None)
+                self.misses += 1
+            return False
+
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key: str, fileName: str) -> None:
+        """
+        copy encoded output into store before tags are set and evict old files
+
+        :param key: see key()
+        :param fileName: output
+        """
+        if os.path.getsize(fileName) > self.maxSize:
+            return
+
+        ext = os.path.splitext(fileName)[1]
+        name = f'{key[:2]}/{key}{ext}'
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmpName = f'{path}.{uuid4().hex}.tmp'
+        shutil.copyfile(fileName, tmpName)
+        os.replace(tmpName, path)
+
+        with self._lock:
+            self.entries[key] = {'file': name, 'size': os.path.getsize(path), 'used': time.time()}
+            self._evict()
+
+    def _evict(self) -> None:
+        size = self.size
+        for key in sorted(self.entries, key=lambda k: self.entries[k]['used']):
+            if size <= self.maxSize:
+                break
+            entry = self.entries.pop(key)
+            size -= entry['size']
+            try:
+                os.remove(os.path.join(self.root, entry['file']))
+            except OSError:
+                pass
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        return (f'{self.hits} hits, {self.misses} misses ({self.hits / total if total else 0:.0%}), '
+                f'{len(self.entries)} files, {self.size / 2 ** 20:.0f} of {self.maxSize / 2 ** 20:.0f} MB')
+
+    def save(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, self.INDEX)
+        tmpName = f'{path}.{uuid4().hex}.tmp'
+        with self._lock:
+            index = {'entries': dict(self.entries), 'hits': self.hits, 'misses': self.misses}
+        with open(tmpName, 'w', encoding='utf-8') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(tmpName, path)
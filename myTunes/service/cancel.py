@@ -0,0 +1,150 @@
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Set
+
+
+__all__ = ('CancelToken', 'Cancelled', 'kill_group', 'suspend_group', 'resume_group')
+
+
+class Cancelled(Exception):
+    """
+    conversion is stopped by CancelToken
+    """
+
+
+if sys.platform == 'win32':
+    import ctypes
+
+    # there is no SIGSTOP on Windows, process is suspended by undocumented but stable ntdll calls.
+    # Encoders on Windows don't start children, so only the process itself is signaled
+    _PROCESS_TERMINATE = 0x0001
+    _PROCESS_SUSPEND_RESUME = 0x0800
+
+    def _call(pid: int, access: int, func) -> None:
+        handle = ctypes.windll.kernel32.OpenProcess(access, False, pid)
+        if not handle:
+            return
+        try:
+            func(handle)
+        finally:
+            ctypes.windll.kernel32.CloseHandle(handle)
+
+    def kill_group(pid: int) -> None:
+        _call(pid, _PROCESS_TERMINATE, lambda h: ctypes.windll.kernel32.TerminateProcess(h, 1))
+
+    def suspend_group(pid: int) -> None:
+        _call(pid, _PROCESS_SUSPEND_RESUME, ctypes.windll.ntdll.NtSuspendProcess)
+
+    def resume_group(pid: int) -> None:
+        _call(pid, _PROCESS_SUSPEND_RESUME, ctypes.windll.ntdll.NtResumeProcess)
+
+else:
+    def _signal(pid: int, sig: int) -> None:
+        # script wrappers are started in own group, see process.spawn. Their children get the signal too
+        try:
+            os.killpg(pid, sig)
+        except (ProcessLookupError, PermissionError):
+            # process is not group leader, it is signaled alone
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def kill_group(pid: int) -> None:
+        _signal(pid, signal.SIGKILL)
+
+    def suspend_group(pid: int) -> None:
+        _signal(pid, signal.SIGSTOP)
+
+    def resume_group(pid: int) -> None:
+        _signal(pid, signal.SIGCONT)
+
+
+class CancelToken:
+    """
+    Cooperative cancellation shared by GUI thread and conversion. Conversion checks token between steps
+    and registers started processes, so cancel kills them at once and pause stops them without losing work.
+
+    Attributes:
+        cancelled: new steps must not be started
+        paused: processes are stopped, new steps wait for resume
+        resumedAt: monotonic time of last resume. Stall timeouts don't count time before it
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self.paused = False
+        self.resumedAt = float('-inf')
+        self._kill = False
+        self._lock = threading.Lock()
+        self._pids: Set[int] = set()
+        self._resumed = threading.Event()
+        self._resumed.set()
+
+    def register(self, pid: int) -> None:
+        """
+        add started process. Process started after kill or pause get the same state at once
+        """
+        with self._lock:
+            self._pids.add(pid)
+            if self._kill:
+                kill_group(pid)
+            elif self.paused:
+                suspend_group(pid)
+
+    def unregister(self, pid: int) -> None:
+        with self._lock:
+            self._pids.discard(pid)
+
+    def check(self) -> None:
+        """
+        raise Cancelled if token is cancelled
+        """
+        if self.cancelled:
+            raise Cancelled('cancelled')
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        block while token is paused
+
+        :return: False if still paused after timeout
+        """
+        return self._resumed.wait(timeout)
+
+    def cancel(self, kill=True) -> None:
+        """
+        :param kill: kill running processes too. Otherwise they are finished
+        """
+        with self._lock:
+            self.cancelled = True
+            self._kill = self._kill or kill
+            for pid in self._pids:
+                if self.paused:
+                    # processes that are not killed must finish their work
+                    resume_group(pid)
+                if kill:
+                    kill_group(pid)
+            self.paused = False
+            self._resumed.set()
+
+    def pause(self) -> None:
+        with self._lock:
+            if self.paused or self.cancelled:
+                return
+            self.paused = True
+            self._resumed.clear()
+            for pid in self._pids:
+                suspend_group(pid)
+
+    def resume(self) -> None:
+        with self._lock:
+            if not self.paused:
+                return
+            self.paused = False
+            self.resumedAt = time.monotonic()
+            for pid in self._pids:
+                resume_group(pid)
+            self._resumed.set()
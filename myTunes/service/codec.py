@@ -0,0 +1,146 @@
+from typing import Tuple
+
+from mutagen import FileType
+from mutagen.aac import AAC
+from mutagen.aiff import AIFF
+from mutagen.asf import ASF
+from mutagen.dsf import DSF
+from mutagen.flac import FLAC
+from mutagen.monkeysaudio import MonkeysAudio
+from mutagen.mp3 import MP3
+from mutagen.mp4 import MP4
+from mutagen.musepack import Musepack
+from mutagen.oggflac import OggFLAC
+from mutagen.oggopus import OggOpus
+from mutagen.oggspeex import OggSpeex
+from mutagen.oggvorbis import OggVorbis
+from mutagen.optimfrog import OptimFROG
+from mutagen.tak import TAK
+from mutagen.trueaudio import TrueAudio
+from mutagen.wave import WAVE
+from mutagen.wavpack import WavPack
+
+
+__all__ = ('StreamInfo', 'stream_codec', 'classify', 'LOSSLESS_CODEC')
+
+
+# codec by mutagen file type when container have only one codec
+FILE_CODEC = {
+    AAC: 'aac',
+    AIFF: 'pcm',
+    DSF: 'dsd',
+    FLAC: 'flac',
+    MonkeysAudio: 'ape',
+    Musepack: 'mpc',
+    OggFLAC: 'flac',
+    OggOpus: 'opus',
+    OggSpeex: 'speex',
+    OggVorbis: 'vorbis',
+    OptimFROG: 'ofr',
+    TAK: 'tak',
+    TrueAudio: 'tta',
+    WavPack: 'wavpack',
+}
+
+# WavPack hybrid (lossy) mode is not visible in mutagen info, so WavPack is always taken as lossless
+LOSSLESS_CODEC = {'pcm', 'pcm_float', 'flac', 'alac', 'ape', 'wavpack', 'tak', 'tta', 'ofr', 'wmalossless', 'dsd'}
+
+# WAVE format tag. 0xFFFE is extensible format and almost always used for PCM with more than 2 channels or 24 bit
+WAVE_FORMAT = {
+    0x0001: 'pcm',
+    0x0003: 'pcm_float',
+    0x0055: 'mp3',
+    0xFFFE: 'pcm',
+}
+
+
+def stream_codec(mfile: FileType) -> str:
+    """
+    get codec of audio stream from already loaded mutagen file. Nothing is read from disk.
+
+    Args:
+        mfile: mutagen file. For music_tag file it is afile.mfile
+
+    Returns: codec name in lower case or empty string if unknown
+
+    """
+    if isinstance(mfile, WAVE):
+        return WAVE_FORMAT.get(mfile.info.audio_format, '')
+
+    if isinstance(mfile, MP3):
+        return f'mp{mfile.info.layer}'
+
+    if isinstance(mfile, MP4):
+        codec = mfile.info.codec.lower()
+        if codec.startswith('mp4a.40'):
+            return 'aac'
+        elif codec in ('mp4a.69', 'mp4a.6b'):
+            return 'mp3'
+        return codec
+
+    if isinstance(mfile, ASF):
+        if 'lossless' in mfile.info.codec_name.lower():
+            return 'wmalossless'
+        return 'wma'
+
+    for kls, codec in FILE_CODEC.items():
+        if isinstance(mfile, kls):
+            return codec
+
+    return ''
+
+
+def classify(mfile: FileType) -> Tuple[str, bool]:
+    """
+    classify audio stream by codec, not by file extension. So ALAC in m4a or FLAC in ogg are lossless,
+    and MP3 in WAV is lossy.
+
+    Args:
+        mfile: mutagen file. For music_tag file it is afile.mfile
+
+    Returns: codec, is lossless. Unknown codec is empty string and lossy
+
+    """
+    codec = stream_codec(mfile)
+    return codec, codec in LOSSLESS_CODEC
+
+
+class StreamInfo:
+    """
+    Audio stream facts which are known before conversion. Encoders use them instead of probing file.
+    Zero or empty value means unknown.
+
+    Attributes:
+        codec: see stream_codec
+        duration: in seconds
+        sampleRate: in Hz
+        channels:
+        bitsPerSample: 0 for lossy codecs
+        bitrate: in bit/s
+        lossless: codec is lossless. False if codec is unknown
+    """
+
+    def __init__(self, codec='', duration=0.0, sampleRate=0, channels=0, bitsPerSample=0, bitrate=0,
+                 lossless=False):
+        self.codec = codec
+        self.lossless = lossless
+        self.duration = duration
+        self.sampleRate = sampleRate
+        self.channels = channels
+        self.bitsPerSample = bitsPerSample
+        self.bitrate = bitrate
+
+    @classmethod
+    def from_mfile(cls, mfile: FileType) -> 'StreamInfo':
+        info = mfile.info
+        codec, lossless = classify(mfile)
+
+        return cls(
+            codec=codec,
+            lossless=lossless,
+            duration=getattr(info, 'length', 0) or 0.0,
+            sampleRate=getattr(info, 'sample_rate', 0) or 0,
+            channels=getattr(info, 'channels', 0) or 0,
+            bitsPerSample=getattr(info, 'bits_per_sample', 0) or 0,
+            bitrate=getattr(info, 'bitrate', 0) or 0,
+        )
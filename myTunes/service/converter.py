@@ -1,16 +1,17 @@
 import os
-import traceback
-from queue import Queue
-from threading import Thread
-from typing import Dict, Iterator
-from uuid import uuid4
+from typing import Dict, List
 
+from .cache import EncodeCache
+from .copier import Copier
 from .encoder import Encoder
 from .qaac import Qaac
 from .ffmpeg import FFmpeg
-from .converterTask import ConverterTask
+from .pyav import PyAV
+from .codec import StreamInfo
+from .payload import payload_hash
+from .profile import OutputProfile
 from myTunes.config import cfg, log
-from myTunes.service.tagEditor import TagEditor, AudioFile
+from myTunes.service.tagEditor import TagEditor
 
 
 class Converter:
@@ -26,61 +27,69 @@ class Converter:
             'QAAC': self.qaac,
             'FFmpeg': self.ffmpeg
         }
-        self.queue: Queue[ConverterTask | str] = Queue()
-        self.handlers: Dict[int, Thread] = {}
-        # self.task: Dict[int, ibt=] = {}
+        # optional, libav bindings may be not installed
+        self.pyav: PyAV | None = None
+        if PyAV.available():
+            try:
+                self.pyav = PyAV(self.ffmpeg)
+                self.encoderName['PyAV'] = self.pyav
+            except Exception as e:
+                log.warning(f'PyAV encoder: {e}')
         self.encoder: Encoder = self.ffmpeg
         self.outPath = ''
-
-    def convert_afile(self, afile: AudioFile, fileOut: str) -> Iterator[int]:
-        for i in self.convert_file(afile.filename, fileOut):
-            yield i
-        
+        # encoded outputs by source audio and encoder settings
+        self.cache: EncodeCache | None = EncodeCache(cfg.cachePath, cfg.cacheSize) if cfg.cachePath else None
         try:
-            self.tagEditor.save_file(fileOut, afile)
-        except Exception as e:
-            msg = f'Set metadata for result file: {e}'
-            log.error(msg)
-            print(traceback.format_exc())
-            raise RuntimeError(msg)
-    
-    def convert_file(self, fileIn: str, fileOut: str) -> Iterator[int]:
+            self.copier = Copier(cfg.copyMode)
+        except ValueError as e:
+            log.error(f'copy mode: {e}')
+            self.copier = Copier()
+        # extra outputs of each run
+        self.profiles: List[OutputProfile] = []
+        try:
+            self.profiles = OutputProfile.load_all(cfg.profiles, self.encoderName)
+        except ValueError as e:
+            log.error(f'load profiles: {e}')
+
+    def cache_key(self, fileIn: str, fileOut: str, profile: OutputProfile = None, payload: str = None) -> str:
+        """
+        key of output in cache
+
+        :param fileIn: source
+        :param fileOut: output
+        :param profile: output profile instead of current encoder
+        :param payload: known payload hash of source
+        :return: empty string if cache is disabled or source audio can't be hashed
         """
-        prepare file and call encoder
+        if self.cache is None:
+            return ''
+        if payload is None:
+            try:
+                payload = payload_hash(fileIn)
+            except OSError as e:
+                log.warning(f'payload hash of {fileIn}: {e}')
+                return ''
+        if not payload:
+            return ''
+
+        encoder, settings = (profile.encoder, profile.settings) if profile else (self.encoder, self.encoder.settings)
+        return self.cache.key(payload, encoder.name, settings.stringify(), os.path.splitext(fileOut)[1])
+
+    def can_remux(self, stream: StreamInfo, extIn: str, extOut: str, profile: OutputProfile = None) -> bool:
+        """
+        check if source can be copied into output container without encoding. Source in the same
+        container is just copied
         
-        :param fileIn:
-        :param fileOut:
-        :return: int: progress in % [0-100]
+        :param stream: source stream info
+        :param extIn: source extension
+        :param extOut: output extension
+        :param profile: output profile instead of current encoder
         """
-        step1 = 0
-        step2 = 0
-        stepFactor = 1
+        if extIn == extOut or not stream.codec:
+            return False
         
-        if self.encoder.needWav:
-            # 30% reserved for this.
-            tmpName = f"{cfg.tempPath}/{uuid4()}.wav"
-            stepFactor = 0.7
-            
-            try:
-                for i in self.ffmpeg.process_yield(fileIn, tmpName, {'-acodec': 'pcm_s16le'}):
-                    step1 = int(i * 0.3)
-                    yield step1
-            except Exception as e:
-                log.error(f'Create WAV: {e}')
-                return False
-        else:
-            tmpName = fileIn
-            
-        try:
-            for i in self.encoder.process_yield(tmpName, fileOut):
-                step2 = int(i * stepFactor)
-                yield step1 + step2
-        except Exception as e:
-            log.error(f'Encoder processing: {e}')
-            raise Exception(f'Encoder processing: {e}')
+        encoder, settings = (profile.encoder, profile.settings) if profile else (self.encoder, self.encoder.settings)
+        if encoder is None or stream.codec != encoder.output_codec(settings):
+            return False
         
-        if self.encoder.needWav:
-            try:
-                os.remove(tmpName)
-            except:
-                pass
+        return settings.remux_compatible(stream)
@@ -1,10 +1,19 @@
 import os
+from typing import Any, Dict, List
 
 from music_tag import AudioFile
 
+from .codec import StreamInfo
+
 
 class ConverterTask:
-    def __init__(self, afile: AudioFile, qTreePath='', ext=''):
+    """
+    Attributes:
+        edits: tag edits of GUI which are not saved into source yet, see SaveJob.tags
+        metadata: tags of outputs. It is afile or its copy with edits, see Engine.run
+    """
+
+    def __init__(self, afile: AudioFile, qTreePath='', ext='', edits: Dict[str, Any] = None):
         if qTreePath != '':
             if qTreePath.startswith('/'):
                 qTreePath = qTreePath[1:]
@@ -12,7 +21,66 @@ class ConverterTask:
                 qTreePath += '/'
         
         self.afile = afile
+        self.edits = edits or {}
+        self.metadata = afile
+        self.stream = StreamInfo.from_mfile(afile.mfile)
         self.qTreePath = qTreePath
         self.baseName = os.path.basename(afile.filename)
         self.ext = ext
-        self.fileOut = f'{self.qTreePath}{self.baseName[:self.baseName.rfind(".")]}.{ext}'
+        # output name without extension, changed by planner if outputs of two sources collide
+        self.stem = self.baseName[:self.baseName.rfind('.')]
+        self.fileOut = f'{self.qTreePath}{self.stem}.{ext}'
+
+    @property
+    def copyName(self) -> str:
+        """
+        output name of source copied as is
+        """
+        return f'{self.stem}{self.baseName[self.baseName.rfind("."):]}'
+
+    def rename(self, stem: str) -> None:
+        """
+        change output name of source
+
+        :param stem: name without extension
+        """
+        self.stem = stem
+        self.fileOut = f'{self.qTreePath}{stem}.{self.ext}'
+
+
+class ConverterBatch:
+    """
+    Short tracks which are converted by one encoder process
+    """
+    def __init__(self, tasks: List[ConverterTask]):
+        self.tasks = tasks
+        self.duration = sum(i.stream.duration for i in tasks)
+
+    @staticmethod
+    def group(tasks: List[ConverterTask], maxDuration: float, size: int) -> List['ConverterTask | ConverterBatch']:
+        """
+        put short lossless tracks into batches, other tasks stay as is
+
+        :param tasks:
+        :param maxDuration: max track duration in seconds for batch
+        :param size: max tracks in one batch
+        :return: tasks and batches
+        """
+        result: List[ConverterTask | ConverterBatch] = []
+        batch: List[ConverterTask] = []
+
+        for task in tasks:
+            if not (task.stream.lossless and 0 < task.stream.duration < maxDuration):
+                result.append(task)
+                continue
+
+            batch.append(task)
+            if len(batch) == size:
+                result.append(ConverterBatch(batch))
+                batch = []
+
+        if len(batch) == 1:
+            result.append(batch[0])
+        elif batch:
+            result.append(ConverterBatch(batch))
+        return result
@@ -0,0 +1,222 @@
+import io
+import os
+import shutil
+import threading
+from contextlib import ExitStack
+from typing import Dict, List, Set, Tuple
+
+from mutagen.id3 import ID3, ID3NoHeaderError
+
+from .util import copy_to_many
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+__all__ = ('COPY_MODES', 'Copier', 'render_id3')
+
+
+COPY_MODES = ('auto', 'reflink', 'kernel', 'copy', 'hardlink', 'symlink')
+# Linux ioctl which makes file share extents of other file on CoW filesystems
+FICLONE = 0x40049409
+# bytes read at once by splice
+BLOCK = 1 << 20
+
+
+# size of ID3v1 tag at file end
+ID3V1_SIZE = 128
+
+
+def render_id3(tags: ID3, v1=False) -> bytes:
+    """
+    :param v1: append ID3v1 tag, it is the last ID3V1_SIZE bytes
+    :return: ID3v2 tag with padding as it is written by tag save
+    """
+    data = io.BytesIO()
+    tags.save(data, v1=2 if v1 else 0)
+    return data.getvalue()
+
+
+class Copier:
+    """
+    Copy of sources which are not encoded. Method is chosen for each pair of source and destination devices:
+        - reflink: output shares data blocks with source (btrfs, xfs, bcachefs), only metadata is written
+        - kernel: os.copy_file_range, data is not copied through user space and may be copied by
+          file server. Fallback is shutil.copyfile, it uses sendfile on Linux
+        - copy: one read pass for all destinations
+        - hardlink, symlink: output is source itself. Tag edit of such output changes source too,
+          so they are used only if set and fall back to copy on other device
+    auto tries reflink, then kernel copy. Failed method is remembered for device pair and not tried again.
+
+    MP3 with tags edited in memory is written with new ID3v2 tag and audio of source by one pass,
+    so edits reach output without second tag save.
+
+    Attributes:
+        mode: one of COPY_MODES
+        counts: files written by each method
+    """
+
+    def __init__(self, mode='auto'):
+        if mode not in COPY_MODES:
+            raise ValueError(f'unknown copy mode {mode}')
+
+        self.mode = mode
+        self.counts: Dict[str, int] = dict.fromkeys(('splice', 'reflink', 'kernel', 'copy', 'hardlink', 'symlink'), 0)
+        self._devices: Dict[str, int] = {}
+        self._failed: Set[Tuple[str, int, int]] = set()
+        # copies are made by several engine workers
+        self._lock = threading.Lock()
+
+    def _count(self, method: str, n=1) -> None:
+        with self._lock:
+            self.counts[method] += n
+
+    def _device(self, path: str) -> int:
+        # outputs of one dir are on the same device
+        path = os.path.dirname(os.path.abspath(path))
+        if path not in self._devices:
+            self._devices[path] = os.stat(path).st_dev
+        return self._devices[path]
+
+    def copy_to_many(self, src: str, dsts: List[str], tags=None) -> None:
+        """
+        :param src: source file
+        :param dsts: destination files. Their directories must exist
+        :param tags: tags of source in memory, see AudioFile.mfile.tags
+        """
+        if isinstance(tags, ID3) and src.lower().endswith('.mp3'):
+            if self._splice(src, dsts, tags):
+                self._count('splice', len(dsts))
+                return
+
+        rest = []
+        for dst in dsts:
+            method = self._link(src, dst)
+            if method:
+                self._count(method)
+            else:
+                rest.append(dst)
+
+        if len(rest) == 1:
+            self._count(self._copy(src, rest[0]))
+        elif rest:
+            copy_to_many(src, rest)
+            self._count('copy', len(rest))
+
+    def _link(self, src: str, dst: str) -> str:
+        """
+        make output without copy of data
+
+        :return: method or empty string if data must be copied
+        """
+        if self.mode not in ('auto', 'reflink', 'hardlink', 'symlink'):
+            return ''
+
+        if self.mode == 'symlink':
+            self._remove(dst)
+            os.symlink(os.path.abspath(src), dst)
+            return 'symlink'
+
+        devices = (self._device(src), self._device(dst))
+        if devices[0] != devices[1]:
+            return ''
+
+        if self.mode == 'hardlink':
+            self._remove(dst)
+            os.link(src, dst)
+            return 'hardlink'
+
+        if fcntl is None or ('reflink', *devices) in self._failed:
+            return ''
+        with open(src, 'rb') as fileIn, open(dst, 'wb') as fileOut:
+            try:
+                fcntl.ioctl(fileOut.fileno(), FICLONE, fileIn.fileno())
+            except OSError:
+                with self._lock:
+                    self._failed.add(('reflink', *devices))
+                return ''
+        return 'reflink'
+
+    def _copy(self, src: str, dst: str) -> str:
+        """
+        copy data into one destination
+
+        :return: method
+        """
+        if self.mode in ('auto', 'kernel') and hasattr(os, 'copy_file_range'):
+            devices = (self._device(src), self._device(dst))
+            if ('kernel', *devices) not in self._failed:
+                with open(src, 'rb') as fileIn, open(dst, 'wb') as fileOut:
+                    left = os.fstat(fileIn.fileno()).st_size
+                    try:
+                        while left > 0:
+                            n = os.copy_file_range(fileIn.fileno(), fileOut.fileno(), left)
+                            if n == 0:
+                                break
+                            left -= n
+                    except OSError:
+                        # old kernel or filesystem without support
+                        with self._lock:
+                            self._failed.add(('kernel', *devices))
+                    else:
+                        # copy stopped before end, truncated output is written again by plain copy
+                        if left <= 0:
+                            return 'kernel'
+
+        shutil.copyfile(src, dst)
+        return 'copy'
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        # output of interrupted run
+        if os.path.lexists(path):
+            os.remove(path)
+
+    @staticmethod
+    def _splice(src: str, dsts: List[str], tags: ID3) -> bool:
+        """
+        write new ID3v2 tag and audio of MP3 source. ID3v1 tag at file end is written from new tags too
+
+        :return: False if tags of source file are the same and source can be copied as is
+        """
+        with open(src, 'rb') as fileIn:
+            # source tags are parsed once, from the same file
+            try:
+                old = ID3(fileIn)
+                start = old.size
+            except ID3NoHeaderError:
+                old = None
+                start = 0
+
+            end = fileIn.seek(0, os.SEEK_END)
+            v1 = False
+            if end - start >= ID3V1_SIZE:
+                fileIn.seek(end - ID3V1_SIZE)
+                v1 = fileIn.read(3) == b'TAG'
+
+            if old is not None and render_id3(old) == render_id3(tags):
+                return False
+            block = render_id3(tags, v1)
+            tail = b''
+            if v1:
+                end -= ID3V1_SIZE
+                block, tail = block[:-ID3V1_SIZE], block[-ID3V1_SIZE:]
+
+            fileIn.seek(start)
+            with ExitStack() as stack:
+                filesOut = [stack.enter_context(open(i, 'wb')) for i in dsts]
+                for f in filesOut:
+                    f.write(block)
+                left = end - start
+                while left > 0:
+                    data = fileIn.read(min(BLOCK, left))
+                    if not data:
+                        break
+                    left -= len(data)
+                    for f in filesOut:
+                        f.write(data)
+                for f in filesOut:
+                    f.write(tail)
+        return True
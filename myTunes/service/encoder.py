@@ -1,8 +1,10 @@
-from typing import Dict, Iterator
+from typing import Dict, Set, List
 
 from music_tag import AudioFile, load_file
 
-from service.converterTask import ConverterTask
+from .converterTask import ConverterTask
+from .progress import ProgressParser
+from .codec import StreamInfo
 
 __all__ = ('Settings', 'Encoder')
 
@@ -10,14 +12,22 @@ __all__ = ('Settings', 'Encoder')
 class Settings:
     guiSettings: Dict[str, Dict[str, any]]
 
+    def args(self) -> List[str]:
+        """
+
+        Returns: encoder settings as command arguments list
+
+        """
+        self.verify()
+        return []
+
     def stringify(self) -> str:
         """
 
         Returns: encoder settings as command args
 
         """
-        self.verify()
-        ...
+        return ' '.join(self.args())
 
     def verify(self) -> None:
         """
@@ -39,41 +49,87 @@ class Settings:
     def to_dict(self) -> Dict[str, any]:
         ...
 
+    def remux_compatible(self, stream: StreamInfo) -> bool:
+        """
+        check if stream with the same codec can be copied as is instead of encoding with these settings.
+        Stream must not be better than settings, otherwise copy will be bigger than encoded file.
+
+        """
+        rate = getattr(self, 'rate', 'auto')
+        if rate not in ('keep', 'auto') and int(rate) != stream.sampleRate:
+            return False
+
+        # tvbr bitrate is quality, not kbps
+        bitrate = getattr(self, 'bitrate', 0)
+        if bitrate and getattr(self, 'mode', 'cbr') != 'tvbr':
+            # small overhead for container
+            return 0 < stream.bitrate <= bitrate * 1000 * 1.05
+
+        return True
+
 
 class Encoder:
+    """
+    Attributes:
+      needWav: encoder can't read sources by himself and need WAV from ffmpeg
+      readStdin: encoder can read WAV from stdin
+      inputs: containers and their codecs which encoder read directly, without WAV stage.
+        Like {'wav': {'pcm'}, 'flac': {'flac'}}
+      batch: encoder can convert many files by one process
+      progressStream: stdout or stderr where encoder write progress
+      inProcess: encoder works inside of this process, see pyav.PyAV.encode. Its encode_args is used
+        only where process is needed
+    """
     name: str
     needWav: bool
+    readStdin = False
+    batch = False
+    progressStream = 'stdout'
+    inProcess = False
+    inputs: Dict[str, Set[str]] = {}
     settings: Settings
     
     def _check(self) -> None:
         ...
     
-    def verify_settings(self) -> None:
-        self.settings.verify()
-
-    def load_settings(self, settings: Dict[str, any]) -> None:
-        self.settings.load(settings)
+    def output_codec(self, settings: Settings = None) -> str:
+        """
+        codec of encoded files in terms of service.codec
 
-    def process_yield(self, fileIn: str, fileOut: str, settings: Dict[str, any] = None) -> Iterator[int]:
+        :param settings: settings of output profile instead of encoder settings
         """
-        Convert audio files with ffmpeg encoder
+        ...
 
-        example call
-         ffmpeg -i sample.mp3 -acodec pcm_s16le -ar 44100 sample.wav
+    def read_directly(self, container: str, codec: str) -> bool:
+        """
+        check if encoder can read file without decoding it to WAV
+        
+        :param container: file extension
+        :param codec: stream codec. See service.codec
+        """
+        return codec in self.inputs.get(container, ())
+    
+    def encode_args(self, fileIn: str, fileOut: str, settings: Settings = None) -> List[str]:
+        """
+        command to encode file
+        
+        :param fileIn: source or '-' for WAV from stdin if encoder can read it
+        :param fileOut:
+        :param settings: settings of output profile instead of encoder settings
+        :return: executable and arguments
+        """
+        ...
 
-         A large majority of audio files use little-endian encoding (pcm_s24le), not big (pcm_s24be)
-         And most of them encoded as 16 bit (pcm_s16le)
+    def progress(self, duration: float = 0.0) -> ProgressParser:
+        """
+        parser of encoder output
 
-        :param fileIn:
-        :param fileOut:
-        :param settings: custom settings
-        :return: int: progress in % [0-100]
+        :param duration: known track duration in seconds
         """
-        n = 0
-        while n < 100:
-            n += 1
-            yield n
-    
-    def process(self, fileIn: str, fileOut: str) -> None:
-        _ = [i for i in self.process_yield(fileIn, fileOut)]
-        
\ No newline at end of file
+        return ProgressParser(duration)
+
+    def verify_settings(self) -> None:
+        self.settings.verify()
+
+    def load_settings(self, settings: Dict[str, any]) -> None:
+        self.settings.load(settings)
@@ -0,0 +1,1388 @@
+import asyncio
+import os
+import time
+from contextlib import AsyncExitStack
+from functools import partial
+from asyncio.subprocess import PIPE, STDOUT, DEVNULL
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+from uuid import uuid4
+
+from .autotune import Autotuner, CpuSampler
+from .cancel import CancelToken, Cancelled
+from .converter import Converter
+from .converterTask import ConverterTask, ConverterBatch
+from .codec import StreamInfo
+from .encoder import Settings
+from .ffmpeg import FILE_INDEX
+from .journal import Journal, file_hash, part_name
+from .manifest import SyncManifest
+from .payload import payload_hash
+from .planner import Plan, PlanItem, estimate_size
+from .process import spawn_async
+from .profile import OutputProfile
+from .progress import Progress, ProgressParser, QaacProgress
+from .scheduler import CostModel, Scheduler
+from .saveEngine import SaveJob
+from .segment import Segment, SEGMENT_FORMATS, concat_list, frame_grid, plan_segments
+from .util import create_dirs
+from myTunes.config import cfg, log, KNOWN_FORMAT, LOSSLESS_FORMAT
+from myTunes.service.tagEditor import AudioFile
+
+
+__all__ = ('Engine', 'EngineEvent')
+
+
+class EngineEvent:
+    """
+    Engine notification for subscribers
+
+    Attributes:
+        slot: worker index. Each worker run one task at time
+        kind: one of
+            - start: worker take task, name is shown
+            - progress: progress of current worker task
+            - done, remux, copy: file is written
+            - exists: output exists and not replaced
+            - unchanged: sources not changed since last sync are skipped, their count is in message
+            - delete: output of removed source is deleted by sync
+            - retag: tags of output are updated, its source has the same audio and new tags
+            - error: task or one of its files is failed
+            - cancel: task is cancelled
+        name: file or task name for display
+        progress: for progress event
+        message: error text
+    """
+    __slots__ = ('slot', 'kind', 'name', 'progress', 'message')
+
+    def __init__(self, slot: int, kind: str, name='', progress: Progress = None, message=''):
+        self.slot = slot
+        self.kind = kind
+        self.name = name
+        self.progress = progress
+        self.message = message
+
+    def __repr__(self):
+        return f'EngineEvent({self.slot}, {self.kind}, {self.name!r}, {self.progress}, {self.message!r})'
+
+
+class Engine:
+    """
+    Conversion engine. One asyncio loop supervise all encoder processes and read their progress,
+    so concurrency don't need OS thread for each job.
+
+    Engine knows nothing about GUI. Subscribers get events in loop thread and must be fast.
+    Commands for encoders are taken from encoders, so engine convert files the same way as Converter.
+
+    Attributes:
+        converter: encoders, tag editor and profiles
+        outPath: destination root
+        replaceOutFile: replace existing outputs
+        concurrency: max tasks at the same time
+        timeout: encoder which write nothing this seconds is killed. 0 disables
+        token: cancel and pause of current run, shared with GUI thread
+        costs: expected cost of tasks, learned by engine
+        scheduler: encodes of current run
+        ioScheduler: copies and remuxes of current run, they have own workers
+        tuner: worker count tuner. None if concurrency is fixed
+        active: encode worker count now. Workers above it stop after current task
+        ioBase: slot of first copy worker, after all possible encode workers
+        audioDone: encoded audio seconds of current run, used as throughput. Copies, remuxes and cached outputs
+            are not counted, they would make more workers look faster
+        journal: record of finished outputs, so interrupted or cancelled run is resumed. None if disabled
+        manifest: sources synced into outPath. None if sync is disabled
+        plan: outputs of current run, made before workers start, see make_plan
+    """
+
+    def __init__(self, converter: Converter, outPath: str, replaceOutFile=True, concurrency=0,
+                 timeout: float = None):
+        if outPath and outPath[-1] not in ('/', '\\'):
+            outPath += '/'
+
+        self.converter = converter
+        self.outPath = outPath
+        self.replaceOutFile = replaceOutFile
+        self.concurrency = concurrency or cfg.threads
+        self.timeout = cfg.timeout if timeout is None else timeout
+        self.token = CancelToken()
+        self.costs = CostModel(cfg.costFile)
+        self.scheduler: Scheduler | None = None
+        self.ioScheduler: Scheduler | None = None
+        self.tuner: Autotuner | None = None
+        self.active = self.concurrency
+        self.ioBase = self.cpu_slots(self.concurrency)
+        self.audioDone = 0.0
+        self.journal: Journal | None = None
+        # sources of interrupted job. Their outputs done by it are kept even if outputs are replaced
+        self._resumed: Set[str] = set()
+        self.manifest: SyncManifest | None = None
+        self.plan: Plan | None = None
+        # profile of outputs in journal and manifest. Outputs of other settings are made again
+        self._profileKey = ''
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._cpuLimits: List[asyncio.Semaphore] = []
+        self._ioLimits: List[asyncio.Semaphore] = []
+        self._subscribers: List[Callable[[EngineEvent], None]] = []
+        self._workers: Dict[int, asyncio.Task] = {}
+        # outputs that are being written by each worker. They are removed if task is cancelled or failed
+        self._partial: Dict[int, Set[str]] = {}
+        # outputs of each source of worker task and their success. Source with all outputs is synced
+        self._outputs: Dict[int, Dict[str, Dict[str, bool]]] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def cancelled(self) -> bool:
+        """
+        new tasks are not started
+        """
+        return self.token.cancelled
+
+    @staticmethod
+    def cpu_slots(concurrency: int) -> int:
+        """
+        :return: max count of encode workers. Autotune can start more workers than threads
+        """
+        if cfg.autotune:
+            return max(concurrency, cfg.autotuneMax or os.cpu_count() or 1)
+        return concurrency
+
+    @classmethod
+    def slot_count(cls, concurrency: int) -> int:
+        """
+        :return: count of all worker slots: encode workers and copy workers
+        """
+        return cls.cpu_slots(concurrency) + cfg.ioThreads
+
+    def subscribe(self, callback: Callable[[EngineEvent], None]) -> None:
+        self._subscribers.append(callback)
+
+    def _emit(self, slot: int, kind: str, name='', progress: Progress = None, message='') -> None:
+        event = EngineEvent(slot, kind, name, progress, message)
+        for callback in self._subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                log.error(f'engine subscriber: {e}')
+
+    async def run(self, tasks: List[ConverterTask | ConverterBatch]) -> None:
+        """
+        run tasks and return when all of them are done or cancelled
+        """
+        self._loop = asyncio.get_running_loop()
+        if self.token.cancelled:
+            self.token = CancelToken()
+        self.audioDone = 0.0
+        self._profileKey = self._profile_key()
+        self.converter.copier.counts = dict.fromkeys(self.converter.copier.counts, 0)
+
+        if cfg.sync and self.outPath:
+            self.manifest = SyncManifest(self.outPath)
+            if cfg.syncDelete:
+                self._delete_orphans()
+
+        self.plan = self.make_plan(tasks)
+        for line in self.plan.report():
+            log.info(f'plan: {line}')
+        for path, e in self.plan.create_dirs():
+            log.error(f'create out dir {path}: {e}')
+
+        await self._load_edits([t for i in tasks for t in (i.tasks if isinstance(i, ConverterBatch) else (i,))])
+        if self.manifest is not None:
+            tasks = await self._changed(tasks)
+
+        if cfg.journalFile:
+            self.journal = Journal(cfg.journalFile)
+            self._resumed = set(self.journal.interrupted)
+            if self.journal.interrupted:
+                log.info(f'journal: previous job of {len(self.journal.interrupted)} files was interrupted, '
+                         f'finished outputs are skipped')
+            self.journal.begin(t.afile.filename for i in tasks
+                               for t in (i.tasks if isinstance(i, ConverterBatch) else (i,)))
+
+        workers = self.concurrency
+        tuning = None
+        if cfg.autotune:
+            self.tuner = Autotuner(self._profile_key(), cfg.autotuneMin, cfg.autotuneMax or os.cpu_count() or 1,
+                                   self.concurrency, cfg.autotuneFile)
+            workers = self.tuner.workers
+            tuning = asyncio.create_task(self._autotune())
+
+        # copies wait for disks, not for CPU. They have own workers, so encodes are not blocked by them
+        ioTasks = [i for i in tasks if cfg.ioThreads > 0 and self._is_io(i)]
+        cpuTasks = [i for i in tasks if not (cfg.ioThreads > 0 and self._is_io(i))]
+        self._prepare_limits()
+
+        self.scheduler = Scheduler(cpuTasks, min(workers, len(cpuTasks)), self.costs, self._encoder_name(),
+                                   cfg.schedule == 'lpt')
+        self.ioScheduler = Scheduler(ioTasks, min(cfg.ioThreads, len(ioTasks)), self.costs, self._encoder_name(),
+                                     cfg.schedule == 'lpt')
+        self._resize(workers)
+        for n in range(min(cfg.ioThreads, len(ioTasks))):
+            slot = self.ioBase + n
+            self._workers[slot] = asyncio.create_task(self._worker(slot, self.ioScheduler, self.ioBase))
+
+        while self._workers:
+            await asyncio.wait(tuple(self._workers.values()))
+            for slot, worker in tuple(self._workers.items()):
+                if worker.done():
+                    del self._workers[slot]
+
+        if tuning is not None:
+            tuning.cancel()
+
+        for task in self.scheduler.drain() + self.ioScheduler.drain():
+            self._emit(-1, 'cancel', self._name(task))
+
+        try:
+            self.costs.save()
+            if self.tuner is not None:
+                log.info(f'autotune: best workers for {self.tuner.key}: {self.tuner.best}')
+                self.tuner.save()
+        except OSError as e:
+            log.warning(f'save task costs: {e}')
+
+        copies = ', '.join(f'{v} {k}' for k, v in self.converter.copier.counts.items() if v)
+        if copies:
+            log.info(f'copies: {copies}')
+
+        if self.converter.cache is not None:
+            log.info(f'cache: {self.converter.cache.stats()}')
+            try:
+                self.converter.cache.save()
+            except OSError as e:
+                log.warning(f'save cache index: {e}')
+
+        if self.manifest is not None:
+            try:
+                self.manifest.save()
+            except OSError as e:
+                log.error(f'save sync manifest: {e}')
+
+        if self.journal is not None:
+            # cancelled job stays open, next run resumes it
+            if not self.cancelled:
+                self.journal.end()
+            self.journal.close()
+
+    def make_plan(self, tasks: List[ConverterTask | ConverterBatch]) -> Plan:
+        """
+        plan tasks before workers start: list output dirs once, rename sources whose outputs collide,
+        find what is converted, remuxed, copied or skipped and estimate written size and run time.
+        Nothing is written, so plan is also a dry run
+        """
+        profiles = [OutputProfile('', self.outPath, self.converter.encoder), *self.converter.profiles]
+        sources = [t for i in tasks for t in (i.tasks if isinstance(i, ConverterBatch) else (i,))]
+        known = {i for i in sources if i.baseName[i.baseName.rfind('.') + 1:].lower() in KNOWN_FORMAT}
+        manifest = self.manifest
+        if manifest is None and cfg.sync and self.outPath:
+            manifest = SyncManifest(self.outPath)
+        profileKey = SyncManifest.profile_hash(self._profile_key())
+
+        plan = Plan()
+        plan.scan(f'{i.outPath}{t.qTreePath}' for t in known for i in profiles)
+        cpuCost = ioCost = 0.0
+        for task in sources:
+            if task not in known:
+                plan.add(PlanItem(task, 'skip'), 0.0)
+                continue
+
+            plan.claim(task, lambda t: [i[1] for i in self._plan_outputs(t, profiles)])
+            if manifest is not None and manifest.is_current(task.afile.filename, profileKey):
+                plan.add(PlanItem(task, 'unchanged'), 0.0)
+                continue
+
+            duration = task.stream.duration
+            sourceSize = int(task.stream.bitrate * duration / 8)
+            outputs = []
+            for kind, fileOut, profile in self._plan_outputs(task, profiles):
+                if not self.replaceOutFile and plan.exists(fileOut):
+                    kind = 'exists'
+                size = sourceSize
+                if kind == 'convert':
+                    size = estimate_size(profile.settings, profile.encoder.output_codec(profile.settings),
+                                         duration, sourceSize)
+                outputs.append((kind, fileOut, size))
+
+            item = PlanItem(task, outputs=outputs)
+            encoded = any(i[0] == 'convert' for i in outputs)
+            plan.add(item, duration if encoded else 0.0)
+            if item.kind != 'exists':
+                cost = self.costs.cost(self._encoder_name(), task)
+                if encoded or not cfg.ioThreads:
+                    cpuCost += cost
+                else:
+                    ioCost += cost
+
+        plan.seconds = max(cpuCost / self.concurrency, ioCost / max(cfg.ioThreads, 1))
+        return plan
+
+    def _plan_outputs(self, task: ConverterTask, profiles: List[OutputProfile]) -> List[Tuple[str, str, OutputProfile]]:
+        """
+        :return: kind, file and profile of each output, the same way as _run_task and _run_fanout choose them
+        """
+        ext = task.baseName[task.baseName.rfind('.') + 1:].lower()
+        isLossLess = self._is_lossless(task.stream, ext)
+        result = []
+        for profile in profiles:
+            if profile.encoder is not None and isLossLess:
+                result.append(('convert', profile.file_out(task), profile))
+            elif self.converter.can_remux(task.stream, ext, profile.ext, profile):
+                result.append(('remux', profile.file_out(task), profile))
+            else:
+                result.append(('copy', profile.file_out(task, encoded=False), profile))
+        return result
+
+    async def _load_edits(self, sources: List[ConverterTask]) -> None:
+        """
+        apply GUI edits that are not saved to copies of sources. Outputs get tags from them,
+        sources and their afiles are not changed
+        """
+        for task in sources:
+            if not task.edits:
+                continue
+            try:
+                metadata = await self._loop.run_in_executor(None, self.converter.tagEditor.load_file,
+                                                            task.afile.filename)
+                SaveJob(task.afile, task.edits).apply(metadata)
+            except Exception as e:
+                log.error(f'edits of {task.afile.filename}: {e}')
+                self._emit(-1, 'error', task.afile.filename, message=f'edits: {e}')
+                continue
+            task.metadata = metadata
+
+    async def _changed(self, tasks: List[ConverterTask | ConverterBatch]) -> List[ConverterTask | ConverterBatch]:
+        """
+        drop tasks of sources which are not changed since last sync.
+        Sources with new tags and the same audio are not converted, their outputs get new tags
+        """
+        profile = SyncManifest.profile_hash(self._profileKey)
+        sources = [t for i in tasks for t in (i.tasks if isinstance(i, ConverterBatch) else (i,))]
+        # outputs of source with edits need new tags
+        synced = {i.task.afile.filename for i in self.plan.items if i.kind == 'unchanged' and not i.task.edits}
+        skipped = len(synced)
+
+        if cfg.retag:
+            retag = [i for i in sources
+                     if i.afile.filename not in synced and self.manifest.payload(i.afile.filename, profile)]
+            results = await asyncio.gather(*(self._retag(i, profile) for i in retag))
+            synced.update(i.afile.filename for i, ok in zip(retag, results) if ok)
+
+        result: List[ConverterTask | ConverterBatch] = []
+        for task in tasks:
+            if isinstance(task, ConverterBatch):
+                changed = [i for i in task.tasks if i.afile.filename not in synced]
+                if len(changed) > 1:
+                    result.append(ConverterBatch(changed))
+                elif changed:
+                    result.append(changed[0])
+            elif task.afile.filename not in synced:
+                result.append(task)
+
+        if skipped:
+            log.info(f'sync: {skipped} unchanged sources are skipped')
+            self._emit(-1, 'unchanged', message=f'{skipped} sources')
+        return result
+
+    async def _retag(self, task: ConverterTask, profile: str) -> bool:
+        """
+        write tags of source into its synced outputs, when audio of source is the same as in last sync
+
+        :param profile: profile hash of outputs
+        :return: False if source must be converted
+        """
+        fileIn = task.afile.filename
+        try:
+            payload = await self._loop.run_in_executor(None, payload_hash, fileIn)
+        except OSError as e:
+            log.warning(f'sync: {fileIn}: {e}')
+            return False
+        if not payload or payload != self.manifest.payload(fileIn, profile) or self.cancelled:
+            return False
+
+        outputs = self.manifest.outputs(fileIn)
+        for fileOut in outputs:
+            try:
+                # linked copy is the source itself
+                if os.path.samefile(fileOut, fileIn):
+                    continue
+                await self._loop.run_in_executor(None, self.converter.tagEditor.save_file, fileOut, task.metadata)
+            except Exception as e:
+                log.error(f'sync: set metadata of {fileOut}: {e}')
+                return False
+            self._emit(-1, 'retag', fileOut)
+
+        log.info(f'sync: tags of {fileIn} are written into {len(outputs)} outputs')
+        self.manifest.add(fileIn, outputs, profile, payload)
+        return True
+
+    def _delete_orphans(self) -> None:
+        """
+        delete outputs of sources which are removed since last sync, and their empty directories
+        """
+        roots = {os.path.abspath(self.outPath), *(os.path.abspath(i.outPath) for i in self.converter.profiles)}
+
+        for fileIn, outputs in self.manifest.orphans():
+            failed = False
+            for fileOut in outputs:
+                try:
+                    os.remove(fileOut)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    failed = True
+                    log.error(f'sync: delete {fileOut}: {e}')
+                    self._emit(-1, 'error', fileOut, message=f'delete: {e}')
+                    continue
+                else:
+                    log.info(f'sync: {fileIn} is removed, delete {fileOut}')
+                    self._emit(-1, 'delete', fileOut)
+
+                outDir = os.path.dirname(os.path.abspath(fileOut))
+                while outDir not in roots and any(outDir.startswith(os.path.join(i, '')) for i in roots):
+                    try:
+                        os.rmdir(outDir)
+                    except OSError:
+                        break
+                    outDir = os.path.dirname(outDir)
+
+            if not failed:
+                self.manifest.remove(fileIn)
+
+    def _resize(self, workers: int) -> None:
+        """
+        set encode worker count. New workers are started if there are tasks, extra workers stop after current task
+        """
+        self.active = workers
+        for slot in range(workers):
+            if slot not in self._workers and len(self.scheduler) and not self.cancelled:
+                self._workers[slot] = asyncio.create_task(self._worker(slot, self.scheduler))
+
+    async def _autotune(self) -> None:
+        """
+        measure throughput, CPU and I/O wait each interval and resize workers
+        """
+        sampler = CpuSampler()
+        lastAudio, lastTime = self.audioDone, time.monotonic()
+
+        while True:
+            await asyncio.sleep(self.tuner.INTERVAL)
+            now = time.monotonic()
+            if self.token.paused or self.token.resumedAt > lastTime:
+                # pause is not slow conversion
+                lastAudio, lastTime = self.audioDone, now
+                continue
+            throughput = (self.audioDone - lastAudio) / (now - lastTime)
+            lastAudio, lastTime = self.audioDone, now
+
+            busy, iowait = sampler.sample()
+            workers = self.tuner.update(throughput, busy, iowait)
+            log.debug(f'autotune: {throughput:.1f}x with {self.active} workers, CPU {busy:.0%}, '
+                      f'iowait {iowait:.0%} -> {workers} workers')
+            if workers != self.active:
+                self._resize(workers)
+
+    def run_sync(self, tasks: List[ConverterTask | ConverterBatch]) -> None:
+        """
+        run tasks in own event loop. Blocks current thread
+        """
+        asyncio.run(self.run(tasks))
+
+    def cancel(self, kill=False) -> None:
+        """
+        cancel pending tasks. Can be called from any thread
+
+        :param kill: kill running encoders too. Their partial outputs and temp files are removed
+        """
+        self.token.cancel(kill)
+        if kill and self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(lambda: [i.cancel() for i in self._workers.values()])
+            except RuntimeError:
+                # run is finished, loop is closed
+                pass
+
+    def pause(self) -> None:
+        """
+        stop running encoders and don't start new tasks until resume. Can be called from any thread
+        """
+        self.token.pause()
+
+    def resume(self) -> None:
+        self.token.resume()
+
+    def _encoder_name(self) -> str:
+        """
+        encoder name for cost model
+        """
+        return 'fanout' if self.converter.profiles else self.converter.encoder.name
+
+    def _profile_key(self) -> str:
+        """
+        encoder and its settings for autotuner
+        """
+        profiles = [OutputProfile('', self.outPath, self.converter.encoder), *self.converter.profiles]
+        return ' | '.join(f'{i.encoder.name} {i.settings.stringify()}' if i.encoder else 'copy' for i in profiles)
+
+    def _learn(self, stream: StreamInfo, started: float) -> None:
+        self.costs.learn(self.costs.key(self._encoder_name(), stream), stream.duration, time.monotonic() - started)
+
+    @staticmethod
+    def _name(task: ConverterTask | ConverterBatch) -> str:
+        if isinstance(task, ConverterBatch):
+            return ', '.join(i.fileOut for i in task.tasks)
+        return task.fileOut
+
+    def _is_io(self, task: ConverterTask | ConverterBatch) -> bool:
+        """
+        :return: task is only copied or remuxed, nothing is encoded
+        """
+        if isinstance(task, ConverterBatch):
+            return False
+
+        ext = task.baseName[task.baseName.rfind('.') + 1:].lower()
+        return ext not in KNOWN_FORMAT or not self._is_lossless(task.stream, ext)
+
+    @staticmethod
+    def _is_lossless(stream: StreamInfo, ext: str) -> bool:
+        # codec is known from loaded file. Extension is used only if codec is unknown
+        if stream.codec:
+            return stream.lossless
+        return ext in LOSSLESS_FORMAT
+
+    @staticmethod
+    def _device(path: str) -> int:
+        """
+        :return: device id of path. Output dirs may not exist yet, so the nearest existing parent is used
+        """
+        path = os.path.abspath(path)
+        while not os.path.exists(path) and os.path.dirname(path) != path:
+            path = os.path.dirname(path)
+        return os.stat(path).st_dev
+
+    def _limit(self, key: str, value: int) -> asyncio.Semaphore | None:
+        if value <= 0:
+            return None
+        if key not in self._limits:
+            self._limits[key] = asyncio.Semaphore(value)
+        return self._limits[key]
+
+    def _prepare_limits(self) -> None:
+        """
+        find limits of this run: encoders of all outputs and devices of all output roots.
+        Limits are shared by all workers and taken in sorted order, so two workers never wait for each other
+        """
+        self._limits = {}
+        encoders = {self.converter.encoder.name.lower()}
+        roots = {self.outPath}
+        for profile in self.converter.profiles:
+            if profile.encoder is not None:
+                encoders.add(profile.encoder.name.lower())
+            roots.add(profile.outPath)
+
+        deviceLimits: Dict[int, int] = {}
+        for name, (path, limit) in cfg.devices.items():
+            try:
+                deviceLimits[self._device(path)] = limit
+            except OSError as e:
+                log.warning(f'device {name}: {e}')
+
+        devices = set()
+        for root in roots:
+            try:
+                devices.add(self._device(root))
+            except OSError as e:
+                log.warning(f'device of {root}: {e}')
+
+        cpuLimits = [self._limit(f'encoder {i}', cfg.encoderLimits.get(i, 0)) for i in sorted(encoders)]
+        ioLimits = [self._limit(f'device {i}', deviceLimits.get(i, cfg.deviceLimit)) for i in sorted(devices)]
+        self._cpuLimits = [i for i in cpuLimits if i is not None]
+        self._ioLimits = [i for i in ioLimits if i is not None]
+
+    async def _worker(self, slot: int, scheduler: Scheduler, base=0) -> None:
+        """
+        :param slot: worker slot for events
+        :param scheduler: tasks of this worker
+        :param base: first slot of the scheduler workers. Copy workers are not resized
+        """
+        while not self.cancelled and (base or slot < self.active):
+            while self.token.paused:
+                await asyncio.sleep(.2)
+            if self.cancelled:
+                break
+
+            task = scheduler.next(slot - base)
+            if task is None:
+                break
+
+            self._partial[slot] = set()
+            self._outputs[slot] = {}
+            try:
+                async with AsyncExitStack() as stack:
+                    for limit in self._ioLimits if self._is_io(task) else self._cpuLimits:
+                        await stack.enter_async_context(limit)
+
+                    if isinstance(task, ConverterBatch):
+                        await self._run_batch(slot, task)
+                    else:
+                        await self._run_task(slot, task)
+                await self._synced(slot)
+            except asyncio.CancelledError:
+                log.info(f'engine {slot}: cancel {self._name(task)}')
+                self._discard_partial(slot)
+                self._emit(slot, 'cancel', self._name(task))
+                raise
+            except Cancelled:
+                log.info(f'engine {slot}: cancel {self._name(task)}')
+                self._discard_partial(slot)
+                self._emit(slot, 'cancel', self._name(task))
+            except Exception as e:
+                log.error(f'engine {slot}: {self._name(task)}: {e}')
+                self._discard_partial(slot)
+                self._emit(slot, 'error', self._name(task), message=str(e))
+
+            self._emit(slot, 'progress', progress=Progress(100, eta=0.0))
+
+    async def _synced(self, slot: int) -> None:
+        """
+        add sources of finished task into manifest. Source with failed output is synced again by next run
+        """
+        profile = SyncManifest.profile_hash(self._profileKey)
+        for fileIn, outputs in self._outputs.pop(slot, {}).items():
+            if self.manifest is None or not outputs or not all(outputs.values()):
+                continue
+            try:
+                # audio hash is kept to find tag only changes of source
+                payload = await self._loop.run_in_executor(None, payload_hash, fileIn) if cfg.retag else ''
+                self.manifest.add(fileIn, outputs, profile, payload)
+            except OSError as e:
+                log.warning(f'sync: {fileIn}: {e}')
+
+    def _discard_partial(self, slot: int) -> None:
+        """
+        remove outputs which were not finished by worker
+        """
+        for fileOut in self._partial.pop(slot, ()):
+            try:
+                os.remove(fileOut)
+                log.info(f'engine {slot}: remove partial {fileOut}')
+            except OSError:
+                pass
+
+    def _start_out(self, slot: int, fileOut: str) -> None:
+        """
+        output is written under temp name, see journal.part_name. It is removed if task is not finished
+        """
+        self._partial.setdefault(slot, set()).add(part_name(fileOut))
+        if self.journal is not None:
+            self.journal.start(fileOut)
+
+    def _commit(self, slot: int, fileOut: str) -> None:
+        """
+        rename complete output with tags from temp name. Existing output is replaced at once,
+        it is never left truncated or without tags
+        """
+        part = part_name(fileOut)
+        os.replace(part, fileOut)
+        self._partial.get(slot, set()).discard(part)
+
+    def _discard_out(self, slot: int, fileOut: str) -> None:
+        """
+        remove failed output which is not renamed from temp name, other outputs of task are kept
+        """
+        part = part_name(fileOut)
+        if part not in self._partial.get(slot, ()):
+            return
+        self._partial[slot].discard(part)
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+
+    async def _record(self, slot: int, fileOut: str, fileIn: str) -> None:
+        """
+        write finished output with tags into journal
+        """
+        self._outputs.setdefault(slot, {}).setdefault(fileIn, {})[fileOut] = True
+        if self.journal is None:
+            return
+        checksum = await self._loop.run_in_executor(None, file_hash, fileOut)
+        self.journal.finish(fileOut, fileIn, self._profileKey, checksum)
+
+    async def _cache_key(self, fileIn: str, fileOut: str, profile: OutputProfile = None, payload: str = None) -> str:
+        """
+        async Converter.cache_key
+        """
+        if self.converter.cache is None:
+            return ''
+        return await self._loop.run_in_executor(None, self.converter.cache_key, fileIn, fileOut, profile, payload)
+
+    async def _fetch(self, slot: int, key: str, fileOut: str) -> bool:
+        """
+        take output from cache
+
+        :param key: see Converter.cache_key. Empty key is never found
+        :return: False if output must be encoded
+        """
+        if not key or not await self._loop.run_in_executor(None, self.converter.cache.fetch, key, fileOut):
+            return False
+        log.info(f'engine {slot}: {fileOut} from cache')
+        return True
+
+    async def _store(self, key: str, fileOut: str) -> None:
+        """
+        put encoded output into cache before tags are set
+        """
+        if not key:
+            return
+        try:
+            await self._loop.run_in_executor(None, self.converter.cache.store, key, fileOut)
+        except OSError as e:
+            log.warning(f'cache {fileOut}: {e}')
+
+    def _reporter(self, slot: int, offset=0, factor=1.0, eta=True, count=True) -> Callable[[Progress], None]:
+        """
+        progress callback of worker. Progress of conversion step is scaled into [offset, offset + 100 * factor]
+
+        :param count: add audio time to audioDone. Remux is not encode
+        """
+        outTime = 0.0
+
+        def report(event: Progress) -> None:
+            nonlocal outTime
+            if event.error:
+                return
+            if count:
+                self.audioDone += max(event.outTime - outTime, 0.0)
+            outTime = event.outTime
+            self._emit(slot, 'progress', progress=Progress(
+                offset + int(event.percent * factor * .99), event.outTime, event.speed, event.size,
+                event.eta if eta else -1.0))
+        return report
+
+    async def _read(self, stream: asyncio.StreamReader) -> bytes:
+        if not self.timeout:
+            return await stream.read(65536)
+        while True:
+            try:
+                return await asyncio.wait_for(stream.read(65536), self.timeout)
+            except asyncio.TimeoutError:
+                # paused encoder write nothing
+                if not self.token.paused and time.monotonic() - self.token.resumedAt >= self.timeout:
+                    raise TimeoutError(f'no output for {self.timeout:.0f}s')
+
+    async def _run(self, args: List[str], parser: ProgressParser, report: Callable[[Progress], None],
+                   progressStream='stdout', stdin: int = None,
+                   pcm: Callable[[asyncio.StreamReader], Awaitable[None]] = None) -> Progress:
+        """
+        run encoder and read its progress until exit
+
+        :param args: command
+        :param parser: parser of encoder output
+        :param report: progress callback. Gets errors too
+        :param progressStream: stdout or stderr where encoder write progress
+        :param stdin: fd of pipe read end. It is closed after start, so only encoder hold it
+        :param pcm: consumer of stdout, when progress is in stderr
+        :return: final event
+        """
+        log.debug(args)
+        if pcm is not None:
+            kwargs = {'stdout': PIPE, 'stderr': PIPE}
+        elif progressStream == 'stdout':
+            kwargs = {'stdout': PIPE, 'stderr': STDOUT}
+        else:
+            kwargs = {'stdout': DEVNULL, 'stderr': PIPE}
+
+        try:
+            proc = await spawn_async(args, group=True, stdin=DEVNULL if stdin is None else stdin, **kwargs)
+        finally:
+            if stdin is not None:
+                os.close(stdin)
+        self.token.register(proc.pid)
+
+        stream = proc.stdout if progressStream == 'stdout' and pcm is None else proc.stderr
+        consumer = asyncio.create_task(pcm(proc.stdout)) if pcm is not None else None
+        name = os.path.basename(args[0])
+        errors = []
+
+        try:
+            while True:
+                data = await self._read(stream)
+                if not data:
+                    break
+                for event in parser.feed(data):
+                    if event.error:
+                        log.error(f'{name}: {event.error}')
+                        errors.append(event.error)
+                    report(event)
+            if consumer is not None:
+                await consumer
+            await proc.wait()
+        finally:
+            self.token.unregister(proc.pid)
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            if consumer is not None and not consumer.done():
+                consumer.cancel()
+
+        if proc.returncode != 0:
+            # killed by cancel
+            self.token.check()
+            raise RuntimeError(f'{name} exit with code {proc.returncode}: {" ".join(errors)}')
+
+        event = parser.finish()
+        report(event)
+        return event
+
+    def _prepare_out(self, slot: int, fileOut: str, fileIn: str) -> bool:
+        """
+        check output file and create output directory
+
+        :param fileOut: output
+        :param fileIn: source of output
+        :return: False if output must be skipped
+        """
+        outputs = self._outputs.setdefault(slot, {}).setdefault(fileIn, {})
+        outputs[fileOut] = False
+        # replaced outputs are encoded again, unless they are done by interrupted job that is resumed
+        if (self.journal is not None and (not self.replaceOutFile or fileIn in self._resumed)
+                and self.journal.is_done(fileOut, fileIn, self._profileKey)):
+            log.info(f'engine {slot}: done by previous run {fileOut}')
+            self._emit(slot, 'exists', fileOut)
+            outputs[fileOut] = True
+            return False
+
+        exists = self.plan.exists(fileOut) if self.plan is not None else os.path.exists(fileOut)
+        if exists:
+            # output of interrupted run may have no tags
+            if not self.replaceOutFile and not (self.journal is not None and fileOut in self.journal.started):
+                log.info(f'engine {slot}: exists {fileOut}')
+                self._emit(slot, 'exists', fileOut)
+                outputs[fileOut] = True
+                return False
+            self._start_out(slot, fileOut)
+            return True
+
+        outDir = os.path.dirname(fileOut)
+        # dirs of plan are created before run
+        if outDir and not (self.plan is not None and self.plan.ready(fileOut)) and not os.path.exists(outDir):
+            try:
+                create_dirs((outDir,))
+            except Exception as e:
+                log.error(f'engine {slot}: create out dir: {e}')
+                self._emit(slot, 'error', fileOut, message=f'create out dir: {e}')
+                return False
+        self._start_out(slot, fileOut)
+        return True
+
+    async def _save_tags(self, fileOut: str, afile: AudioFile, clear=False) -> None:
+        """
+        :param clear: output is from cache and has tags of source it was encoded from
+        """
+        try:
+            await self._loop.run_in_executor(None, self.converter.tagEditor.save_file, fileOut, afile, clear)
+        except Exception as e:
+            raise RuntimeError(f'Set metadata for result file: {e}')
+
+    async def _copy(self, task: ConverterTask, outputs: List[str]) -> None:
+        """
+        copy source into temp names of outputs. Edited MP3 is spliced with new tags by copier,
+        other copies with edits get tags by tag save. Links are the source itself and keep its tags
+        """
+        copier = self.converter.copier
+        parts = [part_name(i) for i in outputs]
+        await self._loop.run_in_executor(None, copier.copy_to_many, task.afile.filename, parts,
+                                         task.metadata.mfile.tags)
+        if (task.edits and not task.afile.filename.lower().endswith('.mp3')
+                and copier.mode not in ('hardlink', 'symlink')):
+            for part in parts:
+                await self._save_tags(part, task.metadata)
+
+    async def _run_task(self, slot: int, task: ConverterTask) -> None:
+        """
+        convert lossless source, remux source that already have output codec, copy others
+        """
+        ext = task.baseName[task.baseName.rfind('.') + 1:].lower()
+        if ext not in KNOWN_FORMAT:
+            return
+
+        if self.converter.profiles:
+            await self._run_fanout(slot, task, ext)
+            return
+
+        log.info(f'engine {slot}: convert {task.afile.filename} -> {task.fileOut}')
+        self._emit(slot, 'start', f'{task.qTreePath}{task.baseName}')
+        fileOut = f'{self.outPath}{task.fileOut}'
+        isLossLess = self._is_lossless(task.stream, ext)
+        canRemux = not isLossLess and self.converter.can_remux(task.stream, ext, task.ext)
+        # copy has own output name
+        if (isLossLess or canRemux) and not self._prepare_out(slot, fileOut, task.afile.filename):
+            return
+
+        started = time.monotonic()
+        if isLossLess:
+            key = await self._cache_key(task.afile.filename, fileOut)
+            cached = await self._fetch(slot, key, part_name(fileOut))
+            segments = self._segments(fileOut, task.stream)
+            if cached:
+                event = Progress(100, task.stream.duration, 0.0, os.path.getsize(part_name(fileOut)), 0.0)
+            elif segments:
+                event = await self._convert_segments(slot, task.afile.filename, part_name(fileOut), task.stream,
+                                                     segments)
+            else:
+                event = await self._convert(slot, task.afile.filename, part_name(fileOut), task.stream)
+            if not cached:
+                await self._store(key, part_name(fileOut))
+            await self._save_tags(part_name(fileOut), task.metadata, cached)
+            self._commit(slot, fileOut)
+            await self._record(slot, fileOut, task.afile.filename)
+            # time of segments is not time of one worker
+            if not segments and not cached:
+                self._learn(task.stream, started)
+            log.info(f'engine {slot}: Done: {task.fileOut} '
+                     f'{task.stream.duration:.0f}s at {event.speed:.1f}x, {event.size} bytes')
+            self._emit(slot, 'done', task.fileOut)
+
+        elif canRemux:
+            await self._remux(slot, task.afile.filename, part_name(fileOut), task.stream)
+            await self._save_tags(part_name(fileOut), task.metadata)
+            self._commit(slot, fileOut)
+            await self._record(slot, fileOut, task.afile.filename)
+            self._learn(task.stream, started)
+            log.info(f'engine {slot}: Remux: {task.fileOut}')
+            self._emit(slot, 'remux', task.fileOut)
+
+        else:
+            task.fileOut = f'{task.qTreePath}{task.copyName}'
+            fileOut = f'{self.outPath}{task.fileOut}'
+            if self._prepare_out(slot, fileOut, task.afile.filename):
+                log.info(f'engine {slot}: copy {task.afile.filename}')
+                await self._copy(task, [fileOut])
+                self._commit(slot, fileOut)
+                await self._record(slot, fileOut, task.afile.filename)
+                self._learn(task.stream, started)
+                self._emit(slot, 'copy', task.fileOut)
+
+    async def _convert(self, slot: int, fileIn: str, fileOut: str, stream: StreamInfo,
+                       span: Tuple[float, float] = None, reporter: Callable[..., Callable[[Progress], None]] = None
+                       ) -> Progress:
+        """
+        encode one output: encoder read source directly, WAV from ffmpeg through pipe
+        or WAV from temp file.
+
+        :param span: start and length of source to encode, see FFmpeg.encode_args. Only ffmpeg can cut
+            source, so other encoders read WAV in this case. PyAV spans are encoded by ffmpeg with the same settings
+        :param reporter: progress callback factory like _reporter without slot
+        :return: final progress event
+        """
+        encoder = self.converter.encoder
+        ffmpeg = self.converter.ffmpeg
+        if reporter is None:
+            reporter = partial(self._reporter, slot)
+
+        duration = stream.duration
+        if span is not None:
+            duration = span[1] or duration - span[0]
+        if encoder.inProcess and span is None:
+            return await self._encode_in_process(fileIn, fileOut, duration, reporter())
+        if not duration:
+            duration = await self._loop.run_in_executor(None, ffmpeg.duration, fileIn)
+
+        needWav = encoder.needWav
+        if needWav and span is None and encoder.read_directly(fileIn[fileIn.rfind('.') + 1:].lower(), stream.codec):
+            log.debug(f'{encoder.name} read {fileIn} directly')
+            needWav = False
+
+        if not needWav:
+            args = encoder.encode_args(fileIn, fileOut) if span is None else ffmpeg.encode_args(
+                fileIn, fileOut, encoder.settings, span=span)
+            return await self._run(args, encoder.progress(duration), reporter(), encoder.progressStream)
+
+        if encoder.readStdin and cfg.pipeWav:
+            return await self._convert_piped(slot, fileIn, fileOut, duration, span, reporter)
+
+        # 30% reserved for WAV
+        tmpName = f'{cfg.tempPath}/{uuid4()}.wav'
+        try:
+            await self._run(ffmpeg.encode_args(fileIn, tmpName, params=['-acodec', 'pcm_s16le'], span=span),
+                            ffmpeg.progress(duration), reporter(0, .3, eta=False))
+            return await self._run(encoder.encode_args(tmpName, fileOut), encoder.progress(duration),
+                                   reporter(30, .7), encoder.progressStream)
+        finally:
+            try:
+                os.remove(tmpName)
+            except OSError:
+                pass
+
+    async def _encode_in_process(self, fileIn: str, fileOut: str, duration: float,
+                                 report: Callable[[Progress], None]) -> Progress:
+        """
+        encode by encoder inside of this process in executor thread. Cancel and pause are checked by encoder
+        for each frame
+
+        :return: final progress event
+        """
+        encoder = self.converter.encoder
+
+        def encode() -> Progress:
+            event = Progress()
+            for event in encoder.encode(fileIn, fileOut, duration=duration, token=self.token):
+                self._loop.call_soon_threadsafe(report, event)
+            return event
+
+        return await self._loop.run_in_executor(None, encode)
+
+    async def _convert_piped(self, slot: int, fileIn: str, fileOut: str, duration: float,
+                             span: Tuple[float, float] = None,
+                             reporter: Callable[..., Callable[[Progress], None]] = None) -> Progress:
+        """
+        ffmpeg decode file into pipe and encoder read it from stdin. Pipe is created by os.pipe,
+        so WAV goes from process to process and engine hold no end of it.
+        """
+        encoder = self.converter.encoder
+        args = self.converter.ffmpeg.pcm_args(fileIn, span=span)
+        log.debug(args)
+        if reporter is None:
+            reporter = partial(self._reporter, slot)
+
+        fdIn, fdOut = os.pipe()
+        try:
+            decoder = await spawn_async(args, group=True, stdout=fdOut, stderr=PIPE)
+        except Exception:
+            os.close(fdIn)
+            raise
+        finally:
+            os.close(fdOut)
+        self.token.register(decoder.pid)
+
+        errors = asyncio.create_task(decoder.stderr.read())
+        try:
+            event = await self._run(encoder.encode_args('-', fileOut), encoder.progress(duration),
+                                    reporter(), encoder.progressStream, stdin=fdIn)
+            # encoder may exit before read all. Decoder will be stopped by broken pipe
+            await decoder.wait()
+        finally:
+            self.token.unregister(decoder.pid)
+            if decoder.returncode is None:
+                decoder.kill()
+                await decoder.wait()
+
+        if decoder.returncode != 0:
+            self.token.check()
+            error = (await errors).decode('utf-8', errors='replace').strip()
+            raise RuntimeError(f'Decode to WAV: {error}')
+        return event
+
+    def _segments(self, fileOut: str, stream: StreamInfo) -> List[Segment]:
+        """
+        :return: segments of long source, one for each worker. Empty if source is encoded by one pass
+        """
+        if not cfg.segmentDuration or stream.duration < 2 * cfg.segmentDuration or not stream.sampleRate:
+            return []
+
+        encoder = self.converter.encoder
+        if encoder.output_codec() != 'aac' or fileOut[fileOut.rfind('.') + 1:].lower() not in SEGMENT_FORMATS:
+            return []
+
+        count = min(self.active, int(stream.duration // cfg.segmentDuration))
+        rate = getattr(encoder.settings, 'rate', 'auto')
+        grid = frame_grid(stream.sampleRate, int(rate) if rate.isdigit() else 48000)
+        segments = plan_segments(stream.duration, count, grid)
+        return segments if len(segments) > 1 else []
+
+    def _segment_reporter(self, slot: int, states: List[Progress], n: int) -> Callable[..., Callable[[Progress], None]]:
+        """
+        progress callback factory of one segment. All segments are reported as one progress of worker
+        """
+        def reporter(offset=0, factor=1.0, eta=True) -> Callable[[Progress], None]:
+            def report(event: Progress) -> None:
+                if event.error:
+                    return
+                self.audioDone += max(event.outTime - states[n].outTime, 0.0)
+                states[n] = Progress(offset + event.percent * factor, event.outTime, event.speed, event.size,
+                                     event.eta if eta else -1.0)
+                self._emit(slot, 'progress', progress=Progress(
+                    int(sum(i.percent for i in states) / len(states) * .99), sum(i.outTime for i in states),
+                    sum(i.speed for i in states), sum(i.size for i in states), max(i.eta for i in states)))
+            return report
+        return reporter
+
+    async def _convert_segments(self, slot: int, fileIn: str, fileOut: str, stream: StreamInfo,
+                                segments: List[Segment]) -> Progress:
+        """
+        encode segments of long source at once, each by own encoder, and join them by whole packets.
+        Segments are encoded with preroll and postroll which are dropped by join, encoder delay of
+        the first segment is kept in output. So output has the same length as one pass encoding and no gaps.
+        """
+        ffmpeg = self.converter.ffmpeg
+        ext = fileOut[fileOut.rfind('.'):]
+        base = os.path.abspath(f'{cfg.tempPath}/{uuid4()}')
+        parts = [f'{base}.{n}{ext}' for n in range(len(segments))]
+        trimmed = [f'{base}.{n}.trim{ext}' for n in range(len(segments))]
+        listName = f'{base}.txt'
+        states = [Progress() for _ in segments]
+        starts = [0.0] * len(segments)
+        log.info(f'engine {slot}: encode {fileIn} by {len(segments)} segments')
+
+        async def encode(n: int) -> None:
+            await self._convert(slot, fileIn, parts[n], stream, segments[n].span(),
+                                self._segment_reporter(slot, states, n))
+            starts[n], frame = await self._loop.run_in_executor(None, ffmpeg.packet_info, parts[n])
+            await self._run(ffmpeg.trim_args(parts[n], trimmed[n], *segments[n].packets(frame)),
+                            ffmpeg.progress(), lambda event: None)
+
+        jobs = [asyncio.create_task(encode(n)) for n in range(len(segments))]
+        try:
+            await asyncio.gather(*jobs)
+            with open(listName, 'w', encoding='utf-8') as f:
+                f.write(concat_list(trimmed))
+            event = await self._run(ffmpeg.concat_args(listName, fileOut, starts[0]),
+                                    ffmpeg.progress(stream.duration), lambda event: None)
+        finally:
+            for job in jobs:
+                job.cancel()
+            await asyncio.gather(*jobs, return_exceptions=True)
+            for name in (*parts, *trimmed, listName):
+                try:
+                    os.remove(name)
+                except OSError:
+                    pass
+
+        return Progress(100, stream.duration, sum(i.speed for i in states), event.size, 0.0)
+
+    async def _remux(self, slot: int, fileIn: str, fileOut: str, stream: StreamInfo) -> Progress:
+        ffmpeg = self.converter.ffmpeg
+        return await self._run(ffmpeg.encode_args(fileIn, fileOut, params=['-map', '0:a:0', '-acodec', 'copy']),
+                               ffmpeg.progress(stream.duration), self._reporter(slot, count=False))
+
+    async def _run_batch(self, slot: int, batch: ConverterBatch) -> None:
+        """
+        convert short lossless files by one ffmpeg process. Files failed in batch are converted one by one
+        """
+        tasks = [i for i in batch.tasks if self._prepare_out(slot, f'{self.outPath}{i.fileOut}', i.afile.filename)]
+        if not tasks:
+            return
+
+        log.info(f'engine {slot}: convert batch of {len(tasks)} files')
+        self._emit(slot, 'start', f'{tasks[0].qTreePath} ({len(tasks)} files)')
+
+        keys = [await self._cache_key(i.afile.filename, f'{self.outPath}{i.fileOut}') for i in tasks]
+        cached = [i for i, key in zip(tasks, keys)
+                  if await self._fetch(slot, key, part_name(f'{self.outPath}{i.fileOut}'))]
+        for task in cached:
+            await self._finish_batch_task(slot, task, cached=True)
+        keys = [key for i, key in zip(tasks, keys) if i not in cached]
+        tasks = [i for i in tasks if i not in cached]
+        if not tasks:
+            return
+
+        ffmpeg = self.converter.ffmpeg
+        files = [(i.afile.filename, part_name(f'{self.outPath}{i.fileOut}')) for i in tasks]
+        durations = [i.stream.duration for i in tasks]
+        percents = [0] * len(tasks)
+        failed = set()
+
+        def report(event: Progress) -> None:
+            if event.error:
+                match = FILE_INDEX.search(event.error)
+                failed.add(int(match.group(1)) if match else -1)
+                return
+
+            for n, duration in enumerate(durations):
+                if n not in failed:
+                    done = min(event.outTime, duration)
+                    self.audioDone += max(done - duration * percents[n] / 100, 0.0)
+                    percents[n] = min(int(100 / duration * done), 100)
+            self._emit(slot, 'progress', progress=Progress(
+                int(sum(percents) / len(percents) * .99), event.outTime, event.speed))
+
+        started = time.monotonic()
+        try:
+            await self._run(ffmpeg.batch_args(files), ffmpeg.progress(max(durations)), report)
+            if not failed:
+                self.costs.learn(self.costs.key(self._encoder_name(), tasks[0].stream), sum(durations),
+                                 time.monotonic() - started)
+        except Cancelled:
+            raise
+        except Exception as e:
+            log.error(f'engine {slot}: batch processing: {e}')
+            failed.update(range(len(tasks)))
+
+        for n, task in enumerate(tasks):
+            await self._finish_batch_task(slot, task, n in failed or not os.path.isfile(files[n][1]), keys[n])
+
+    async def _finish_batch_task(self, slot: int, task: ConverterTask, failed=False, key='', cached=False) -> None:
+        """
+        set tags of batch output. Output failed in batch is converted alone
+
+        :param key: cache key of encoded output
+        :param cached: output is from cache
+        """
+        fileOut = f'{self.outPath}{task.fileOut}'
+        try:
+            if failed:
+                log.warning(f'convert {task.afile.filename} without batch')
+                await self._convert(slot, task.afile.filename, part_name(fileOut), task.stream)
+            await self._store(key, part_name(fileOut))
+            await self._save_tags(part_name(fileOut), task.metadata, cached)
+            self._commit(slot, fileOut)
+            await self._record(slot, fileOut, task.afile.filename)
+        except Cancelled:
+            raise
+        except Exception as e:
+            log.error(f'engine {slot}: {task.fileOut}: {e}')
+            self._emit(slot, 'error', task.fileOut, message=str(e))
+        else:
+            log.info(f'engine {slot}: Done: {task.fileOut}')
+            self._emit(slot, 'done', task.fileOut)
+
+    async def _run_fanout(self, slot: int, task: ConverterTask, ext: str) -> None:
+        """
+        make outputs of all profiles from one source: output chosen in GUI and profiles from settings.
+        Lossless source is decoded once for all encoders, copies are written by one read pass
+        """
+        profiles = [OutputProfile('', self.outPath, self.converter.encoder), *self.converter.profiles]
+        self._emit(slot, 'start', f'{task.qTreePath}{task.baseName}')
+
+        isLossLess = self._is_lossless(task.stream, ext)
+
+        encode: List[Tuple[OutputProfile, str]] = []
+        remux: List[str] = []
+        copy: List[str] = []
+        for profile in profiles:
+            if profile.encoder is not None and isLossLess:
+                encode.append((profile, profile.file_out(task)))
+            elif self.converter.can_remux(task.stream, ext, profile.ext, profile):
+                remux.append(profile.file_out(task))
+            else:
+                copy.append(profile.file_out(task, encoded=False))
+
+        encode = [i for i in encode if self._prepare_out(slot, i[1], task.afile.filename)]
+        remux = [i for i in remux if self._prepare_out(slot, i, task.afile.filename)]
+        copy = [i for i in copy if self._prepare_out(slot, i, task.afile.filename)]
+        log.info(f'engine {slot}: {task.afile.filename} -> {len(encode)} encoded, '
+                 f'{len(remux)} remuxed, {len(copy)} copied')
+
+        keys: Dict[str, str] = {}
+        if encode and self.converter.cache is not None:
+            try:
+                payload = await self._loop.run_in_executor(None, payload_hash, task.afile.filename)
+            except OSError as e:
+                log.warning(f'payload hash of {task.afile.filename}: {e}')
+                payload = ''
+            for profile, fileOut in encode:
+                keys[fileOut] = await self._cache_key(task.afile.filename, fileOut, profile, payload)
+
+            cached = [i for i in encode if await self._fetch(slot, keys[i[1]], part_name(i[1]))]
+            encode = [i for i in encode if i not in cached]
+            for _, fileOut in cached:
+                await self._save_tags(part_name(fileOut), task.metadata, clear=True)
+                self._commit(slot, fileOut)
+                await self._record(slot, fileOut, task.afile.filename)
+                self._emit(slot, 'done', fileOut)
+
+        if encode:
+            started = time.monotonic()
+            await self._encode_fanout(slot, task, encode, keys)
+            self._learn(task.stream, started)
+
+        for fileOut in remux:
+            await self._remux(slot, task.afile.filename, part_name(fileOut), task.stream)
+            await self._save_tags(part_name(fileOut), task.metadata)
+            self._commit(slot, fileOut)
+            await self._record(slot, fileOut, task.afile.filename)
+            self._emit(slot, 'remux', fileOut)
+
+        if copy:
+            await self._copy(task, copy)
+            for fileOut in copy:
+                self._commit(slot, fileOut)
+                await self._record(slot, fileOut, task.afile.filename)
+                self._emit(slot, 'copy', fileOut)
+
+    async def _encode_fanout(self, slot: int, task: ConverterTask, outputs: List[Tuple[OutputProfile, str]],
+                             keys: Dict[str, str] = None) -> None:
+        """
+        decode source once and encode it for several profiles by one ffmpeg graph. WAV output of the graph
+        is written into QAAC encoders by the loop
+
+        :param keys: cache keys of outputs
+        """
+        ffmpeg = self.converter.ffmpeg
+        qaac = self.converter.qaac
+        # PyAV has ffmpeg settings and codecs, its outputs are encoded by the same graph
+        ffOutputs: List[Tuple[Settings, str]] = [(p.settings, f) for p, f in outputs
+                                                 if p.encoder is ffmpeg or p.encoder.inProcess]
+        qaacOutputs: List[Tuple[Settings, str]] = [(p.settings, f) for p, f in outputs if p.encoder is qaac]
+
+        duration = task.stream.duration
+        if not duration:
+            duration = await self._loop.run_in_executor(None, ffmpeg.duration, task.afile.filename)
+
+        encoders = []
+        for settings, fileOut in qaacOutputs:
+            args = qaac.encode_args('-', part_name(fileOut), settings)
+            log.debug(args)
+            encoders.append(await spawn_async(args, group=True, stdin=PIPE, stdout=DEVNULL, stderr=PIPE))
+            self.token.register(encoders[-1].pid)
+
+        async def read_errors(proc) -> List[str]:
+            parser = QaacProgress()
+            return [i.error for i in parser.feed(await proc.stderr.read() + b'\n') if i.error]
+
+        async def tee(stdout: asyncio.StreamReader) -> None:
+            sinks = [i.stdin for i in encoders]
+            while True:
+                data = await stdout.read(65536)
+                if not data:
+                    break
+                for sink in tuple(sinks):
+                    try:
+                        sink.write(data)
+                        await sink.drain()
+                    except (BrokenPipeError, ConnectionResetError):
+                        sinks.remove(sink)
+            for sink in sinks:
+                sink.close()
+
+        readers = [asyncio.create_task(read_errors(i)) for i in encoders]
+        try:
+            await self._run(ffmpeg.multi_args(task.afile.filename, [(s, part_name(f)) for s, f in ffOutputs],
+                                              bool(encoders)),
+                            ffmpeg.progress(duration), self._reporter(slot),
+                            pcm=tee if encoders else None)
+            for proc in encoders:
+                await proc.wait()
+        finally:
+            for proc in encoders:
+                self.token.unregister(proc.pid)
+                if proc.returncode is None:
+                    proc.kill()
+                    await proc.wait()
+
+        failed = {}
+        done = [f for _, f in ffOutputs]
+        for (_, fileOut), proc, reader in zip(qaacOutputs, encoders, readers):
+            if proc.returncode != 0:
+                failed[fileOut] = f'qaac exit with code {proc.returncode}: {" ".join(await reader)}'
+            elif not os.path.isfile(part_name(fileOut)):
+                failed[fileOut] = 'No result file'
+            else:
+                done.append(fileOut)
+
+        for fileOut in done:
+            await self._store((keys or {}).get(fileOut, ''), part_name(fileOut))
+
+        for fileOut in done:
+            try:
+                await self._save_tags(part_name(fileOut), task.metadata)
+                self._commit(slot, fileOut)
+                await self._record(slot, fileOut, task.afile.filename)
+            except Exception as e:
+                failed[fileOut] = str(e)
+            else:
+                self._emit(slot, 'done', fileOut)
+
+        for fileOut, error in failed.items():
+            log.error(f'engine {slot}: {fileOut}: {error}')
+            self._discard_out(slot, fileOut)
+            self._emit(slot, 'error', fileOut, message=error)
@@ -1,18 +1,28 @@
-import os
-from subprocess import Popen, PIPE, DEVNULL, STDOUT
-from typing import Tuple, Dict, Iterator
+import re
+from subprocess import PIPE
+from typing import Tuple, List
 
 from .encoder import Encoder, Settings
+from .process import spawn
+from .progress import ProgressParser, FFmpegProgress
 from myTunes.config import cfg, log
 
 
 CODEC_FORMAT = {
     'aac': ('m4a', 'aac', 'mp4'),
     'libfdk_aac': ('m4a', 'aac', 'mp4'),
-    'wavpack': ('wav',),
+    'wavpack': ('wv',),
     'opus': ('ogg',),
 }
 
+# ffmpeg encoder to codec in terms of service.codec
+CODEC_NAME = {
+    'libfdk_aac': 'aac',
+}
+
+# file index in ffmpeg logs: in#1, out#1, aist#1:0, aost#1:0
+FILE_INDEX = re.compile(r'(?:in|out|[a-z]?[io]st)#(\d+)')
+
 ls = []
 for i in CODEC_FORMAT.values():
     ls.extend(i)
@@ -45,23 +55,45 @@ class SettingsFF(Settings):
                 'attr': 'format'},
         }
 
+    def args(self) -> List[str]:
+        self.verify()
+
+        args = ['-acodec', self.codec]
+        # wavpack is lossless
+        if self.codec != 'wavpack':
+            args += ['-b:a', f'{self.bitrate}k']
+        # native aac encoder has only LC profile
+        if self.he and self.codec == 'libfdk_aac':
+            args += ['-profile:a', 'aac_he']
+        if self.rate not in ('keep', 'auto'):
+            args += ['-ar', self.rate]
+        # native opus encoder is experimental
+        if self.codec == 'opus':
+            args += ['-strict', '-2']
+        return args
+
+    def stringify(self) -> str:
+        return ' '.join(self.args())
+
+    def verify(self) -> None:
+        assert self.codec in CODEC_FORMAT, ValueError(f'Unknown codec {self.codec}')
+
 
 class FFmpeg(Encoder):
     def __init__(self):
         self.name = 'FFmpeg'
         self.needWav = False
+        self.batch = True
         self.exe = cfg.ffmpeg
         self.settings = SettingsFF()
         self._check()
 
     def _check(self):
-        proc = Popen(
-            f'"{self.exe}" -version',
-            shell=True,
+        proc = spawn(
+            [self.exe, '-version'],
             encoding='cp866',
             stdout=PIPE,
             stderr=PIPE,
-            stdin=DEVNULL,
         )
         stdout: [Tuple[bytes, bytes]] = proc.communicate()
 
@@ -75,59 +107,130 @@ class FFmpeg(Encoder):
             log.info(lines[0])
             log.debug(stdout[0][len((lines[0])):])
 
-    def file_info(self, file: str) -> Dict[str, str]:
+    def encode_args(self, fileIn: str, fileOut: str, settings: SettingsFF = None,
+                    params: List[str] = None, span: Tuple[float, float] = None) -> List[str]:
         """
-        get information about audio file
-        
-        :param file: path to file
-        :return: attributes
-        
+        converting to mp4 (m4a, mov etc) with cover in metadata can raise ffmpeg exception. For this used
+        -disposition:v -attached_pic. See 8947 ticket
+
+        :param params: raw encoder arguments instead of settings
+        :param span: start and length of source in seconds. Length 0 means till the end
         """
-        info: Dict[str, str] = {}
+        if params is None:
+            params = (settings or self.settings).args()
 
-        cmd = f'{self.exe} -i "{file}"'
-        log.debug(cmd)
+        return [self.exe, *self._span_args(span), '-i', fileIn, '-hide_banner', '-nostats', '-y',
+                '-disposition:v', '-attached_pic', '-vn', '-progress', '-', *params, fileOut]
 
-        proc = Popen(
-            cmd,
-            shell=True,
-            encoding='cp866',
-            stdout=PIPE,
-            stderr=PIPE,
-            stdin=DEVNULL)
+    def pcm_args(self, fileIn: str, codec: str = 'pcm_s16le', span: Tuple[float, float] = None) -> List[str]:
+        """
+        command to decode file into WAV in stdout. Only errors are written in stderr
+        """
+        return [self.exe, '-hide_banner', '-nostats', '-v', 'error', *self._span_args(span), '-i', fileIn, '-vn',
+                '-acodec', codec, '-f', 'wav', '-']
 
-        stdout: [Tuple[bytes, bytes]] = proc.communicate()
+    @staticmethod
+    def _span_args(span: Tuple[float, float] | None) -> List[str]:
+        # input options, so decoded audio is cut at exact sample
+        if span is None:
+            return []
+        start, length = span
+        args = ['-ss', f'{start:.6f}']
+        if length:
+            args += ['-t', f'{length:.6f}']
+        return args
 
-        if stdout[0] != '' and stdout[1] != '':
-            log.warning('ffmpeg not respond')
+    def trim_args(self, fileIn: str, fileOut: str, first: int, end: int = 0) -> List[str]:
+        """
+        command to copy part of audio stream by packets, without encoding and seeking
 
-        parseMeta = False
-        lines = stdout[1].splitlines()
-        for line in lines:
-            line = line.strip()
-            if line.startswith('Metadata'):
-                parseMeta = True
-                continue
-            elif line.startswith('Duration'):
-                vals = line.split(', ')
-                info['duration'] = vals[0][9:]
-                info['start'] = vals[1][6:]
-                info['bitrate'] = vals[2][8:]
-                parseMeta = False
-            elif line.startswith('Stream'):
-                line = line[line.rfind('Audio') + 7:]
-                vals = line.split(', ')
-                info['stream'] = vals[0]
-                info['rate'] = vals[1]
-                info['channels'] = vals[2]
-                info['depth'] = vals[3]
-                break
-
-            if parseMeta:
-                idx = line.index(':')
-                info[line[:idx].strip()] = line[idx + 1:].strip()
-
-        return info
+        :param first: first kept packet
+        :param end: first dropped packet after kept ones. 0 means till the end
+        """
+        drop = []
+        if first:
+            drop.append(f'lt(n\\,{first})')
+        if end:
+            drop.append(f'gte(n\\,{end})')
+        bsf = ['-bsf:a', f'noise=drop={"+".join(drop)}'] if drop else []
+
+        return [self.exe, '-hide_banner', '-nostats', '-y', '-i', fileIn, '-map', '0:a:0', '-c', 'copy', *bsf,
+                '-progress', '-', fileOut]
+
+    def concat_args(self, listFile: str, fileOut: str, start: float = 0.0) -> List[str]:
+        """
+        command to join files of concat demuxer list into one without encoding
+
+        :param start: start time of output. Negative start is encoder delay, it is kept in output edit list
+        """
+        return [self.exe, '-hide_banner', '-nostats', '-y', '-itsoffset', f'{start:.6f}', '-f', 'concat',
+                '-safe', '0', '-i', listFile, '-map', '0:a:0', '-c', 'copy', '-progress', '-', fileOut]
+
+    def packet_info(self, fileIn: str) -> Tuple[float, float]:
+        """
+        probe first audio packet
+
+        :return: start time and duration of packet in seconds. Start is negative for encoder delay
+        """
+        args = [self.exe, '-hide_banner', '-v', 'error', '-i', fileIn, '-map', '0:a:0', '-c', 'copy',
+                '-frames:a', '1', '-f', 'framecrc', '-']
+        log.debug(args)
+        with spawn(args, encoding='utf-8', stdout=PIPE, stderr=PIPE) as proc:
+            stdout, stderr = proc.communicate()
+
+        timeBase = 0.0
+        for line in stdout.splitlines():
+            # #tb 0: 1/44100
+            if line.startswith('#tb'):
+                num, den = line.split(':')[1].split('/')
+                timeBase = int(num) / int(den)
+            elif line and not line.startswith('#') and timeBase:
+                # stream, dts, pts, duration, size, crc
+                values = [i.strip() for i in line.split(',')]
+                return int(values[2]) * timeBase, int(values[3]) * timeBase
+
+        raise RuntimeError(f'no audio packets in {fileIn}: {stderr.strip()}')
+
+    def batch_args(self, files: List[Tuple[str, str]]) -> List[str]:
+        """
+        command to convert many files, each input is mapped to own output
+
+        :param files: pairs of input and output file
+        """
+        args = [self.exe, '-hide_banner', '-nostats', '-y']
+        for fileIn, _ in files:
+            args += ['-i', fileIn]
+
+        params = self.settings.args()
+        for n, (_, fileOut) in enumerate(files):
+            args += ['-map', f'{n}:a:0', '-map_metadata', str(n), *params, fileOut]
+        args += ['-progress', '-']
+        return args
+
+    def multi_args(self, fileIn: str, outputs: List[Tuple[Settings, str]], pcm=False) -> List[str]:
+        """
+        command to decode file once and encode it into several outputs
+
+        :param fileIn:
+        :param outputs: settings and output file for each output
+        :param pcm: add WAV output into stdout. Progress is written into stderr in this case
+        """
+        args = [self.exe, '-hide_banner', '-nostats', '-y', '-i', fileIn]
+        for settings, fileOut in outputs:
+            args += ['-map', '0:a:0', *settings.args(), fileOut]
+
+        if pcm:
+            args += ['-map', '0:a:0', '-acodec', 'pcm_s16le', '-f', 'wav', '-', '-progress', 'pipe:2']
+        else:
+            args += ['-progress', '-']
+        return args
+
+    def progress(self, duration: float = 0.0) -> ProgressParser:
+        return FFmpegProgress(duration)
+
+    def output_codec(self, settings: SettingsFF = None) -> str:
+        codec = (settings or self.settings).codec
+        return CODEC_NAME.get(codec, codec)
 
     def _parse_duration(self, s: str) -> int:
         s = s.split('.')[0]
@@ -135,36 +238,15 @@ class FFmpeg(Encoder):
         dur = times[0] * 3600 + times[1] * 60 + times[2]
         return dur
 
-    def process_yield(self, fileIn: str, fileOut: str, settings: Dict[str, any] = None) -> Iterator[int]:
+    def duration(self, fileIn: str) -> float:
         """
-        Convert audio files with ffmpeg encoder
+        probe track duration
 
-        example call
-         ffmpeg -i sample.mp3 -acodec pcm_s16le -ar 44100 sample.wav
-         
-         A large majority of audio files use little-endian encoding (pcm_s24le), not big (pcm_s24be)
-         And most of them encoded as 16 bit (pcm_s16le)
-
-        converting to mp4 (m4a, mov etc) with cover in metadata can raise ffmpeg exception. For this used
-        -disposition:v -attached_pic. See 8947 ticket
-        
         :param fileIn:
-        :param fileOut:
-        :param settings: custom settings
-        :return: int
+        :return: duration in seconds. inf if ffmpeg don't know it
         """
-
-        # fileIn = fileIn.replace('/', '\\', -1)
-        assert os.path.isfile(fileIn), FileNotFoundError(fileIn)
-        
-        if settings:
-            paramsStr = ' '.join(' '.join((k, v)) for k, v in settings.items())
-        else:
-            paramsStr = ''
-        
         duration = 0
-        cmd = f'{self.exe} -i "{fileIn}"'
-        with Popen(cmd, shell=True, encoding='cp866', stdout=PIPE, stderr=PIPE, stdin=DEVNULL) as proc:
+        with spawn([self.exe, '-i', fileIn], encoding='cp866', stdout=PIPE, stderr=PIPE) as proc:
             for line in proc.stderr:
                 line = line.strip()
                 if not line:
@@ -178,43 +260,6 @@ class FFmpeg(Encoder):
                             duration = self._parse_duration(line[10:line.find('.')])
                         except Exception as e:
                             raise Exception(f'Parse ffmpeg track duration [{line}]: {e}')
-        
+
         assert duration > 0, f'file with zero duration: {fileIn}'
-        
-        duration2 = 0
-        cmd = (f'{self.exe} -i "{fileIn}" -hide_banner -nostats -y -disposition:v -attached_pic -vn -progress - '
-               f'{paramsStr} "{fileOut}"')
-        log.debug(cmd)
-        
-        # stderr return info; stdout return progres
-        error = ''
-
-        with Popen(cmd, shell=True, encoding='cp866',
-                   stdout=PIPE, stderr=STDOUT, stdin=DEVNULL,
-                   universal_newlines=True,
-                   ) as proc:
-
-            while proc.poll() is None:
-                done = 0
-
-                for line in proc.stdout:
-                    if line.startswith('out_time='):
-                        duration2 = self._parse_duration(line[9:line.find('.')])
-                    elif line.startswith('progress='):
-                        if line[9:].startswith('end'):
-                            yield 100
-                            break
-                    elif 'Error' in line:
-                        log.error(f'{line}')
-                        error += f'\n{line}'
-
-                    if done < 100 and duration:
-                        done = int((100/duration) * duration2)
-
-                    yield done
-
-                if error:
-                    log.error(f'ffmpeg: {error}')
-
-                if not os.path.isfile(fileOut):
-                    raise FileNotFoundError('No result file')
+        return duration
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Set
+from uuid import uuid4
+
+
+__all__ = ('Journal', 'part_name', 'file_hash')
+
+
+def part_name(fileOut: str) -> str:
+    """
+    temp name of output while it is written. Extension is kept, encoders choose container by it
+
+    :param fileOut: final output name
+    """
+    root, ext = os.path.splitext(fileOut)
+    return f'{root}.~part{ext}'
+
+
+def file_hash(fileName: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(fileName, 'rb') as f:
+        while True:
+            data = f.read(1 << 20)
+            if not data:
+                break
+            h.update(data)
+    return h.hexdigest()
+
+
+class Journal:
+    """
+    Append only log of conversion jobs, one JSON object per line. It survives crash of the app:
+    each line is written at once and a torn last line is ignored on load.
+
+    Records:
+        - job: job is started, with its id and planned sources
+        - start: output is being written
+        - done: output is complete, with source state, encoder profile, output size, mtime and checksum
+        - end: job is finished. Job cancelled by user is not ended, so it is resumed like crashed one
+
+    Output finished by previous run is skipped when its source and profile are the same and
+    output still has recorded size and checksum. Outputs started but not done are converted again.
+
+    Attributes:
+        path: journal file
+        job: id of current job
+        done: last done record of each output
+        started: outputs started and not done
+        interrupted: planned sources of previous job if it is not ended
+    """
+    # rewrite journal on load when it has more lines than this and twice the outputs
+    COMPACT = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self.job = ''
+        self.done: Dict[str, dict] = {}
+        self.started: Set[str] = set()
+        self.interrupted: List[str] = []
+        self._file = None
+
+        lines = self._load()
+        if lines > self.COMPACT and lines > 2 * (len(self.done) + len(self.started)):
+            self._compact()
+
+    def _load(self) -> int:
+        """
+        :return: count of lines
+        """
+        if not os.path.isfile(self.path):
+            return 0
+
+        lines = 0
+        planned: List[str] = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                    op = record['op']
+                except (ValueError, KeyError, TypeError):
+                    continue
+
+                if op == 'job':
+                    planned = record.get('sources', [])
+                elif op == 'end':
+                    planned = []
+                elif op == 'start':
+                    self.started.add(record['out'])
+                elif op == 'done':
+                    self.started.discard(record['out'])
+                    self.done[record['out']] = record
+
+        self.interrupted = planned
+        return lines
+
+    def _compact(self) -> None:
+        tmpName = f'{self.path}.tmp'
+        with open(tmpName, 'w', encoding='utf-8') as f:
+            if self.interrupted:
+                f.write(json.dumps({'op': 'job', 'id': '', 'sources': self.interrupted}) + '\n')
+            for out in self.started:
+                f.write(json.dumps({'op': 'start', 'out': out}) + '\n')
+            for record in self.done.values():
+                f.write(json.dumps(record) + '\n')
+        os.replace(tmpName, self.path)
+
+    def _write(self, record: dict) -> None:
+        if self._file is None:
+            torn = False
+            if os.path.isfile(self.path) and os.path.getsize(self.path):
+                with open(self.path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b'\n'
+            self._file = open(self.path, 'a', encoding='utf-8')
+            # torn line of crash must not join the next record
+            if torn:
+                self._file.write('\n')
+        self._file.write(json.dumps(record) + '\n')
+        # app may crash any time, line must be in file
+        self._file.flush()
+
+    def begin(self, sources: Iterable[str]) -> None:
+        """
+        start new job
+
+        :param sources: planned source files
+        """
+        self.job = uuid4().hex
+        self._write({'op': 'job', 'id': self.job, 'time': time.time(), 'sources': list(sources)})
+
+    def end(self) -> None:
+        """
+        finish current job. Interrupted job is not resumed after that
+        """
+        self._write({'op': 'end', 'id': self.job, 'time': time.time()})
+        self.job = ''
+        self.interrupted = []
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def start(self, fileOut: str) -> None:
+        self.started.add(fileOut)
+        self._write({'op': 'start', 'out': fileOut})
+
+    def finish(self, fileOut: str, fileIn: str, profile: str, checksum: str) -> None:
+        """
+        record complete output
+
+        :param fileOut: output, it must exist
+        :param fileIn: source
+        :param profile: encoder and settings which made output
+        :param checksum: file_hash of output
+        """
+        src = os.stat(fileIn)
+        out = os.stat(fileOut)
+        record = {'op': 'done', 'out': fileOut, 'src': fileIn, 'srcSize': src.st_size, 'srcTime': src.st_mtime_ns,
+                  'profile': profile, 'size': out.st_size, 'time': out.st_mtime_ns, 'hash': checksum}
+        self.started.discard(fileOut)
+        self.done[fileOut] = record
+        self._write(record)
+
+    def is_done(self, fileOut: str, fileIn: str, profile: str) -> bool:
+        """
+        output is made from the same source by the same profile and is not changed since then.
+        Output with changed mtime and the same size is checked by checksum
+        """
+        record = self.done.get(fileOut)
+        if record is None or fileOut in self.started or record['src'] != fileIn or record['profile'] != profile:
+            return False
+
+        try:
+            src = os.stat(fileIn)
+            out = os.stat(fileOut)
+        except OSError:
+            return False
+
+        if (src.st_size, src.st_mtime_ns) != (record['srcSize'], record['srcTime']) or out.st_size != record['size']:
+            return False
+        if out.st_mtime_ns == record['time']:
+            return True
+        try:
+            return file_hash(fileOut) == record['hash']
+        except OSError:
+            return False
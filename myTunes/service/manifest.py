@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Tuple
+
+
+__all__ = ('SyncManifest', 'MANIFEST_NAME')
+
+
+MANIFEST_NAME = '.mytunes-sync.json'
+
+
+class SyncManifest:
+    """
+    Sources synced into output root and their outputs. Kept in output root, so each destination
+    knows what it has. Source is synced again when its size, mtime or encoder settings are changed,
+    or one of its outputs is missing. Only stat calls are made, no file is read.
+
+    Entries: source path -> {size, mtime, profile hash, outputs, payload hash}. Outputs inside root
+    are relative to it, so root can be moved. Outputs of profiles in other roots are absolute.
+
+    Attributes:
+        root: output root
+        path: manifest file. Empty root means manifest is not saved
+        entries: entry by absolute source path
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root) if root else ''
+        self.path = os.path.join(self.root, MANIFEST_NAME) if root else ''
+        self.entries: Dict[str, dict] = {}
+        self._changed = False
+
+        if self.path and os.path.isfile(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = dict(json.load(f)['sources'])
+            except (OSError, ValueError, KeyError, TypeError):
+                # broken manifest is replaced by next save, all sources are synced again
+                self.entries = {}
+
+    @staticmethod
+    def profile_hash(profile: str) -> str:
+        """
+        :param profile: encoders and settings, see Engine._profile_key
+        """
+        return hashlib.sha1(profile.encode('utf-8')).hexdigest()[:16]
+
+    def _store(self, fileOut: str) -> str:
+        fileOut = os.path.abspath(fileOut)
+        if self.root and os.path.commonpath((self.root, fileOut)) == self.root:
+            return os.path.relpath(fileOut, self.root).replace('\\', '/')
+        return fileOut
+
+    def _load(self, fileOut: str) -> str:
+        return fileOut if os.path.isabs(fileOut) else os.path.join(self.root, fileOut)
+
+    def outputs(self, fileIn: str) -> List[str]:
+        """
+        :return: outputs of source from manifest
+        """
+        entry = self.entries.get(os.path.abspath(fileIn))
+        return [self._load(i) for i in entry['outputs']] if entry else []
+
+    def is_current(self, fileIn: str, profile: str) -> bool:
+        """
+        source is not changed since last sync and all its outputs exist
+
+        :param fileIn: source
+        :param profile: profile_hash of current settings
+        """
+        entry = self.entries.get(os.path.abspath(fileIn))
+        if entry is None or entry['profile'] != profile:
+            return False
+
+        try:
+            stat = os.stat(fileIn)
+        except OSError:
+            return False
+        if (stat.st_size, stat.st_mtime_ns) != (entry['size'], entry['mtime']):
+            return False
+        return all(os.path.isfile(i) for i in self.outputs(fileIn))
+
+    def payload(self, fileIn: str, profile: str) -> str:
+        """
+        payload hash of synced source when its outputs may be updated by tags only:
+        they are made by the same profile and exist
+
+        :return: empty string if source must be converted
+        """
+        entry = self.entries.get(os.path.abspath(fileIn))
+        if entry is None or entry['profile'] != profile or not entry.get('payload'):
+            return ''
+        if not all(os.path.isfile(i) for i in self.outputs(fileIn)):
+            return ''
+        return entry['payload']
+
+    def add(self, fileIn: str, outputs: Iterable[str], profile: str, payload='') -> None:
+        """
+        record synced source
+
+        :param fileIn: source
+        :param outputs: all outputs of source
+        :param profile: profile_hash
+        :param payload: see payload.payload_hash
+        """
+        stat = os.stat(fileIn)
+        self.entries[os.path.abspath(fileIn)] = {
+            'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'profile': profile,
+            'outputs': sorted(self._store(i) for i in outputs), 'payload': payload}
+        self._changed = True
+
+    def orphans(self) -> List[Tuple[str, List[str]]]:
+        """
+        sources removed since last sync. Source which directory is missing too is not taken,
+        it may be on unmounted drive
+
+        :return: source and its outputs
+        """
+        result = []
+        for fileIn in self.entries:
+            if not os.path.exists(fileIn) and os.path.isdir(os.path.dirname(fileIn)):
+                result.append((fileIn, self.outputs(fileIn)))
+        return result
+
+    def remove(self, fileIn: str) -> None:
+        if self.entries.pop(os.path.abspath(fileIn), None) is not None:
+            self._changed = True
+
+    def save(self) -> None:
+        if not self.path or not self._changed:
+            return
+
+        tmpName = f'{self.path}.tmp'
+        with open(tmpName, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'sources': self.entries}, f, separators=(',', ':'), sort_keys=True)
+        os.replace(tmpName, self.path)
+        self._changed = False
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import struct
+from typing import BinaryIO, Iterator, Tuple
+
+
+__all__ = ('payload_hash',)
+
+
+# bytes hashed by one read
+BLOCK = 1 << 20
+
+
+def _hash_range(f: BinaryIO, h, start: int, end: int) -> None:
+    f.seek(start)
+    left = end - start
+    while left > 0:
+        data = f.read(min(BLOCK, left))
+        if not data:
+            break
+        h.update(data)
+        left -= len(data)
+
+
+def _id3v2_size(head: bytes) -> int:
+    """
+    :param head: first 10 bytes of file
+    :return: bytes of ID3v2 tag at file start, 0 if there is no tag
+    """
+    if len(head) < 10 or head[:3] != b'ID3':
+        return 0
+    size = 0
+    for byte in head[6:10]:
+        size = (size << 7) | (byte & 0x7f)
+    # footer flag
+    return size + (20 if head[5] & 0x10 else 10)
+
+
+def _trailing_tags(f: BinaryIO, start: int, end: int) -> int:
+    """
+    :return: end of audio before ID3v1 and APEv2 tags at file end
+    """
+    while True:
+        if end - start >= 128:
+            f.seek(end - 128)
+            if f.read(3) == b'TAG':
+                end -= 128
+                continue
+        if end - start >= 32:
+            f.seek(end - 32)
+            footer = f.read(32)
+            if footer[:8] == b'APETAGEX':
+                size = struct.unpack('<I', footer[12:16])[0]
+                flags = struct.unpack('<I', footer[20:24])[0]
+                # size has footer, header is not counted
+                end -= size + (32 if flags & 0x80000000 else 0)
+                continue
+        return end
+
+
+def _chunks(f: BinaryIO, start: int, end: int, little: bool) -> Iterator[Tuple[bytes, int, int]]:
+    """
+    RIFF and IFF chunks
+
+    :return: chunk id, data start and size
+    """
+    pos = start
+    fmt = '<I' if little else '>I'
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size = struct.unpack(fmt, header[4:])[0]
+        yield header[:4], pos + 8, min(size, end - pos - 8)
+        pos += 8 + size + (size & 1)
+
+
+def _atoms(f: BinaryIO, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """
+    top level MP4 atoms
+
+    :return: atom type, data start and size
+    """
+    pos = 0
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, kind = struct.unpack('>I4s', f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield kind, pos + header, min(size, end - pos) - header
+        pos += size
+
+
+def _flac(f: BinaryIO, h, start: int, end: int) -> str:
+    pos = start + 4
+    while True:
+        f.seek(pos)
+        header = f.read(4)
+        if len(header) < 4:
+            return ''
+        last, kind, size = header[0] & 0x80, header[0] & 0x7f, int.from_bytes(header[1:], 'big')
+        if kind == 0:
+            # STREAMINFO has MD5 of decoded audio, set by all known encoders
+            md5 = f.read(size)[18:34]
+            if len(md5) == 16 and any(md5):
+                return f'flac:{md5.hex()}'
+        pos += 4 + size
+        if last:
+            break
+
+    _hash_range(f, h, pos, end)
+    return f'frames:{h.hexdigest()}'
+
+
+def payload_hash(fileName: str) -> str:
+    """
+    Hash of audio data without tags and artwork, so it is the same after tag edit.
+    Supported: FLAC, MP4, WAV, AIFF and frame streams with ID3 or APE tags (MP3, AAC, WavPack, APE).
+    Only file structure is read, audio is not decoded.
+
+    :return: empty string for other formats, like Ogg with tags inside stream pages
+    """
+    h = hashlib.blake2b(digest_size=16)
+    end = os.path.getsize(fileName)
+
+    with open(fileName, 'rb') as f:
+        head = f.read(12)
+        if head[4:8] == b'ftyp':
+            found = False
+            for kind, pos, size in _atoms(f, end):
+                if kind == b'mdat':
+                    _hash_range(f, h, pos, pos + size)
+                    found = True
+            return f'mdat:{h.hexdigest()}' if found else ''
+
+        if head[:4] == b'RIFF' and head[8:12] == b'WAVE' or head[:4] == b'FORM' and head[8:12] in (b'AIFF', b'AIFC'):
+            little = head[:4] == b'RIFF'
+            for kind, pos, size in _chunks(f, 12, end, little):
+                if kind == (b'data' if little else b'SSND'):
+                    _hash_range(f, h, pos, pos + size)
+                    return f'pcm:{h.hexdigest()}'
+            return ''
+
+        start = _id3v2_size(head)
+        f.seek(start)
+        magic = f.read(4)
+        end = _trailing_tags(f, start, end)
+        if magic == b'fLaC':
+            return _flac(f, h, start, end)
+        if magic in (b'wvpk', b'MAC ') or len(magic) >= 2 and magic[0] == 0xff and magic[1] & 0xe0 == 0xe0:
+            _hash_range(f, h, start, end)
+            return f'frames:{h.hexdigest()}'
+    return ''
@@ -0,0 +1,193 @@
+import os
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+from .converterTask import ConverterTask
+
+
+__all__ = ('Plan', 'PlanItem', 'estimate_size')
+
+
+# bitrate of tvbr outputs and encoders without bitrate setting, kbps
+DEFAULT_KBPS = 256
+LOSSLESS_CODECS = {'flac', 'alac', 'wavpack', 'ape'}
+
+
+def estimate_size(settings, codec: str, duration: float, sourceSize: int) -> int:
+    """
+    expected bytes of encoded output
+
+    :param settings: encoder settings of output
+    :param codec: output codec, lossless output is about as big as source
+    :param duration: audio seconds
+    :param sourceSize: bytes of source
+    """
+    if codec in LOSSLESS_CODECS:
+        return sourceSize
+
+    kbps = getattr(settings, 'bitrate', 0)
+    if not kbps or getattr(settings, 'mode', 'cbr') in ('tvbr', 'cvbr'):
+        kbps = DEFAULT_KBPS
+    return int(duration * kbps * 1000 / 8)
+
+
+class PlanItem:
+    """
+    What is done with one source
+
+    Attributes:
+        task: source
+        kind: skip - unknown format, unchanged - synced before, otherwise kind of the heaviest output
+        outputs: (kind, file, size) of each output. Kind is convert, remux, copy or exists
+    """
+    __slots__ = ('task', 'kind', 'outputs')
+
+    KINDS = ('convert', 'remux', 'copy', 'exists')
+
+    def __init__(self, task: ConverterTask, kind='', outputs: List[Tuple[str, str, int]] = None):
+        self.task = task
+        self.outputs = outputs or []
+        self.kind = kind or next((i for i in self.KINDS if any(o[0] == i for o in self.outputs)), 'skip')
+
+    def __repr__(self):
+        return f'PlanItem({self.task.baseName!r}, {self.kind}, {self.outputs})'
+
+
+class Plan:
+    """
+    Conversion planned before any worker starts. Output dirs are listed once, so workers don't check
+    existence of each output, output names of different sources which would overwrite each other
+    are renamed, and missing dirs are created by one pass.
+
+    Paths are compared by os.path.normcase, so names differing by case collide on Windows.
+
+    Attributes:
+        items: sources in task order
+        files: existing files of listed output dirs
+        dirs: listed output dirs which exist
+        missing: output dirs which must be created
+        renamed: (source, new output stem) of sources renamed because of collision
+        duration: audio seconds to encode
+        size: expected bytes written
+        seconds: expected run time, set by engine from its cost model
+    """
+
+    def __init__(self):
+        self.items: List[PlanItem] = []
+        self.files: Set[str] = set()
+        self.dirs: Set[str] = set()
+        self.missing: Set[str] = set()
+        self.renamed: List[Tuple[str, str]] = []
+        self.duration = 0.0
+        self.size = 0
+        self.seconds = 0.0
+        self._claimed: Set[str] = set()
+        self._listed: Set[str] = set()
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normcase(os.path.normpath(path))
+
+    def scan(self, dirs: Iterable[str]) -> None:
+        """
+        list output dirs by one scandir each. Dirs which can't be listed are created later
+
+        :param dirs: dirs of all outputs
+        """
+        for path in {self._key(i) for i in dirs if i}:
+            if path in self._listed:
+                continue
+            self._listed.add(path)
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            self.dirs.add(self._key(entry.path))
+                        else:
+                            self.files.add(self._key(entry.path))
+                self.dirs.add(path)
+            except (FileNotFoundError, NotADirectoryError):
+                self.missing.add(path)
+
+    def exists(self, fileOut: str) -> bool:
+        """
+        output existed when plan was made
+        """
+        return self._key(fileOut) in self.files
+
+    def claim(self, task: ConverterTask, outputs: Callable[[ConverterTask], List[str]]) -> List[str]:
+        """
+        reserve outputs of source. If output is reserved by other source, source is renamed to 'name (2)'
+
+        :param task: source, its output name is changed on collision
+        :param outputs: output files of task
+        :return: reserved outputs
+        """
+        stem = task.stem
+        n = 1
+        files = outputs(task)
+        while any(self._key(i) in self._claimed for i in files):
+            n += 1
+            task.rename(f'{stem} ({n})')
+            files = outputs(task)
+
+        if n > 1:
+            self.renamed.append((task.afile.filename, task.stem))
+        self._claimed.update(self._key(i) for i in files)
+        return files
+
+    def add(self, item: PlanItem, duration: float) -> None:
+        """
+        :param item: planned source
+        :param duration: audio seconds encoded for item
+        """
+        self.items.append(item)
+        self.duration += duration
+        self.size += sum(i[2] for i in item.outputs if i[0] != 'exists')
+
+    def create_dirs(self) -> List[Tuple[str, Exception]]:
+        """
+        create missing output dirs, parents first
+
+        :return: dirs which are not created and errors
+        """
+        errors = []
+        for path in sorted(self.missing, key=len):
+            try:
+                os.makedirs(path, exist_ok=True)
+                self.dirs.add(path)
+            except OSError as e:
+                errors.append((path, e))
+        self.missing.difference_update(self.dirs)
+        return errors
+
+    def ready(self, fileOut: str) -> bool:
+        """
+        output dir exists or is created by plan
+        """
+        return self._key(os.path.dirname(fileOut)) in self.dirs
+
+    def counts(self) -> Dict[str, int]:
+        """
+        :return: count of outputs by kind and count of skipped and unchanged sources
+        """
+        result = dict.fromkeys(('convert', 'remux', 'copy', 'exists', 'skip', 'unchanged'), 0)
+        for item in self.items:
+            if item.kind in ('skip', 'unchanged'):
+                result[item.kind] += 1
+            for kind, _, _ in item.outputs:
+                result[kind] += 1
+        return result
+
+    def report(self) -> List[str]:
+        """
+        :return: human readable lines
+        """
+        counts = self.counts()
+        lines = [f'{len(self.items)} sources: ' + ', '.join(f'{v} {k}' for k, v in counts.items() if v),
+                 f'to encode {self.duration / 60:.0f} min of audio, '
+                 f'to write about {self.size / 2 ** 20:.0f} MB, '
+                 f'expected time {self.seconds / 60:.1f} min']
+        if self.missing:
+            lines.append(f'{len(self.missing)} dirs to create')
+        lines += [f'renamed: {os.path.basename(src)} -> {stem}' for src, stem in self.renamed]
+        return lines
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+from functools import lru_cache
+from subprocess import Popen, DEVNULL
+from typing import Dict, List
+
+
+__all__ = ('resolve_exe', 'spawn', 'spawn_async', 'ENV')
+
+
+# environment for all tools. It is built once, so every call don't copy os.environ
+ENV: Dict[str, str] = dict(os.environ)
+
+
+@lru_cache(maxsize=None)
+def resolve_exe(exe: str) -> str:
+    """
+    get absolute path to executable. Names without directory are searched in PATH.
+
+    posix_spawn can be used only for absolute path, otherwise Popen fall back to fork + exec.
+
+    :param exe: path or name of executable
+    :return: absolute path or exe as is if it is not found
+    """
+    if os.path.dirname(exe):
+        return os.path.abspath(exe)
+
+    return shutil.which(exe) or exe
+
+
+@lru_cache(maxsize=None)
+def _starts_children(exe: str) -> bool:
+    """
+    script wrappers (qaac under wine, shell launchers) run the real encoder as their child.
+    Binaries like ffmpeg don't start children, they are signaled alone and need no own group.
+
+    :param exe: absolute path of executable
+    """
+    try:
+        with open(exe, 'rb') as f:
+            return f.read(2) == b'#!'
+    except OSError:
+        return False
+
+
+def _options(kwargs: Dict[str, any], group: bool) -> None:
+    kwargs.setdefault('stdin', DEVNULL)
+
+    if sys.platform == 'win32':
+        flags = subprocess.CREATE_NO_WINDOW
+        if group:
+            flags |= subprocess.CREATE_NEW_PROCESS_GROUP
+        kwargs.setdefault('creationflags', flags)
+    else:
+        kwargs.setdefault('close_fds', False)
+        if group:
+            kwargs.setdefault('start_new_session', True)
+
+
+def spawn(args: List[str], env: Dict[str, str] = ENV, group=False, **kwargs) -> Popen:
+    """
+    start process directly without shell. Arguments are passed as is, so paths with quotes
+    and spaces don't need escaping.
+
+    Options are chosen that Popen can use posix_spawn: no cwd, no preexec_fn, no new session and
+    close_fds=False. All Python file descriptors are not inheritable, so child get only its std streams.
+    On Windows child starts without console window.
+
+    :param args: executable and arguments
+    :param env: environment. None means current os.environ
+    :param group: process is killed or paused by CancelToken. Own group is started only for script
+        wrappers, so their children get the signal too. Popen use fork + exec for them (vfork on Linux,
+        the same cost there; full fork on macOS). Binaries are signaled alone and keep posix_spawn
+    :param kwargs: other Popen arguments. stdin is DEVNULL by default
+    :return: started process
+    """
+    args = [resolve_exe(args[0]), *args[1:]]
+    _options(kwargs, group and _starts_children(args[0]))
+
+    return Popen(args, env=env, **kwargs)
+
+
+async def spawn_async(args: List[str], env: Dict[str, str] = ENV, group=False,
+                      **kwargs) -> asyncio.subprocess.Process:
+    """
+    asyncio version of spawn with the same defaults. Process is supervised by running event loop,
+    no thread is used for it.
+
+    :param args: executable and arguments
+    :param env: environment
+    :param group: process is killed or paused by CancelToken, see spawn
+    :param kwargs: other create_subprocess_exec arguments. stdin is DEVNULL by default
+    :return: started process
+    """
+    exe = resolve_exe(args[0])
+    _options(kwargs, group and _starts_children(exe))
+
+    return await asyncio.create_subprocess_exec(exe, *args[1:], env=env, **kwargs)
@@ -0,0 +1,99 @@
+import os
+from typing import Dict, List
+
+from .encoder import Encoder, Settings
+from .converterTask import ConverterTask
+
+
+__all__ = ('OutputProfile',)
+
+
+class OutputProfile:
+    """
+    One shape of the library: destination root and encoder with own settings.
+
+    Attributes:
+        name: profile name from settings.ini. Empty for output chosen in GUI
+        outPath: destination root, ends with /
+        encoder: encoder of lossless sources. None means mirror, all sources are copied as is
+        settings: encoder settings of this profile. Encoder settings are not changed by profiles
+    """
+
+    def __init__(self, name: str, outPath: str, encoder: Encoder = None, settings: Settings = None):
+        if outPath and outPath[-1] not in ('/', '\\'):
+            outPath += '/'
+
+        self.name = name
+        self.outPath = outPath
+        self.encoder = encoder
+        self.settings = settings if settings is not None or encoder is None else encoder.settings
+
+    @property
+    def ext(self) -> str:
+        """
+        extension of encoded files
+        """
+        return self.settings.format if self.settings is not None else ''
+
+    def file_out(self, task: ConverterTask, encoded=True) -> str:
+        """
+        :param task:
+        :param encoded: encoded file get profile extension, otherwise source name is kept
+        :return: full path of output file
+        """
+        if not encoded or self.encoder is None:
+            return f'{self.outPath}{task.qTreePath}{task.copyName}'
+
+        return f'{self.outPath}{task.qTreePath}{task.stem}.{self.ext}'
+
+    @classmethod
+    def from_config(cls, name: str, params: Dict[str, str], encoders: Dict[str, Encoder]) -> 'OutputProfile':
+        """
+        create profile from settings.ini section. Values are converted to types of encoder settings
+
+        :param name: profile name
+        :param params: section keys. path is required, encoder is optional
+        :param encoders: encoders by name, see Converter.encoderName
+        """
+        params = dict(params)
+        params.pop('enabled', None)
+        try:
+            outPath = params.pop('path')
+        except KeyError:
+            raise ValueError(f'profile {name}: path is not set')
+
+        encoderName = params.pop('encoder', '')
+        if not encoderName:
+            return cls(name, os.path.normpath(outPath))
+
+        encoder = {k.lower(): v for k, v in encoders.items()}.get(encoderName.lower())
+        if encoder is None:
+            raise ValueError(f'profile {name}: unknown encoder {encoderName}')
+
+        settings = type(encoder.settings)()
+        values = {}
+        for key, value in params.items():
+            if not hasattr(settings, key):
+                raise ValueError(f'profile {name}: unknown setting {key}')
+
+            current = getattr(settings, key)
+            if isinstance(current, bool):
+                value = value.lower() in ('1', 'true', 'yes', 'on')
+            elif isinstance(current, int):
+                value = int(value)
+            values[key] = value
+
+        settings.load(values)
+        return cls(name, os.path.normpath(outPath), encoder, settings)
+
+    @classmethod
+    def load_all(cls, profiles: Dict[str, Dict[str, str]], encoders: Dict[str, Encoder]) -> List['OutputProfile']:
+        """
+        create enabled profiles. Profile with errors raise ValueError
+        """
+        result = []
+        for name, params in profiles.items():
+            if params.get('enabled', 'true').lower() in ('0', 'false', 'no', 'off'):
+                continue
+            result.append(cls.from_config(name, params, encoders))
+        return result
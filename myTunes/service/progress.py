@@ -0,0 +1,217 @@
+import os
+import time
+from typing import IO, Iterator, List
+
+
+__all__ = ('Progress', 'ProgressParser', 'FFmpegProgress', 'QaacProgress')
+
+
+class Progress:
+    """
+    Encoder progress event
+
+    Attributes:
+        percent: [0-100]
+        outTime: encoded audio in seconds
+        speed: realtime factor. 0 if unknown
+        size: bytes written. 0 if unknown
+        eta: seconds left. -1 if unknown
+        error: error message. Event with error has no other values
+    """
+    __slots__ = ('percent', 'outTime', 'speed', 'size', 'eta', 'error')
+
+    def __init__(self, percent=0, outTime=0.0, speed=0.0, size=0, eta=-1.0, error=''):
+        self.percent = percent
+        self.outTime = outTime
+        self.speed = speed
+        self.size = size
+        self.eta = eta
+        self.error = error
+
+    def __repr__(self):
+        if self.error:
+            return f'Progress(error={self.error!r})'
+        return f'Progress({self.percent}%, {self.outTime:.1f}s, {self.speed:.1f}x, {self.size}B, eta {self.eta:.1f}s)'
+
+
+def parse_time(s: str) -> float:
+    """
+    parse [[h:]m:]s.f time to seconds
+    """
+    sec = 0.0
+    for i in s.split(':'):
+        sec = sec * 60 + float(i)
+    return sec
+
+
+class ProgressParser:
+    """
+    Parse encoder output into Progress events.
+
+    Output is read by blocks (not by chars or lines) and split into lines by CR and LF.
+    Progress events are emitted not more often than interval, errors and the last event are emitted always.
+
+    Attributes:
+        duration: track duration in seconds. Used to calculate percent and eta if encoder don't show them
+        interval: min seconds between events
+        last: last state. It is updated by each line, even if event is not emitted
+    """
+
+    def __init__(self, duration: float = 0.0, interval: float = 0.2):
+        self.duration = duration
+        self.interval = interval
+        self.last = Progress()
+        self._buffer = b''
+        self._emitTime = 0.0
+
+    def _parse_line(self, line: bytes) -> Progress | None:
+        """
+        update self.last by line
+
+        Returns: event that must be emitted or None
+        """
+        ...
+
+    def _update(self, outTime: float = None, percent: float = None, speed: float = None, size: int = None) -> None:
+        last = self.last
+        if outTime is not None:
+            last.outTime = outTime
+        if speed is not None:
+            last.speed = speed
+        if size is not None:
+            last.size = size
+
+        if percent is None and self.duration and self.duration != float('inf'):
+            percent = 100 / self.duration * last.outTime
+        if percent is not None:
+            last.percent = max(0, min(int(percent), 99))
+
+        if last.speed and self.duration and self.duration != float('inf'):
+            last.eta = max(self.duration - last.outTime, 0) / last.speed
+
+    def _emit(self, force=False) -> Progress | None:
+        now = time.monotonic()
+        if not force and now - self._emitTime < self.interval:
+            return None
+
+        self._emitTime = now
+        last = self.last
+        return Progress(last.percent, last.outTime, last.speed, last.size, last.eta)
+
+    def feed(self, data: bytes) -> List[Progress]:
+        """
+        parse next block of output
+
+        :param data: bytes from encoder
+        :return: events
+        """
+        events: List[Progress] = []
+        lines = (self._buffer + data).replace(b'\r', b'\n').split(b'\n')
+        self._buffer = lines.pop()
+
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+
+            event = self._parse_line(line)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def finish(self) -> Progress:
+        """
+        final event after encoder exit
+        """
+        if self._buffer:
+            self.feed(b'\n')
+        self.last.percent = 100
+        self.last.eta = 0.0
+        return self._emit(force=True)
+
+    def read(self, stream: IO[bytes], blockSize: int = 65536) -> Iterator[Progress]:
+        """
+        read stream until EOF. Block is returned as soon as some data is available,
+        so events are not delayed by buffering.
+
+        Final event is not emitted, call finish() after checking that encoder succeed.
+
+        :param stream: binary stream
+        :param blockSize: max bytes for one read
+        :return: events
+        """
+        fd = stream.fileno()
+        while True:
+            data = os.read(fd, blockSize)
+            if not data:
+                break
+            for event in self.feed(data):
+                yield event
+
+
+class FFmpegProgress(ProgressParser):
+    """
+    ffmpeg output with '-progress -' is a blocks of key=value lines, each block is closed by progress= line.
+    Others lines are ffmpeg logs.
+    """
+
+    def _parse_line(self, line: bytes) -> Progress | None:
+        key, sep, value = line.partition(b'=')
+
+        if not sep or b' ' in key:
+            if b'Error' in line or b'error' in line:
+                return Progress(error=line.decode('utf-8', errors='replace'))
+            return None
+
+        try:
+            if key in (b'out_time_us', b'out_time_ms'):
+                # out_time_ms is in microseconds too
+                self._update(outTime=int(value) / 1000000)
+            elif key == b'total_size':
+                self._update(size=int(value))
+            elif key == b'speed':
+                self._update(speed=float(value.rstrip(b'x')))
+            elif key == b'progress':
+                return self._emit(force=value == b'end')
+        except ValueError:
+            # N/A values
+            pass
+        return None
+
+
+class QaacProgress(ProgressParser):
+    """
+    qaac show progress in stderr as
+     [45.6%] 0:30.000/1:05.000 (30.0x), ETA 0:01.000
+    or without length (reading from stdin)
+     0:30.000 (30.0x)
+    """
+
+    def _parse_line(self, line: bytes) -> Progress | None:
+        text = line.decode('utf-8', errors='replace')
+
+        try:
+            if text.startswith('['):
+                percent = float(text[1:text.index('%')])
+                text = text[text.index(']') + 1:].strip()
+            elif text[:1].isdigit():
+                percent = None
+            else:
+                if 'error' in text.lower():
+                    return Progress(error=text)
+                return None
+
+            outTime = parse_time(text.split(' ')[0].split('/')[0])
+            speed = None
+            if '(' in text:
+                speed = float(text[text.index('(') + 1:text.index('x)')])
+        except ValueError:
+            return None
+
+        self._update(outTime=outTime, percent=percent, speed=speed)
+        if 'ETA ' in text:
+            try:
+                self.last.eta = parse_time(text[text.index('ETA ') + 4:].strip())
+            except ValueError:
+                pass
+        return self._emit()
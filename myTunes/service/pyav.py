@@ -0,0 +1,145 @@
+import os
+import time
+from typing import Callable, Dict, Iterator, List
+
+from .cancel import CancelToken
+from .encoder import Encoder
+from .ffmpeg import CODEC_NAME, FFmpeg, SettingsFF
+from .progress import Progress, ProgressParser
+from myTunes.config import log
+
+try:
+    import av
+except ImportError:
+    av = None
+
+
+__all__ = ('PyAV',)
+
+
+class PyAV(Encoder):
+    """
+    Encoder inside of this process by libav bindings (PyAV). Source is decoded and encoded frame by frame,
+    there is no encoder process, WAV stage or duration probe. Progress is time of decoded frames,
+    decoded frames can be given to analysis without copy, see encode.
+
+    libav releases GIL while frames are decoded and encoded, so engine runs encodes in its threads.
+    Settings are FFmpeg settings: the same libav codecs, so profiles and segments of PyAV outputs
+    are made by ffmpeg with the same result. Commands of encode_args are ffmpeg commands for this reason.
+    """
+    inProcess = True
+
+    def __init__(self, ffmpeg: FFmpeg):
+        """
+        :param ffmpeg: builder of commands for outputs that are not encoded in process
+        """
+        self.name = 'PyAV'
+        self.needWav = False
+        self.batch = False
+        self.settings = SettingsFF()
+        self.ffmpeg = ffmpeg
+        self._check()
+
+    @staticmethod
+    def available() -> bool:
+        return av is not None
+
+    def _check(self) -> None:
+        if av is None:
+            raise ImportError('PyAV is not installed')
+        log.info(f'PyAV {av.__version__}')
+
+    def output_codec(self, settings: SettingsFF = None) -> str:
+        codec = (settings or self.settings).codec
+        return CODEC_NAME.get(codec, codec)
+
+    def encode_args(self, fileIn: str, fileOut: str, settings: SettingsFF = None) -> List[str]:
+        """
+        ffmpeg command with the same settings, for callers that need encoder process
+        """
+        return self.ffmpeg.encode_args(fileIn, fileOut, settings or self.settings)
+
+    def progress(self, duration: float = 0.0) -> ProgressParser:
+        return self.ffmpeg.progress(duration)
+
+    def encode(self, fileIn: str, fileOut: str, settings: SettingsFF = None, duration: float = 0,
+               token: CancelToken = None, onFrame: Callable[['av.AudioFrame'], None] = None,
+               interval: float = 0.2) -> Iterator[Progress]:
+        """
+        encode first audio stream of source
+
+        :param settings: settings of output profile instead of encoder settings
+        :param duration: known track duration in seconds. Stream duration of source is used if 0
+        :param token: checked for each frame, pause blocks encoding until resume
+        :param onFrame: get each decoded frame before it is encoded. Frame planes support buffer
+            protocol, memoryview(frame.planes[0]) is PCM without copy. Frame must not be changed
+        :param interval: min seconds between progress events. The last event is emitted always
+        :return: progress events
+        """
+        settings = settings or self.settings
+        settings.verify()
+        started = time.monotonic()
+        last = 0.0
+        outTime = 0.0
+
+        with av.open(fileIn) as src, av.open(fileOut, 'w') as dst:
+            streamIn = src.streams.audio[0]
+            if not duration and streamIn.duration is not None:
+                duration = float(streamIn.duration * streamIn.time_base)
+
+            options: Dict[str, str] = {}
+            # native aac encoder has only LC profile
+            if settings.he and settings.codec == 'libfdk_aac':
+                options['profile'] = 'aac_he'
+            # native opus encoder is experimental
+            if settings.codec == 'opus':
+                options['strict'] = 'experimental'
+            rate = streamIn.rate if settings.rate in ('keep', 'auto') else int(settings.rate)
+            # like ffmpeg, auto rate is the nearest higher rate of codec when codec has no source rate
+            rates = av.Codec(settings.codec, 'w').audio_rates
+            if settings.rate == 'auto' and rates and rate not in rates:
+                rate = min((i for i in rates if i > rate), default=max(rates))
+            streamOut = dst.add_stream(settings.codec, rate=rate, options=options)
+            layout = streamIn.layout
+            # WAV without channel mask has no channel order, encoders need default order of the same channels
+            if any(i.name == 'NONE' for i in layout.channels):
+                layout = av.AudioLayout(f'{layout.nb_channels}c')
+            streamOut.layout = layout
+            # wavpack is lossless
+            if settings.codec != 'wavpack':
+                bitrate = settings.bitrate
+                # libopus refuses more than 256 kbps for each channel
+                if streamOut.codec_context.name == 'libopus':
+                    bitrate = min(bitrate, 256 * layout.nb_channels)
+                streamOut.bit_rate = bitrate * 1000
+
+            for frame in src.decode(streamIn):
+                if token is not None:
+                    token.wait()
+                    token.check()
+                if onFrame is not None:
+                    onFrame(frame)
+
+                if frame.time is not None:
+                    outTime = frame.time + frame.samples / frame.sample_rate
+                # encoder resamples and splits frames by own frame size and timestamps
+                frame.pts = None
+                dst.mux(streamOut.encode(frame))
+
+                now = time.monotonic()
+                if now - last >= interval:
+                    last = now
+                    yield self._progress(outTime, duration, now - started)
+
+            dst.mux(streamOut.encode(None))
+
+        event = self._progress(outTime, duration, time.monotonic() - started)
+        event.percent, event.eta, event.size = 100, 0.0, os.path.getsize(fileOut)
+        yield event
+
+    @staticmethod
+    def _progress(outTime: float, duration: float, elapsed: float) -> Progress:
+        speed = outTime / elapsed if elapsed > 0 else 0.0
+        percent = min(int(100 * outTime / duration), 99) if duration else 0
+        eta = (duration - outTime) / speed if speed and duration else -1.0
+        return Progress(percent, outTime, speed, 0, eta)
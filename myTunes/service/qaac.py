@@ -1,9 +1,11 @@
 import os
-from subprocess import Popen, PIPE, DEVNULL
-from typing import Tuple, Dict, Iterator
+from subprocess import PIPE
+from typing import Tuple, List
 
 from myTunes.config import log, cfg
 from .encoder import Encoder, Settings
+from .process import spawn
+from .progress import ProgressParser, QaacProgress
 
 
 class SettingsQaac(Settings):
@@ -53,12 +55,16 @@ class SettingsQaac(Settings):
                 'attr': 'format'},
         }
 
-    def stringify(self) -> str:
+    def args(self) -> List[str]:
         self.verify()
 
-        s = f"--{self.mode} {self.bitrate} --ignorelength -n --text-codepage 65001 -q {self.q} --rate {self.rate} "
-        if self.he: s += "--he "
-        return s
+        args = [f'--{self.mode}', str(self.bitrate), '--ignorelength', '-n', '--text-codepage', '65001',
+                '-q', str(self.q), '--rate', self.rate]
+        if self.he: args.append('--he')
+        return args
+
+    def stringify(self) -> str:
+        return ' '.join(self.args())
 
     def verify(self) -> None:
         if self.mode in ('abr', 'cbr', 'cvbr'):
@@ -84,19 +90,26 @@ class Qaac(Encoder):
         self.name = 'QAAC'
         self.settings = SettingsQaac()
         self.needWav = True
+        self.readStdin = True
+        self.progressStream = 'stderr'
+        self.inputs = {
+            'wav': {'pcm', 'pcm_float'},
+            'aiff': {'pcm'},
+            'aif': {'pcm'},
+            'm4a': {'alac'},
+            'mp4': {'alac'},
+        }
         self.exe = cfg.qaac
         self._check()
 
     def _check(self):
         assert os.path.isfile(self.exe), ValueError(f'qaac exe file not exists')
 
-        proc = Popen(
-            '"{}" {}'.format(self.exe, "--check"),
-            shell=True,
+        proc = spawn(
+            [self.exe, '--check'],
             encoding='utf-8',
             stdout=PIPE,
             stderr=PIPE,
-            stdin=DEVNULL,
         )
         stdout: [Tuple[bytes, bytes]] = proc.communicate()
 
@@ -105,45 +118,16 @@ class Qaac(Encoder):
         else:
             log.info(stdout[1])
 
-    def process_yield(self, fileIn: str, fileOut: str, settings: Dict[str, any] = None) -> Iterator[int]:
-        """
-        Convert audio files with qaac encoder
-        
-        example qaac call
-         qaac --cbr 320 --rate=44100 sweep96.wav -o cbr320.m4a
-         
-        """
-        assert os.path.isfile(fileIn), FileNotFoundError(fileIn)
+            # optional libraries that qaac use for decoding
+            for lib, container, codec in (('libFLAC', 'flac', 'flac'), ('libwavpack', 'wv', 'wavpack')):
+                if lib in stdout[1]:
+                    self.inputs[container] = {codec}
 
-        if not fileOut:
-            fileOut = f"{fileOut[:fileOut.rfind('.')]}.{self.settings.format}"
+    def output_codec(self, settings: SettingsQaac = None) -> str:
+        return 'aac'
 
-        cmd = f'{self.exe} {self.settings.stringify()} "{fileIn}" -o "{fileOut}" '
+    def encode_args(self, fileIn: str, fileOut: str, settings: SettingsQaac = None) -> List[str]:
+        return [self.exe, *(settings or self.settings).args(), fileIn, '-o', fileOut]
 
-        log.debug(cmd)
-
-        proc = Popen(
-            cmd,
-            shell=True,
-            encoding='cp866',
-            stdout=PIPE,
-            stderr=PIPE,
-            stdin=DEVNULL,
-        )
-        
-        done = 0
-        while done < 100:
-            line = ''
-            for char in iter(lambda: proc.stderr.read(1), b""):
-                if not char:
-                    break
-                elif char not in ('\r', '\n'):
-                    line += char
-                    continue
-
-                # log.debug(f'QAAC: {line}')
-                if line.startswith('['):
-                    done = int(float(line[1:line.find('%')]))
-                    yield done
-                
-                line = ''
+    def progress(self, duration: float = 0.0) -> ProgressParser:
+        return QaacProgress(duration)
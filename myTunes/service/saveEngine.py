@@ -0,0 +1,129 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List
+
+from music_tag import AudioFile
+
+from .cancel import CancelToken
+
+
+__all__ = ('SaveEngine', 'SaveJob', 'SaveResult')
+
+
+class SaveJob:
+    """
+    Tag edit of one file
+
+    Attributes:
+        afile: loaded file owned by GUI. Workers don't change it, they save own copy of file
+        tags: tag name -> new value. Empty string or None removes tag. String is converted into tag type
+    """
+    __slots__ = ('afile', 'tags')
+
+    def __init__(self, afile: AudioFile, tags: Dict[str, Any]):
+        self.afile = afile
+        self.tags = tags
+
+    def apply(self, afile: AudioFile) -> None:
+        """
+        set new tags in memory
+
+        :param afile: copy of file in worker or file of GUI after save
+        """
+        for name, val in self.tags.items():
+            if val is None or val == '':
+                if name in afile:
+                    del afile[name]
+            elif isinstance(val, str):
+                afile[name] = afile.get(name).type(val)
+            else:
+                afile[name] = val
+
+    def __repr__(self):
+        return f'SaveJob({self.afile.filename!r}, {list(self.tags)})'
+
+
+class SaveResult:
+    """
+    Attributes:
+        job: saved edit
+        kind: save - tags are written in place, rewritten - whole file is rewritten,
+            error - edit or save failed, cancel - not started because save is cancelled
+        message: error text
+    """
+    __slots__ = ('job', 'kind', 'message')
+
+    def __init__(self, job: SaveJob, kind: str, message=''):
+        self.job = job
+        self.kind = kind
+        self.message = message
+
+    def __repr__(self):
+        return f'SaveResult({self.job!r}, {self.kind}, {self.message!r})'
+
+
+class SaveEngine:
+    """
+    Save of tag edits by pool of threads. Tag save is file I/O, mutagen releases GIL while it reads and
+    writes, so files are written at once. Each worker loads own copy of file, edits and saves it, so files
+    read by GUI are never changed by workers. Files of jobs must be different.
+    Results are collected by batches, so GUI gets one signal for many files instead of signal for each.
+    GUI applies saved edits to its files by SaveJob.apply when batch comes.
+
+    Attributes:
+        threads: files saved at once
+        token: cancel stops starting of new saves, started ones are finished
+        done: jobs with result
+        total: jobs of current run
+    """
+
+    def __init__(self, load: Callable[[str], AudioFile], save: Callable[[AudioFile], bool], threads: int = 4):
+        """
+        :param load: load file from disk. See TagEditor.load_file
+        :param save: write tags of file, return True if whole file was rewritten. See TagEditor.save
+        """
+        self.threads = max(1, threads)
+        self.token = CancelToken()
+        self.done = 0
+        self.total = 0
+        self._load = load
+        self._save = save
+
+    def cancel(self) -> None:
+        self.token.cancel(kill=False)
+
+    def _run_job(self, job: SaveJob) -> SaveResult:
+        if self.token.cancelled:
+            return SaveResult(job, 'cancel')
+        try:
+            afile = self._load(job.afile.filename)
+            job.apply(afile)
+            rewritten = self._save(afile)
+        except Exception as e:
+            return SaveResult(job, 'error', str(e))
+        return SaveResult(job, 'rewritten' if rewritten else 'save')
+
+    def run(self, jobs: Iterable[SaveJob], onBatch: Callable[[List[SaveResult]], None],
+            interval: float = 0.1) -> None:
+        """
+        save all jobs and return when they are done or cancelled
+
+        :param onBatch: get results done since previous call, called from thread of run
+        :param interval: seconds between batches
+        """
+        jobs = list(jobs)
+        if self.token.cancelled:
+            self.token = CancelToken()
+        self.done = 0
+        self.total = len(jobs)
+
+        with ThreadPoolExecutor(self.threads, thread_name_prefix='save') as pool:
+            pending = {pool.submit(self._run_job, i) for i in jobs}
+            while pending:
+                done, pending = wait(pending, timeout=interval, return_when=FIRST_COMPLETED)
+                if not done:
+                    continue
+                # results of the rest of interval join the same batch
+                more, pending = wait(pending, timeout=interval)
+                batch = [i.result() for i in done | more]
+                self.done += len(batch)
+                onBatch(batch)
@@ -0,0 +1,146 @@
+import json
+import os
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from .codec import StreamInfo
+from .converterTask import ConverterTask, ConverterBatch
+
+
+__all__ = ('CostModel', 'Scheduler')
+
+
+class CostModel:
+    """
+    Expected work seconds for one second of audio. Factors are learned from finished tasks
+    by exponential moving average and kept in JSON file between runs.
+
+    Attributes:
+        path: JSON file. Empty path means factors are not saved
+        factors: factor by key, see key()
+    """
+    ENCODE = 0.05
+    COPY = 0.002
+    # weight of new measure
+    ALPHA = 0.3
+
+    def __init__(self, path: str = ''):
+        self.path = path
+        self.factors: Dict[str, float] = {}
+
+        if path and os.path.isfile(path):
+            try:
+                with open(path, 'r') as f:
+                    self.factors = {k: float(v) for k, v in json.load(f).items()}
+            except (OSError, ValueError, AttributeError):
+                # broken file is replaced by next save
+                self.factors = {}
+
+    @staticmethod
+    def key(encoder: str, stream: StreamInfo) -> str:
+        """
+        :param encoder: encoder name
+        :param stream: source stream
+        :return: encoder and codec for lossless source, copy for others
+        """
+        if stream.lossless:
+            return f'{encoder}:{stream.codec or "unknown"}'
+        return 'copy'
+
+    def factor(self, key: str) -> float:
+        return self.factors.get(key, self.COPY if key == 'copy' else self.ENCODE)
+
+    def cost(self, encoder: str, task: ConverterTask | ConverterBatch) -> float:
+        """
+        expected work seconds of task. Unknown duration is taken as 1 minute
+        """
+        if isinstance(task, ConverterBatch):
+            return sum(self.cost(encoder, i) for i in task.tasks)
+
+        return (task.stream.duration or 60) * self.factor(self.key(encoder, task.stream))
+
+    def learn(self, key: str, duration: float, elapsed: float) -> None:
+        """
+        :param key: see key()
+        :param duration: audio seconds
+        :param elapsed: work seconds
+        """
+        if duration <= 0 or elapsed <= 0:
+            return
+
+        observed = elapsed / duration
+        old = self.factors.get(key)
+        self.factors[key] = observed if old is None else old + self.ALPHA * (observed - old)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+
+        tmpName = f'{self.path}.tmp'
+        with open(tmpName, 'w') as f:
+            json.dump(self.factors, f, indent=2, sort_keys=True)
+        os.replace(tmpName, self.path)
+
+
+class Scheduler:
+    """
+    Give tasks to workers.
+
+    With LPT tasks are sorted by expected cost, longest first, and planned by greedy rule: next task goes
+    to the least loaded worker. Worker takes own tasks longest first. Worker without own tasks steals
+    the longest task of the most loaded worker, so wrong estimates are evened out at the end of run.
+
+    Without LPT all tasks are in one queue in given order and all workers take them from it.
+
+    Attributes:
+        queues: planned tasks of each worker with their costs
+        loads: expected work seconds left in each queue
+    """
+
+    def __init__(self, tasks: List[ConverterTask | ConverterBatch], workers: int, model: CostModel,
+                 encoder: str, lpt=True):
+        self.queues: List[Deque[Tuple[float, ConverterTask | ConverterBatch]]] = [deque() for _ in range(max(workers, 1))]
+        self.loads = [0.0] * len(self.queues)
+
+        planned = [(model.cost(encoder, i), i) for i in tasks]
+        if not lpt:
+            self.queues = self.queues[:1]
+            self.loads = self.loads[:1]
+            self.queues[0].extend(planned)
+            self.loads[0] = sum(i[0] for i in planned)
+            return
+
+        # stable sort keeps tree order for equal costs
+        planned.sort(key=lambda i: i[0], reverse=True)
+        for cost, task in planned:
+            slot = min(range(len(self.loads)), key=self.loads.__getitem__)
+            self.queues[slot].append((cost, task))
+            self.loads[slot] += cost
+
+    def __len__(self):
+        return sum(len(i) for i in self.queues)
+
+    def next(self, slot: int) -> ConverterTask | ConverterBatch | None:
+        """
+        :param slot: worker index. Worker without planned queue only steals
+        :return: next task of worker or None if all tasks are taken
+        """
+        if slot >= len(self.queues) or not self.queues[slot]:
+            busy = [n for n, i in enumerate(self.queues) if i]
+            if not busy:
+                return None
+            slot = max(busy, key=self.loads.__getitem__)
+
+        cost, task = self.queues[slot].popleft()
+        self.loads[slot] = max(self.loads[slot] - cost, 0.0)
+        return task
+
+    def drain(self) -> List[ConverterTask | ConverterBatch]:
+        """
+        take all tasks left
+        """
+        tasks = [task for queue in self.queues for _, task in queue]
+        for n, queue in enumerate(self.queues):
+            queue.clear()
+            self.loads[n] = 0.0
+        return tasks
@@ -0,0 +1,101 @@
+import math
+from typing import List, Tuple
+
+
+__all__ = ('Segment', 'frame_grid', 'plan_segments', 'concat_list', 'SEGMENT_FORMATS')
+
+
+# outputs that can be joined by whole packets. AAC in MP4 keep encoder delay in edit list
+SEGMENT_FORMATS = {'m4a', 'mp4'}
+# samples in the longest AAC frame (HE-AAC)
+FRAME_SAMPLES = 2048
+# min seconds encoded before and after segment. Encoder state is warmed up by them,
+# so the kept frames are almost the same as in one pass encoding
+PREROLL = 0.2
+
+
+class Segment:
+    """
+    Part of source encoded by one process.
+
+    Attributes:
+        start: segment start in source, seconds
+        length: seconds of source kept in output. 0 for the last segment means till the end
+        preroll: seconds encoded before start and dropped by join
+        postroll: seconds encoded after end and dropped by join
+    """
+
+    def __init__(self, start: float, length: float, preroll=0.0, postroll=0.0):
+        self.start = start
+        self.length = length
+        self.preroll = preroll
+        self.postroll = postroll
+
+    def span(self) -> Tuple[float, float]:
+        """
+        :return: start and length of source that is encoded. Length 0 means till the end
+        """
+        length = self.preroll + self.length + self.postroll if self.length else 0.0
+        return self.start - self.preroll, length
+
+    def packets(self, frame: float) -> Tuple[int, int]:
+        """
+        :param frame: seconds in one packet of encoded segment
+        :return: first kept packet and first dropped packet after it. 0 means till the end
+        """
+        first = round(self.preroll / frame)
+        return first, first + round(self.length / frame) if self.length else 0
+
+    def __repr__(self):
+        return f'Segment({self.start:.3f}, {self.length:.3f}, preroll={self.preroll:.3f})'
+
+
+def frame_grid(sampleRate: int, outRate: int = 48000) -> float:
+    """
+    Step of segment borders. Borders on this grid are on packet borders of AAC and HE-AAC
+    at source rate and at output rate, so all segments have the same packet grid as one pass encoding.
+
+    :param sampleRate: source sample rate
+    :param outRate: output sample rate. Encoder may resample source, it is 48000 for auto rate
+    :return: seconds
+    """
+    return FRAME_SAMPLES / math.gcd(sampleRate, outRate)
+
+
+def plan_segments(duration: float, count: int, grid: float) -> List[Segment]:
+    """
+    split source into segments of equal length with borders on grid
+
+    :param duration: source duration in seconds
+    :param count: segments
+    :param grid: see frame_grid
+    """
+    if count < 2 or duration <= 0 or grid <= 0:
+        return [Segment(0.0, 0.0)]
+
+    step = max(round(duration / count / grid), 1) * grid
+    roll = math.ceil(PREROLL / grid) * grid
+
+    segments = []
+    for n in range(count):
+        start = n * step
+        if start + roll >= duration:
+            break
+        segments.append(Segment(start, step, min(roll, start), roll))
+
+    segments[-1].length = 0.0
+    segments[-1].postroll = 0.0
+    return segments
+
+
+def concat_list(files: List[str]) -> str:
+    """
+    file list for ffmpeg concat demuxer
+
+    :param files: absolute paths
+    """
+    lines = ['ffconcat version 1.0']
+    for fileName in files:
+        escaped = fileName.replace('\\', '/').replace("'", "'\\''")
+        lines.append(f"file '{escaped}'")
+    return '\n'.join(lines) + '\n'
@@ -1,17 +1,19 @@
-from typing import Iterable
-import traceback
+import inspect
+import os
+from typing import Dict, Iterable, List, Tuple, Type
+import threading
 import re
 
 from mutagen.mp4 import MP4Cover
 import music_tag
 from music_tag.file import AudioFile, MetadataItem, Artwork, TAG_MAP_ENTRY
 
-from myTunes.config import log
+from myTunes.config import cfg, log
 from .util import parse_date
 from myTunes.model.settings import CoverSettings
 
 
-__all__ = ('Tag', 'TAGS', 'TagEditor', 'AudioFile')
+__all__ = ('Tag', 'TAGS', 'TagEditor', 'TransferPlan', 'AudioFile')
 
 
 class MetadataItemPatch(MetadataItem):
@@ -84,59 +86,205 @@ TAGS: Iterable[Tag] = (
 )
 
 
+class TransferPlan:
+    """
+    Tags written from source format into output format. Plan is compiled once for each pair of formats,
+    so tags which output can't hold are dropped once, not checked for each file.
+
+    Attributes:
+        keys: tags written by plan in order of source tag map
+        dropped: source tags which output format don't have
+    """
+
+    def __init__(self, source: Type[AudioFile], target: Type[AudioFile]):
+        sourceKeys = {**source._DEFAULT_TAG_MAP, **source._TAG_MAP}
+        targetKeys = {**target._DEFAULT_TAG_MAP, **target._TAG_MAP}
+        self.keys: List[str] = [k for k in sourceKeys if not k.startswith('#') and k in targetKeys]
+        self.dropped: List[str] = [k for k in sourceKeys if not k.startswith('#') and k not in targetKeys]
+        if self.dropped:
+            log.warning(f"{target.__name__} haven't metadata {', '.join(self.dropped)}")
+
+    def apply(self, metadata: AudioFile, afile: AudioFile) -> None:
+        """
+        set tags of source to output in memory
+
+        :param metadata: source
+        :param afile: output
+        """
+        for k in self.keys:
+            if k == 'artwork':
+                artwork = metadata[k].first
+                if artwork is None:
+                    continue
+                value = artwork.data
+            else:
+                try:
+                    value = metadata[k]
+                except ValueError:
+                    if k != 'year':
+                        continue
+                    value = self._year(metadata)
+                    if value is None:
+                        continue
+
+            try:
+                afile[k] = value
+            except ValueError as e:
+                if k != 'tracknumber':
+                    log.warning(f'not set metadata {k}: {e}')
+                    continue
+                try:
+                    afile[k] = self._tracknumber(metadata, e)
+                except Exception as e:
+                    log.warning(f'not set metadata {k}: {e}')
+            except Exception as e:
+                log.exception(f'not set metadata {k}: {e}')
+
+    @staticmethod
+    def _year(metadata: AudioFile) -> str | None:
+        # full date in DATE tag
+        for tag in metadata.mfile.tags:
+            if tag[0] == 'DATE':
+                return parse_date(tag[1]).strftime('%Y')
+        return None
+
+    @staticmethod
+    def _tracknumber(metadata: AudioFile, error: ValueError) -> str:
+        # number and total in TRACKNUMBER tag
+        for tag in metadata.mfile.tags:
+            if tag[0] == 'TRACKNUMBER' and '/' in tag[1]:
+                return tag[1].split('/')[0]
+        raise error
+
+
 class TagEditor:
+    """
+    Attributes:
+        padding: bytes of free space reserved after tags when file must be rewritten, so next edits
+            and covers fit into it and are written in place
+        rewrites: saves which rewrote whole file
+        inPlace: saves which wrote only tag block
+    """
+
     def __init__(self):
         self._editor = music_tag
         self._patch_music_tag()
         self.coverSettings = CoverSettings
+        self._plans: Dict[Tuple[type, type], TransferPlan] = {}
+        # music_tag class of each output extension
+        self._kinds: Dict[str, Type[AudioFile]] = {}
+        self._lock = threading.Lock()
+        self.padding = cfg.tagPadding
+        self.rewrites = 0
+        self.inPlace = 0
+        # (mutagen file, tags) classes -> save has padding option. APEv2 at file end has not
+        self._padded: Dict[Tuple[type, type], bool] = {}
+
+    def save(self, afile: AudioFile) -> bool:
+        """
+        write tags of file. Tags that fit into padding of tag block (ID3v2, FLAC padding, MP4 free atoms,
+        Vorbis comment) are written in place and padding is kept, not shrunk. Tags that don't fit
+        are written with reserved padding
+
+        :return: True if whole file was rewritten
+        """
+        rewritten = False
+
+        def padding(info) -> int:
+            nonlocal rewritten
+            if info.padding >= 0:
+                return info.padding
+            rewritten = True
+            return self.padding
+
+        kind = (type(afile.mfile), type(afile.mfile.tags))
+        padded = self._padded.get(kind)
+        if padded is None:
+            padded = self._padded[kind] = self._has_padding(afile.mfile)
+
+        if padded:
+            afile.save(padding=padding)
+        else:
+            afile.save()
+
+        with self._lock:
+            if rewritten:
+                self.rewrites += 1
+            else:
+                self.inPlace += 1
+        if rewritten:
+            log.debug(f'{afile.filename}: tags outgrow padding, file is rewritten')
+        return rewritten
     
+    @staticmethod
+    def _has_padding(mfile) -> bool:
+        """
+        check if save of mutagen file take padding option
+        """
+        params = inspect.signature(type(mfile).save).parameters
+        if 'padding' in params:
+            return True
+        # files without own save pass options to save of their tags
+        if any(i.kind is i.VAR_KEYWORD for i in params.values()):
+            save = getattr(type(mfile.tags), 'save', None)
+            return save is not None and 'padding' in inspect.signature(save).parameters
+        return False
+
     def load_file(self, file: str) -> AudioFile:
         return self._editor.load_file(file)
     
-    def save_file(self, file: str, metadata: AudioFile) -> None:
-        afile: AudioFile = self._editor.load_file(file)
-        
-        for k in metadata.tag_map.keys():
-            # print(f'{k}: {metadata[k].values}')
-            
-            if not k.startswith('#'):
-                if k not in afile.tag_map:
-                    log.warning(f"result file haven't metadata {k}")
-                    continue
-                
-                if k == 'artwork':
-                    if metadata[k].first is not None:
-                        value: bytes = metadata[k].first.data
-                        # if self.coverSettings.convert:
-                        #     value = convert_to_jpeg(
-                        #         metadata[k].first.data,
-                        #         progressive=self.coverSettings.jpegNext,
-                        #         quality=self.coverSettings.quality)
-                    else:
-                        continue
-                else:
-                    try:
-                        value = metadata[k]
-                    except ValueError as e:
-                        if k == 'year':
-                            for tag in metadata.mfile.tags:
-                                if tag[0] == 'DATE':
-                                    value = parse_date(tag[1]).strftime('%Y')
-                try:
-                    afile[k] = value
-                except ValueError as e:
-                    if k == 'tracknumber':
-                        for tag in metadata.mfile.tags:
-                            if tag[0] == 'TRACKNUMBER':
-                                if '/' in tag[1]:
-                                    afile[k] = tag[1].split('/')[0]
-                                else:
-                                    raise ValueError(e)
-                except Exception as e:
-                    print(traceback.format_exc())
-                    log.warning(f'not set metadata {k}: {e}')
-        afile.save()
-    
+    def save_file(self, file: str, metadata: AudioFile, clear=False) -> None:
+        """
+        write tags of source into file
+
+        :param file: output, usually just written by encoder
+        :param metadata: source in memory
+        :param clear: remove tags of file which are not in source, like tags of other source in cached output
+        """
+        afile = self._open(file)
+        if clear:
+            self._clear(afile)
+        self.transfer_plan(type(metadata), type(afile)).apply(metadata, afile)
+        self.save(afile)
+
+    @staticmethod
+    def _clear(afile: AudioFile) -> None:
+        """
+        remove all tags and pictures in memory, they are written by save
+        """
+        mfile = afile.mfile
+        if mfile.tags is not None:
+            mfile.tags.clear()
+        if hasattr(mfile, 'clear_pictures'):
+            mfile.clear_pictures()
+
+    def transfer_plan(self, source: Type[AudioFile], target: Type[AudioFile]) -> 'TransferPlan':
+        """
+        :return: plan compiled for this pair of formats on first use
+        """
+        plan = self._plans.get((source, target))
+        if plan is None:
+            plan = self._plans[(source, target)] = TransferPlan(source, target)
+        return plan
+
+    def _open(self, file: str) -> AudioFile:
+        """
+        load file by class of files with the same extension, so mutagen don't guess format of each output
+        """
+        ext = os.path.splitext(file)[1].lower()
+        kls = self._kinds.get(ext)
+        if kls is not None:
+            try:
+                return kls(file, _mfile=kls.mutagen_kls(file))
+            except Exception:
+                # other codec in the same container, like Opus in ogg
+                pass
+
+        afile = self._editor.load_file(file)
+        with self._lock:
+            self._kinds.setdefault(ext, type(afile))
+        return afile
+
     def _set_artwork_patch(sef, afile: AudioFile, norm_key, artworks) -> None:
         if not isinstance(artworks, MetadataItem):
             raise TypeError()
@@ -1,7 +1,9 @@
 import re
 import os
+import shutil
+from contextlib import ExitStack
 from datetime import datetime
-from typing import Iterable
+from typing import Iterable, List
 import io
 
 from PIL import Image
@@ -70,6 +72,31 @@ def create_dirs(paths: Iterable[str]) -> None:
                 raise Exception(f'Fail to create dir {i}: {e}')
 
 
+def copy_to_many(src: str, dsts: List[str], blockSize: int = 1024 * 1024) -> None:
+    """
+    copy file into several destinations by one read pass
+
+    Args:
+        src: source file
+        dsts: destination files. Their directories must exist
+        blockSize: bytes read at once
+    """
+    if len(dsts) == 1:
+        shutil.copyfile(src, dsts[0])
+        return
+
+    with ExitStack() as stack:
+        fileIn = stack.enter_context(open(src, 'rb'))
+        filesOut = [stack.enter_context(open(i, 'wb')) for i in dsts]
+
+        while True:
+            data = fileIn.read(blockSize)
+            if not data:
+                break
+            for f in filesOut:
+                f.write(data)
+
+
 def parse_date(string: str) -> datetime:
     sDate = ''
     sTime = ''
@@ -0,0 +1,23 @@
+import os
+import shutil
+
+import pytest
+
+
+SETTINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'myTunes', 'settings.ini')
+
+
+@pytest.fixture(scope='session')
+def cfg(tmp_path_factory):
+    """
+    app settings from myTunes/settings.ini. Settings are read from working directory on first import of config
+    """
+    root = tmp_path_factory.mktemp('config')
+    shutil.copyfile(SETTINGS, root / 'settings.ini')
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        from myTunes.config import cfg
+    finally:
+        os.chdir(cwd)
+    return cfg
@@ -0,0 +1,42 @@
+from myTunes.service.autotune import Autotuner
+
+
+def test_climb_to_best():
+    tuner = Autotuner('FFmpeg', 1, 8, 2)
+    # throughput grows up to 4 workers and then falls
+    speeds = {2: 20, 3: 29, 4: 36, 5: 33, 6: 30}
+
+    for _ in range(6):
+        tuner.update(speeds[tuner.workers])
+
+    assert tuner.best == 4
+    assert tuner.workers in (3, 4)
+
+
+def test_stop_without_gain():
+    tuner = Autotuner('FFmpeg', 1, 8, 4)
+    tuner.update(40)
+    assert tuner.workers == 5
+    # one more worker gives nothing
+    assert tuner.update(40.5) == 4
+    assert tuner.update(40) == 4
+
+
+def test_limits():
+    tuner = Autotuner('FFmpeg', 2, 3, 3)
+    # CPU is saturated, pool don't grow
+    assert tuner.update(30, busy=1.0) == 3
+    # disk is slow, pool shrinks but not below min
+    assert tuner.update(30, iowait=0.5) == 2
+    assert tuner.update(30, iowait=0.5) == 2
+
+
+def test_remember_best(tmp_path):
+    path = f'{tmp_path}/autotune.json'
+    tuner = Autotuner('QAAC --cbr 320', 1, 8, 2, path)
+    tuner.update(10)
+    tuner.update(20)
+    tuner.save()
+
+    assert Autotuner('QAAC --cbr 320', 1, 8, 2, path).workers == 3
+    assert Autotuner('FFmpeg', 1, 8, 2, path).workers == 2
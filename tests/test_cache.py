@@ -0,0 +1,64 @@
+import os
+import time
+
+from myTunes.service.cache import EncodeCache
+
+
+def write(path, size: int) -> str:
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size))
+    return str(path)
+
+
+def read(path) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_key():
+    key = EncodeCache.key('flac:00', 'QAAC', '--cbr 320', '.m4a')
+    assert key == EncodeCache.key('flac:00', 'QAAC', '--cbr 320', '.M4A')
+    assert key != EncodeCache.key('flac:00', 'QAAC', '--cbr 256', '.m4a')
+    assert key != EncodeCache.key('flac:01', 'QAAC', '--cbr 320', '.m4a')
+
+
+def test_fetch(tmp_path):
+    cache = EncodeCache(str(tmp_path / 'cache'), 1000)
+    encoded = write(tmp_path / 'a.m4a', 100)
+
+    assert not cache.fetch('a', str(tmp_path / 'b.m4a'))
+    cache.store('a', encoded)
+    assert cache.fetch('a', str(tmp_path / 'b.m4a'))
+    assert read(tmp_path / 'b.m4a') == read(encoded)
+
+    # index and statistics are kept
+    cache.save()
+    cache = EncodeCache(str(tmp_path / 'cache'), 1000)
+    assert (cache.hits, cache.misses, cache.size) == (1, 1, 100)
+
+    # file removed by user is a miss
+    os.remove(os.path.join(cache.root, cache.entries['a']['file']))
+    assert not cache.fetch('a', str(tmp_path / 'c.m4a'))
+    assert cache.entries == {}
+
+
+def test_lru(tmp_path):
+    cache = EncodeCache(str(tmp_path / 'cache'), 250)
+    for key in 'abc':
+        cache.store(key, write(tmp_path / f'{key}.m4a', 100))
+        time.sleep(.01)
+    assert set(cache.entries) == {'b', 'c'}
+    # c is the least recently used after fetch of b
+    assert cache.fetch('b', str(tmp_path / 'b2.m4a'))
+    cache.store('d', write(tmp_path / 'd.m4a', 100))
+    assert set(cache.entries) == {'b', 'd'}
+    # index is not written by store
+    assert sum(len(files) for _, _, files in os.walk(cache.root)) == 2
+
+    # file bigger than cache is not stored
+    cache.store('e', write(tmp_path / 'e.m4a', 300))
+    assert 'e' not in cache.entries
+
+    # lowered limit evicts files of saved index
+    cache.save()
+    assert EncodeCache(cache.root, 100).size == 100
@@ -0,0 +1,94 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from myTunes.service.cancel import CancelToken, Cancelled
+from myTunes.service.process import spawn
+
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='process state is read from /proc')
+
+
+def state(pid: int) -> str:
+    with open(f'/proc/{pid}/stat', 'r') as f:
+        return f.read().rsplit(')', 1)[1].split()[0]
+
+
+def wait_state(pid: int, expected: str) -> str:
+    for _ in range(50):
+        if state(pid) == expected:
+            break
+        time.sleep(.02)
+    return state(pid)
+
+
+@pytest.fixture
+def proc():
+    proc = subprocess.Popen(['sleep', '30'], start_new_session=True)
+    yield proc
+    proc.kill()
+    proc.wait()
+
+
+def test_pause_resume(proc):
+    token = CancelToken()
+    token.register(proc.pid)
+
+    token.pause()
+    assert wait_state(proc.pid, 'T') == 'T'
+    assert not token.wait(0)
+
+    token.resume()
+    assert wait_state(proc.pid, 'S') == 'S'
+    assert token.wait(0)
+    token.check()
+
+
+def test_cancel_kills(proc):
+    token = CancelToken()
+    token.register(proc.pid)
+    token.pause()
+    token.cancel()
+
+    assert proc.wait(5) != 0
+    assert token.wait(0) and not token.paused
+    with pytest.raises(Cancelled):
+        token.check()
+
+
+def test_register_after_cancel(proc):
+    token = CancelToken()
+    # running task is finished, its next process is started
+    token.cancel(kill=False)
+    token.register(proc.pid)
+    assert proc.poll() is None
+
+    token.cancel()
+    assert proc.wait(5) != 0
+
+
+def test_group_only_for_scripts(tmp_path):
+    script = tmp_path / 'wrapper'
+    script.write_text('#!/bin/sh\nsleep 30\n')
+    script.chmod(0o755)
+
+    binary = spawn(['sleep', '30'], group=True)
+    wrapper = spawn([str(script)], group=True)
+    try:
+        # binary keeps posix_spawn and is signaled alone, wrapper leads group of its children
+        assert os.getpgid(binary.pid) != binary.pid
+        assert os.getpgid(wrapper.pid) == wrapper.pid
+
+        token = CancelToken()
+        token.register(binary.pid)
+        token.register(wrapper.pid)
+        token.cancel()
+        assert binary.wait(5) != 0
+        assert wrapper.wait(5) != 0
+    finally:
+        for proc in (binary, wrapper):
+            proc.kill()
+            proc.wait()
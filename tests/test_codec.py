@@ -0,0 +1,128 @@
+import struct
+import wave
+
+import mutagen
+from mutagen.ogg import OggPage
+
+from myTunes.service.codec import StreamInfo, classify, stream_codec
+
+
+def make_wav(path: str, formatTag: int = 1, seconds: int = 1, rate: int = 8000) -> str:
+    if formatTag == 1:
+        with wave.open(path, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(rate)
+            f.writeframes(b'\0\0' * rate * seconds)
+        return path
+
+    data = b'\0' * rate * seconds
+    fmt = struct.pack('<HHLLHH', formatTag, 1, rate, rate, 1, 8)
+    with open(path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<L', 4 + 8 + len(fmt) + 8 + len(data)) + b'WAVE')
+        f.write(b'fmt ' + struct.pack('<L', len(fmt)) + fmt)
+        f.write(b'data' + struct.pack('<L', len(data)) + data)
+    return path
+
+
+def write(path: str, data: bytes) -> str:
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def atom(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I4s', len(data) + 8, kind) + data
+
+
+def make_alac(path: str, seconds: int = 2, rate: int = 44100) -> str:
+    """
+    m4a with one ALAC sound track and no samples
+    """
+    mdhd = atom(b'mdhd', struct.pack('>4xIIII4x', 0, 0, rate, rate * seconds))
+    hdlr = atom(b'hdlr', b'\0' * 8 + b'soun' + b'\0' * 13)
+    entry = b'\0' * 6 + struct.pack('>H8xHHHHI', 1, 2, 16, 0, 0, rate << 16)
+    entry += atom(b'alac', struct.pack('>4xIBBBBBBHIII', 4096, 0, 16, 40, 10, 14, 2, 255, 0, 0, rate))
+    stsd = atom(b'stsd', struct.pack('>4xI', 1) + atom(b'alac', entry))
+    trak = atom(b'trak', atom(b'mdia', mdhd + hdlr + atom(b'minf', atom(b'stbl', stsd))))
+    return write(path, atom(b'ftyp', b'M4A \0\0\0\0') + atom(b'moov', trak) + atom(b'mdat', b''))
+
+
+def make_oggflac(path: str, seconds: int = 2, rate: int = 44100) -> str:
+    """
+    FLAC in Ogg: mapping header with STREAMINFO and Vorbis comment, no audio pages
+    """
+    # min/max block and frame size, then 20 bits rate, 3 bits channels - 1, 5 bits bps - 1, 36 bits samples
+    streaminfo = struct.pack('>HH3s3s', 4096, 4096, b'\0' * 3, b'\0' * 3)
+    streaminfo += ((rate << 44) | (1 << 41) | (15 << 36) | rate * seconds).to_bytes(8, 'big') + b'\0' * 16
+    header = b'\x7fFLAC\x01\x00' + struct.pack('>H', 1) + b'fLaC' + b'\x00' + len(streaminfo).to_bytes(3, 'big')
+    comment = b'\x84' + (8).to_bytes(3, 'big') + struct.pack('<II', 0, 0)
+
+    data = b''
+    for n, packet in enumerate((header + streaminfo, comment)):
+        page = OggPage()
+        page.serial = 1
+        page.sequence = n
+        page.first = n == 0
+        page.position = 0
+        page.packets = [packet]
+        data += page.write()
+    return write(path, data)
+
+
+def make_wavpack(path: str, seconds: int = 2) -> str:
+    """
+    WavPack block header of 16 bit stereo 44100 Hz, no audio
+    """
+    flags = 1 | (9 << 23)
+    return write(path, b'wvpk' + struct.pack('<IHBBIIIII', 24, 0x410, 0, 0, 44100 * seconds, 0, 0, flags, 0))
+
+
+def test_classify_pcm_wav(tmp_path):
+    mfile = mutagen.File(make_wav(f'{tmp_path}/pcm.wav'))
+    assert classify(mfile) == ('pcm', True)
+
+
+def test_classify_mp3_in_wav(tmp_path):
+    mfile = mutagen.File(make_wav(f'{tmp_path}/mp3.wav', formatTag=0x55))
+    assert classify(mfile) == ('mp3', False)
+
+
+def test_stream_info(tmp_path):
+    mfile = mutagen.File(make_wav(f'{tmp_path}/pcm.wav', seconds=2))
+    stream = StreamInfo.from_mfile(mfile)
+
+    assert stream.lossless
+    assert stream.duration == 2
+    assert stream.sampleRate == 8000
+    assert stream.bitsPerSample == 16
+
+
+def test_classify_alac_in_mp4(tmp_path):
+    mfile = mutagen.File(make_alac(f'{tmp_path}/alac.m4a'))
+    assert stream_codec(mfile) == 'alac'
+    assert classify(mfile) == ('alac', True)
+
+    stream = StreamInfo.from_mfile(mfile)
+    assert stream.lossless
+    assert stream.duration == 2
+
+
+def test_classify_flac_in_ogg(tmp_path):
+    mfile = mutagen.File(make_oggflac(f'{tmp_path}/flac.ogg'))
+    assert stream_codec(mfile) == 'flac'
+    assert classify(mfile) == ('flac', True)
+
+    stream = StreamInfo.from_mfile(mfile)
+    assert stream.duration == 2
+    assert stream.sampleRate == 44100
+
+
+def test_classify_wavpack(tmp_path):
+    mfile = mutagen.File(make_wavpack(f'{tmp_path}/a.wv'))
+    assert stream_codec(mfile) == 'wavpack'
+    assert classify(mfile) == ('wavpack', True)
+
+    stream = StreamInfo.from_mfile(mfile)
+    assert stream.duration == 2
+    assert stream.bitsPerSample == 16
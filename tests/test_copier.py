@@ -0,0 +1,96 @@
+import os
+
+import pytest
+from mutagen.id3 import ID3, TIT2, TPE1
+
+from myTunes.service.copier import Copier
+from myTunes.service.payload import payload_hash
+
+
+FRAMES = b'\xff\xfb\x90\x00' + bytes(range(256)) * 4
+
+
+def mp3(path, title='old') -> str:
+    with open(path, 'wb') as f:
+        f.write(FRAMES + b'TAG' + b'\x00' * 125)
+    tags = ID3()
+    tags.add(TIT2(text=title))
+    tags.save(str(path), v1=1)
+    return str(path)
+
+
+def test_splice(tmp_path):
+    src = mp3(tmp_path / 'a.mp3')
+    tags = ID3(src)
+    tags.add(TIT2(text='new'))
+    tags.add(TPE1(text='artist'))
+
+    copier = Copier()
+    copier.copy_to_many(src, [str(tmp_path / 'b.mp3'), str(tmp_path / 'c.mp3')], tags)
+    assert copier.counts['splice'] == 2
+
+    for name in ('b.mp3', 'c.mp3'):
+        out = str(tmp_path / name)
+        assert ID3(out)['TIT2'].text == ['new']
+        assert payload_hash(out) == payload_hash(src)
+        # ID3v1 is written from new tags
+        with open(out, 'rb') as f:
+            f.seek(-128, os.SEEK_END)
+            assert f.read(6) == b'TAGnew'
+    assert ID3(src)['TIT2'].text == ['old']
+
+
+def test_copy(tmp_path):
+    src = mp3(tmp_path / 'a.mp3')
+
+    # tags are not edited, file is copied as is
+    copier = Copier()
+    copier.copy_to_many(src, [str(tmp_path / 'b.mp3')], ID3(src))
+    assert copier.counts['splice'] == 0
+    assert sum(copier.counts.values()) == 1
+    copier.copy_to_many(src, [str(tmp_path / 'c.mp3'), str(tmp_path / 'd.mp3')])
+    assert sum(copier.counts.values()) == 3
+
+    with open(src, 'rb') as f:
+        data = f.read()
+    for name in ('b.mp3', 'c.mp3', 'd.mp3'):
+        with open(tmp_path / name, 'rb') as f:
+            assert f.read() == data
+
+
+@pytest.mark.parametrize('mode', ('hardlink', 'symlink'))
+def test_link(tmp_path, mode):
+    src = mp3(tmp_path / 'a.mp3')
+    dst = tmp_path / 'b.mp3'
+    dst.write_bytes(b'part of interrupted run')
+
+    copier = Copier(mode)
+    copier.copy_to_many(src, [str(dst)])
+    assert copier.counts[mode] == 1
+    assert os.path.samefile(src, dst)
+    assert os.path.islink(dst) == (mode == 'symlink')
+
+
+def test_mode():
+    with pytest.raises(ValueError):
+        Copier('fast')
+
+
+@pytest.mark.skipif(not hasattr(os, 'copy_file_range'), reason='no kernel copy')
+def test_kernel_short(tmp_path, monkeypatch):
+    src = mp3(tmp_path / 'a.mp3')
+    copyRange = os.copy_file_range
+
+    def short(fileIn, fileOut, n):
+        # filesystem stops copy after first chunk
+        if os.lseek(fileIn, 0, os.SEEK_CUR):
+            return 0
+        return copyRange(fileIn, fileOut, min(n, 100))
+
+    monkeypatch.setattr(os, 'copy_file_range', short)
+
+    copier = Copier('kernel')
+    copier.copy_to_many(src, [str(tmp_path / 'b.mp3')])
+    assert copier.counts == {**dict.fromkeys(copier.counts, 0), 'copy': 1}
+    with open(src, 'rb') as f:
+        assert (tmp_path / 'b.mp3').read_bytes() == f.read()
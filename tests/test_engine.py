@@ -0,0 +1,399 @@
+import glob
+import json
+import os
+import sys
+
+import music_tag
+import pytest
+from mutagen.flac import FLAC
+
+from myTunes.service.converterTask import ConverterTask, ConverterBatch
+from myTunes.service.encoder import Encoder, Settings
+from myTunes.service.progress import FFmpegProgress, ProgressParser
+from tests.test_codec import make_alac
+from tests.test_tagEditor import make_flac, make_mp3
+
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='fake ffmpeg is a script with shebang')
+
+
+# encoder with ffmpeg arguments: writes template of output extension or copy of its input, progress in 4 steps.
+# Own options: -delay seconds of whole run. Inputs with 'bad' in name fail the run, inputs with 'flaky'
+# have decode error in batch and no output, like ffmpeg with broken input among others
+FAKE = '''
+import json, os, shutil, sys, time
+args, inputs, outputs, maps, stream, delay = sys.argv[1:], [], [], [], 'stdout', 0.0
+with open({calls!r}, 'a') as f:
+    f.write(json.dumps(args) + chr(10))
+n = 0
+while n < len(args):
+    arg = args[n]
+    if arg in ('-hide_banner', '-nostats', '-y', '-vn'):
+        n += 1
+        continue
+    if arg.startswith('-') and arg != '-':
+        value = args[n + 1]
+        if arg == '-i':
+            inputs.append(value)
+        elif arg == '-map':
+            maps.append(int(value.split(':')[0]))
+        elif arg == '-progress':
+            stream = 'stderr' if value == 'pipe:2' else 'stdout'
+        elif arg == '-delay':
+            delay = float(value)
+        n += 2
+        continue
+    outputs.append((arg, maps[-1] if maps else 0))
+    n += 1
+out = getattr(sys, stream)
+for i, name in enumerate(inputs):
+    if 'bad' in name or 'flaky' in name and len(inputs) > 1:
+        out.write(f'[in#{{i}}] Error while decoding {{name}}' + chr(10))
+        out.flush()
+        if 'bad' in name:
+            sys.exit(1)
+for step in range(1, 5):
+    time.sleep(delay / 4)
+    out.write(f'out_time_us={{step * 250000}}' + chr(10) + 'progress=continue' + chr(10))
+    out.flush()
+for name, index in outputs:
+    if 'flaky' in inputs[index] and len(inputs) > 1:
+        continue
+    template = os.path.join({templates!r}, name[name.rfind('.') + 1:])
+    shutil.copyfile(template if os.path.isfile(template) else inputs[index], name)
+out.write('progress=end' + chr(10))
+'''
+
+
+class FakeSettings(Settings):
+    def __init__(self):
+        self.bitrate = 256
+        self.rate = 'auto'
+        self.format = 'm4a'
+        self.guiSettings = {}
+
+    def args(self):
+        return ['-b:a', f'{self.bitrate}k']
+
+
+class FakeEncoder(Encoder):
+    """
+    encoder process is python running FAKE
+    """
+
+    def __init__(self, script: str, codec='aac', delay=0.0):
+        self.name = 'Fake'
+        self.needWav = False
+        self.settings = FakeSettings()
+        self.script = script
+        self.codec = codec
+        self.delay = delay
+
+    def output_codec(self, settings=None):
+        return self.codec
+
+    def encode_args(self, fileIn, fileOut, settings=None):
+        return [sys.executable, '-c', self.script, '-delay', str(self.delay), '-i', fileIn, '-progress', '-',
+                *(settings or self.settings).args(), fileOut]
+
+    def progress(self, duration=0.0) -> ProgressParser:
+        return FFmpegProgress(duration)
+
+
+class Fake:
+    """
+    fake encoder, ffmpeg with the same program and converter of them
+    """
+
+    def __init__(self, root):
+        from myTunes.service.converter import Converter
+        from myTunes.service.copier import Copier
+        from myTunes.service.ffmpeg import FFmpeg, SettingsFF
+        from myTunes.service.tagEditor import TagEditor
+
+        self.root = root
+        self.callsFile = str(root / 'calls.jsonl')
+        templates = root / 'templates'
+        templates.mkdir()
+        make_alac(str(templates / 'm4a'))
+        self.script = FAKE.format(calls=self.callsFile, templates=str(templates))
+
+        exe = root / 'ffmpeg'
+        exe.write_text(f'#!{sys.executable}\n{self.script}')
+        exe.chmod(0o755)
+        ffmpeg = FFmpeg.__new__(FFmpeg)
+        ffmpeg.name, ffmpeg.needWav, ffmpeg.batch, ffmpeg.exe = 'FFmpeg', False, True, str(exe)
+        ffmpeg.settings = SettingsFF()
+
+        # Converter needs qaac, only parts used by engine are set
+        self.converter = Converter.__new__(Converter)
+        self.converter.ffmpeg = ffmpeg
+        self.converter.qaac = None
+        self.converter.pyav = None
+        self.converter.encoder = FakeEncoder(self.script)
+        self.converter.encoderName = {'FFmpeg': ffmpeg}
+        self.converter.tagEditor = TagEditor()
+        self.converter.copier = Copier()
+        self.converter.cache = None
+        self.converter.profiles = []
+
+    def calls(self):
+        if not os.path.isfile(self.callsFile):
+            return []
+        with open(self.callsFile, 'r') as f:
+            return [json.loads(i) for i in f]
+
+    def engine(self, concurrency=2, **kwargs):
+        from myTunes.service.engine import Engine
+
+        engine = Engine(self.converter, str(self.root / 'out'), concurrency=concurrency, **kwargs)
+        engine.events = []
+        engine.subscribe(engine.events.append)
+        return engine
+
+
+@pytest.fixture
+def fake(tmp_path, cfg, monkeypatch):
+    (tmp_path / 'tmp').mkdir()
+    for name, value in (('tempPath', str(tmp_path / 'tmp')), ('costFile', str(tmp_path / 'costs.json')),
+                        ('journalFile', str(tmp_path / 'journal.jsonl')), ('cachePath', ''),
+                        ('autotune', False), ('sync', False), ('segmentDuration', 0), ('ioThreads', 2)):
+        monkeypatch.setattr(cfg, name, value)
+    (tmp_path / 'src').mkdir()
+    return Fake(tmp_path)
+
+
+def source(fake: Fake, name: str, title='Title', audio=b'') -> music_tag.AudioFile:
+    """
+    tagged FLAC or MP3 source. FLAC audio is any bytes after metadata, they make payload of source
+    """
+    path = str(fake.root / 'src' / name)
+    if name.endswith('.mp3'):
+        make_mp3(path)
+    else:
+        make_flac(path)
+        with open(path, 'ab') as f:
+            f.write(audio or name.encode())
+        tags = FLAC(path)
+        tags['title'] = title
+        tags.save()
+    return music_tag.load_file(path)
+
+
+def kinds(engine, kind=None):
+    events = [i for i in engine.events if i.kind != 'progress']
+    if kind is None:
+        return [i.kind for i in events]
+    return sorted(i.name for i in events if i.kind == kind)
+
+
+def parts(fake: Fake):
+    return glob.glob(str(fake.root / 'out' / '**' / '*.~part*'), recursive=True)
+
+
+def test_convert(fake):
+    engine = fake.engine()
+    engine.run_sync([ConverterTask(source(fake, 'a.flac', 'A'), '/al', 'm4a'),
+                     ConverterTask(source(fake, 'b.flac', 'B'), '/al', 'm4a')])
+
+    assert kinds(engine, 'done') == ['al/a.m4a', 'al/b.m4a']
+    assert kinds(engine).count('start') == 2
+    progress = [i.progress for i in engine.events if i.kind == 'progress']
+    assert any(0 < i.percent < 100 for i in progress)
+    assert engine.audioDone == pytest.approx(2.0)
+
+    assert len(fake.calls()) == 2
+    assert str(music_tag.load_file(str(fake.root / 'out/al/a.m4a'))['tracktitle']) == 'A'
+    assert str(music_tag.load_file(str(fake.root / 'out/al/b.m4a'))['tracktitle']) == 'B'
+    assert not parts(fake)
+
+
+def test_error(fake):
+    engine = fake.engine()
+    engine.run_sync([ConverterTask(source(fake, 'bad.flac'), '', 'm4a'),
+                     ConverterTask(source(fake, 'good.flac'), '', 'm4a')])
+
+    errors = [i for i in engine.events if i.kind == 'error']
+    assert [i.name for i in errors] == ['bad.m4a']
+    assert 'Error while decoding' in errors[0].message
+    assert kinds(engine, 'done') == ['good.m4a']
+    assert not parts(fake)
+
+
+def test_remux_and_copy(fake):
+    # encoder output codec is the codec of MP3 source, so it is remuxed by ffmpeg
+    fake.converter.encoder.codec = 'mp3'
+    engine = fake.engine()
+    engine.run_sync([ConverterTask(source(fake, 'a.mp3'), '', 'm4a')])
+    assert kinds(engine) == ['start', 'remux']
+    assert '-acodec' in fake.calls()[0] and 'copy' in fake.calls()[0]
+    # autotune measures encodes only
+    assert engine.audioDone == 0
+
+    fake.converter.encoder.codec = 'aac'
+    engine = fake.engine()
+    engine.run_sync([ConverterTask(source(fake, 'b.mp3'), '', 'm4a')])
+    # copies have own workers after encode workers
+    assert [(i.kind, i.name) for i in engine.events if i.kind == 'copy'] == [('copy', 'b.mp3')]
+    assert all(i.slot >= engine.ioBase for i in engine.events if i.slot >= 0)
+    assert len(fake.calls()) == 1
+    assert engine.audioDone == 0
+    assert str(music_tag.load_file(str(fake.root / 'out/b.mp3'))['tracktitle']) == 'Title'
+
+
+def test_batch(fake):
+    fake.converter.encoder = fake.converter.ffmpeg
+    engine = fake.engine()
+    tasks = [ConverterTask(source(fake, f'{i}.flac', i), '', 'm4a') for i in ('a', 'flaky', 'c')]
+    engine.run_sync([ConverterBatch(tasks)])
+
+    calls = fake.calls()
+    # one process for batch, failed file is converted again alone
+    assert calls[0].count('-i') == 3
+    assert len(calls) == 2 and calls[1].count('-i') == 1 and 'flaky.flac' in calls[1][calls[1].index('-i') + 1]
+    assert kinds(engine, 'done') == ['a.m4a', 'c.m4a', 'flaky.m4a']
+    assert str(music_tag.load_file(str(fake.root / 'out/c.m4a'))['tracktitle']) == 'c'
+    assert not parts(fake)
+
+
+def test_fanout(fake):
+    from myTunes.service.ffmpeg import SettingsFF
+    from myTunes.service.profile import OutputProfile
+
+    ffmpeg = fake.converter.ffmpeg
+    fake.converter.encoder = ffmpeg
+    fake.converter.profiles = [OutputProfile('phone', str(fake.root / 'phone'), ffmpeg, SettingsFF(bitrate=128)),
+                               OutputProfile('mirror', str(fake.root / 'mirror'))]
+    engine = fake.engine()
+    engine.run_sync([ConverterTask(source(fake, 'a.flac'), '', 'm4a')])
+
+    # source is decoded once for both encoded outputs
+    assert len(fake.calls()) == 1 and fake.calls()[0].count('-map') == 2
+    out = str(fake.root)
+    assert kinds(engine, 'done') == [f'{out}/out/a.m4a', f'{out}/phone/a.m4a']
+    assert kinds(engine, 'copy') == [f'{out}/mirror/a.flac']
+    for name in ('out/a.m4a', 'phone/a.m4a', 'mirror/a.flac'):
+        assert str(music_tag.load_file(f'{out}/{name}')['tracktitle']) == 'Title'
+
+
+def test_cancel(fake):
+    fake.converter.encoder.delay = 4.0
+    engine = fake.engine(concurrency=1)
+
+    def on_event(event):
+        if event.kind == 'progress' and 0 < event.progress.percent < 100 and not engine.cancelled:
+            engine.cancel(kill=True)
+
+    engine.subscribe(on_event)
+    engine.run_sync([ConverterTask(source(fake, f'{i}.flac'), '', 'm4a') for i in 'abc'])
+
+    assert 'done' not in kinds(engine)
+    assert kinds(engine).count('cancel') == 3
+    assert len(fake.calls()) == 1
+    assert not parts(fake)
+    assert not os.listdir(fake.root / 'tmp')
+
+
+def test_timeout(fake):
+    fake.converter.encoder.delay = 8.0
+    engine = fake.engine(timeout=.5)
+    engine.run_sync([ConverterTask(source(fake, 'a.flac'), '', 'm4a')])
+
+    errors = [i for i in engine.events if i.kind == 'error']
+    assert len(errors) == 1 and 'no output' in errors[0].message
+    assert not parts(fake)
+
+
+def test_retag(fake, cfg, monkeypatch):
+    monkeypatch.setattr(cfg, 'sync', True)
+    monkeypatch.setattr(cfg, 'retag', True)
+    afile = source(fake, 'a.flac', 'Old')
+    fake.engine().run_sync([ConverterTask(afile, '', 'm4a')])
+
+    # the same audio with new tags: output gets tags without encoding
+    tags = FLAC(afile.filename)
+    tags['title'] = 'New'
+    tags.save()
+    engine = fake.engine()
+    engine.run_sync([ConverterTask(music_tag.load_file(afile.filename), '', 'm4a')])
+
+    assert kinds(engine) == ['retag']
+    assert len(fake.calls()) == 1
+    assert str(music_tag.load_file(str(fake.root / 'out/a.m4a'))['tracktitle']) == 'New'
+
+
+def test_resume(fake):
+    for i in 'abc':
+        source(fake, f'{i}.flac')
+
+    def tasks():
+        return [ConverterTask(music_tag.load_file(str(fake.root / 'src' / f'{i}.flac')), '', 'm4a') for i in 'abc']
+
+    engine = fake.engine(concurrency=1)
+
+    def on_event(event):
+        if event.kind == 'done':
+            engine.cancel(kill=True)
+
+    engine.subscribe(on_event)
+    engine.run_sync(tasks())
+    assert kinds(engine, 'done') == ['a.m4a']
+    assert len(fake.calls()) == 1
+
+    # stopped job is resumed: output finished by it is kept though outputs are replaced
+    engine = fake.engine(concurrency=1)
+    assert engine.replaceOutFile
+    engine.run_sync(tasks())
+    assert kinds(engine, 'exists') == [str(fake.root / 'out/a.m4a')]
+    assert kinds(engine, 'done') == ['b.m4a', 'c.m4a']
+    assert len(fake.calls()) == 3
+
+    # finished job is not resumed, all outputs are replaced
+    engine = fake.engine(concurrency=1)
+    engine.run_sync(tasks())
+    assert kinds(engine, 'done') == ['a.m4a', 'b.m4a', 'c.m4a']
+    assert len(fake.calls()) == 6
+
+
+def test_edits(fake):
+    # afile of app has tags of file on disk, edits which are not saved come with task
+    mp3 = source(fake, 'a.mp3')
+    flac = source(fake, 'b.flac')
+    engine = fake.engine()
+    engine.run_sync([ConverterTask(mp3, '', 'm4a', {'tracktitle': 'Edited', 'album': ''}),
+                     ConverterTask(flac, '', 'm4a', {'tracktitle': 'Edited'})])
+
+    assert kinds(engine).count('error') == 0
+    for name in ('out/a.mp3', 'out/b.m4a'):
+        output = music_tag.load_file(str(fake.root / name))
+        assert str(output['tracktitle']) == 'Edited'
+        assert str(output['artist']) == 'Artist'
+    assert not str(music_tag.load_file(str(fake.root / 'out/a.mp3'))['album'])
+    # edited MP3 is written by one pass with new tags
+    assert fake.converter.copier.counts['splice'] == 1
+    for afile in (mp3, flac):
+        assert str(afile['tracktitle']) == 'Title'
+        assert str(music_tag.load_file(afile.filename)['tracktitle']) == 'Title'
+
+
+def test_cache(fake):
+    from mutagen.mp4 import MP4
+    from myTunes.service.cache import EncodeCache
+
+    cache = fake.converter.cache = EncodeCache(str(fake.root / 'cache'), 2 ** 20)
+    fake.engine().run_sync([ConverterTask(source(fake, 'a.flac', 'A', b'audio'), '/a', 'm4a')])
+    # encoder copies tags of source into output, like ffmpeg does by default
+    entry = MP4(os.path.join(cache.root, next(iter(cache.entries.values()))['file']))
+    entry['----:com.apple.iTunes:SOURCE'] = [b'a.flac']
+    entry['\xa9nam'] = ['A']
+    entry.save()
+
+    # the same audio with other tags is taken from cache with its own tags
+    engine = fake.engine()
+    engine.run_sync([ConverterTask(source(fake, 'b.flac', 'B', b'audio'), '/b', 'm4a')])
+    assert kinds(engine, 'done') == ['b/b.m4a']
+    assert len(fake.calls()) == 1 and cache.hits == 1
+    assert engine.audioDone == 0
+    output = MP4(str(fake.root / 'out/b/b.m4a'))
+    assert output['\xa9nam'] == ['B']
+    assert '----:com.apple.iTunes:SOURCE' not in output
@@ -0,0 +1,79 @@
+import os
+
+from myTunes.service.journal import Journal, file_hash, part_name
+
+
+def write(path: str, data: bytes) -> str:
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def test_part_name():
+    assert part_name('/out/a b.m4a') == '/out/a b.~part.m4a'
+    assert part_name('/out/a') == '/out/a.~part'
+
+
+def test_resume(tmp_path):
+    src = write(f'{tmp_path}/a.flac', b'flac')
+    out = write(f'{tmp_path}/a.m4a', b'aac data')
+    other = f'{tmp_path}/b.m4a'
+    path = f'{tmp_path}/journal.jsonl'
+
+    journal = Journal(path)
+    journal.begin([src, src])
+    journal.start(out)
+    journal.finish(out, src, 'qaac', file_hash(out))
+    journal.start(other)
+    journal.close()
+    # torn line of crash
+    with open(path, 'a') as f:
+        f.write('{"op": "do')
+
+    journal = Journal(path)
+    assert journal.interrupted == [src, src]
+    assert journal.is_done(out, src, 'qaac')
+    assert not journal.is_done(out, src, 'ffmpeg')
+    assert not journal.is_done(other, src, 'qaac')
+    assert other in journal.started
+
+    journal.end()
+    journal.close()
+    assert Journal(path).interrupted == []
+
+
+def test_changed_files(tmp_path):
+    src = write(f'{tmp_path}/a.flac', b'flac')
+    out = write(f'{tmp_path}/a.m4a', b'aac data')
+    journal = Journal(f'{tmp_path}/journal.jsonl')
+    journal.finish(out, src, 'qaac', file_hash(out))
+
+    # touched output is checked by checksum
+    os.utime(out, ns=(0, 0))
+    assert journal.is_done(out, src, 'qaac')
+
+    write(out, b'aac dat')
+    assert not journal.is_done(out, src, 'qaac')
+    write(out, b'aac dat!')
+    assert not journal.is_done(out, src, 'qaac')
+
+    journal.finish(out, src, 'qaac', file_hash(out))
+    write(src, b'flac 2')
+    assert not journal.is_done(out, src, 'qaac')
+
+
+def test_compact(tmp_path):
+    src = write(f'{tmp_path}/a.flac', b'flac')
+    out = write(f'{tmp_path}/a.m4a', b'aac data')
+    path = f'{tmp_path}/journal.jsonl'
+
+    journal = Journal(path)
+    for _ in range(Journal.COMPACT):
+        journal.start(out)
+        journal.finish(out, src, 'qaac', file_hash(out))
+    journal.close()
+
+    journal = Journal(path)
+    with open(path) as f:
+        assert len(f.readlines()) == 1
+    assert journal.is_done(out, src, 'qaac')
@@ -0,0 +1,58 @@
+import os
+
+from myTunes.service.manifest import SyncManifest, MANIFEST_NAME
+
+
+def write(path: str, data: bytes = b'data') -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def test_is_current(tmp_path):
+    src = write(f'{tmp_path}/src/a.flac')
+    out = write(f'{tmp_path}/out/a/a.m4a')
+    extra = write(f'{tmp_path}/car/a.m4a')
+    profile = SyncManifest.profile_hash('qaac --cbr 320')
+
+    manifest = SyncManifest(f'{tmp_path}/out')
+    manifest.add(src, [out, extra], profile)
+    manifest.save()
+
+    manifest = SyncManifest(f'{tmp_path}/out')
+    entry = manifest.entries[os.path.abspath(src)]
+    # outputs inside root are relative to it
+    assert entry['outputs'] == sorted(['a/a.m4a', os.path.abspath(extra)])
+    assert manifest.is_current(src, profile)
+    assert not manifest.is_current(src, SyncManifest.profile_hash('qaac --cbr 256'))
+
+    os.remove(extra)
+    assert not manifest.is_current(src, profile)
+
+    write(extra)
+    write(src, b'new data')
+    assert not manifest.is_current(src, profile)
+
+
+def test_orphans(tmp_path):
+    profile = SyncManifest.profile_hash('copy')
+    manifest = SyncManifest(f'{tmp_path}/out')
+    kept = write(f'{tmp_path}/src/a.flac')
+    removed = write(f'{tmp_path}/src/b.flac')
+    unmounted = write(f'{tmp_path}/usb/c.flac')
+    for src in (kept, removed, unmounted):
+        manifest.add(src, [f'{tmp_path}/out/{os.path.basename(src)}'], profile)
+
+    os.remove(removed)
+    os.remove(unmounted)
+    os.rmdir(f'{tmp_path}/usb')
+
+    assert manifest.orphans() == [(os.path.abspath(removed), [os.path.abspath(f'{tmp_path}/out/b.flac')])]
+    manifest.remove(removed)
+    assert manifest.orphans() == []
+
+
+def test_broken_manifest(tmp_path):
+    write(f'{tmp_path}/out/{MANIFEST_NAME}', b'{"sources": ')
+    assert SyncManifest(f'{tmp_path}/out').entries == {}
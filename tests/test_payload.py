@@ -0,0 +1,72 @@
+import struct
+
+from myTunes.service.payload import payload_hash
+
+
+FRAMES = b'\xff\xfb\x90\x00' + bytes(range(256)) * 4
+
+
+def write(path, data: bytes) -> str:
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+def id3v2(size: int) -> bytes:
+    syncsafe = bytes((size >> shift) & 0x7f for shift in (21, 14, 7, 0))
+    return b'ID3\x04\x00\x00' + syncsafe + b'\x00' * size
+
+
+def ape(items: bytes) -> bytes:
+    footer = b'APETAGEX' + struct.pack('<IIII', 2000, len(items) + 32, 1, 0x80000000) + b'\x00' * 8
+    header = b'APETAGEX' + struct.pack('<IIII', 2000, len(items) + 32, 1, 0xa0000000) + b'\x00' * 8
+    return header + items + footer
+
+
+def flac(md5: bytes, tags: bytes) -> bytes:
+    streaminfo = b'\x00' * 18 + md5
+    return (b'fLaC' + bytes([0]) + len(streaminfo).to_bytes(3, 'big') + streaminfo
+            + bytes([0x84]) + len(tags).to_bytes(3, 'big') + tags + FRAMES)
+
+
+def atom(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I4s', len(data) + 8, kind) + data
+
+
+def test_frames(tmp_path):
+    plain = payload_hash(write(tmp_path / 'a.mp3', FRAMES))
+    tagged = payload_hash(write(tmp_path / 'b.mp3', id3v2(300) + FRAMES + ape(b'x' * 50) + b'TAG' + b'\x00' * 125))
+
+    assert plain.startswith('frames:')
+    assert plain == tagged
+    assert payload_hash(write(tmp_path / 'c.mp3', FRAMES[:-1])) != plain
+
+
+def test_flac(tmp_path):
+    md5 = bytes(range(1, 17))
+    a = payload_hash(write(tmp_path / 'a.flac', flac(md5, b'artist=a')))
+    b = payload_hash(write(tmp_path / 'b.flac', id3v2(10) + flac(md5, b'artist=bbb')))
+    assert a == b == f'flac:{md5.hex()}'
+
+    # no MD5 in STREAMINFO, frames are hashed
+    a = payload_hash(write(tmp_path / 'a.flac', flac(bytes(16), b'artist=a')))
+    b = payload_hash(write(tmp_path / 'b.flac', flac(bytes(16), b'artist=bbb')))
+    assert a == b and a.startswith('frames:')
+
+
+def test_containers(tmp_path):
+    ftyp = atom(b'ftyp', b'M4A \x00\x00\x00\x00')
+    a = payload_hash(write(tmp_path / 'a.m4a', ftyp + atom(b'moov', b'1' * 40) + atom(b'mdat', FRAMES)))
+    b = payload_hash(write(tmp_path / 'b.m4a', ftyp + atom(b'mdat', FRAMES) + atom(b'moov', b'2' * 90)))
+    assert a == b and a.startswith('mdat:')
+
+    fmt = b'fmt ' + struct.pack('<I', 16) + b'\x00' * 16
+    a = payload_hash(write(tmp_path / 'a.wav', b'RIFF\x00\x00\x00\x00WAVE' + fmt
+                           + b'data' + struct.pack('<I', len(FRAMES)) + FRAMES))
+    b = payload_hash(write(tmp_path / 'b.wav', b'RIFF\x00\x00\x00\x00WAVE' + fmt + b'LIST' + struct.pack('<I', 3)
+                           + b'abc\x00' + b'data' + struct.pack('<I', len(FRAMES)) + FRAMES))
+    assert a == b and a.startswith('pcm:')
+
+
+def test_unknown(tmp_path):
+    assert payload_hash(write(tmp_path / 'a.ogg', b'OggS' + FRAMES)) == ''
@@ -0,0 +1,61 @@
+import os
+from types import SimpleNamespace
+
+from myTunes.service.converterTask import ConverterTask
+from myTunes.service.planner import Plan, PlanItem, estimate_size
+
+
+def task(name: str, tree='sub') -> ConverterTask:
+    afile = SimpleNamespace(filename=f'/music/{name}', mfile=SimpleNamespace(info=None))
+    return ConverterTask(afile, tree, 'm4a')
+
+
+def test_scan(tmp_path):
+    root = tmp_path / 'out'
+    (root / 'sub').mkdir(parents=True)
+    (root / 'sub' / 'a.m4a').write_bytes(b'1')
+
+    plan = Plan()
+    plan.scan([f'{root}/sub/', f'{root}/sub', f'{root}/new/dir'])
+    assert plan.exists(f'{root}/sub/a.m4a')
+    assert not plan.exists(f'{root}/sub/b.m4a')
+    assert plan.ready(f'{root}/sub/b.m4a')
+    assert not plan.ready(f'{root}/new/dir/b.m4a')
+
+    assert plan.create_dirs() == []
+    assert os.path.isdir(root / 'new' / 'dir')
+    assert plan.ready(f'{root}/new/dir/b.m4a')
+    assert not plan.missing
+
+
+def test_claim():
+    plan = Plan()
+    outputs = lambda t: [f'out/{t.fileOut}', f'car/{t.fileOut}']
+    tasks = [task('in.flac'), task('in.wav'), task('in.wv'), task('in.wav', 'other')]
+    files = [plan.claim(i, outputs) for i in tasks]
+
+    assert files[0] == ['out/sub/in.m4a', 'car/sub/in.m4a']
+    assert files[1] == ['out/sub/in (2).m4a', 'car/sub/in (2).m4a']
+    assert tasks[2].fileOut == 'sub/in (3).m4a'
+    assert tasks[2].copyName == 'in (3).wv'
+    assert tasks[3].fileOut == 'other/in.m4a'
+    assert plan.renamed == [('/music/in.wav', 'in (2)'), ('/music/in.wv', 'in (3)')]
+
+
+def test_report():
+    plan = Plan()
+    plan.add(PlanItem(task('a.flac'), outputs=[('convert', 'a.m4a', 100), ('copy', 'a.flac', 300)]), 60.0)
+    plan.add(PlanItem(task('b.mp3'), outputs=[('exists', 'b.mp3', 50)]), 0.0)
+    plan.add(PlanItem(task('c.txt'), 'skip'), 0.0)
+
+    assert [i.kind for i in plan.items] == ['convert', 'exists', 'skip']
+    assert plan.size == 400 and plan.duration == 60.0
+    assert plan.counts() == {'convert': 1, 'remux': 0, 'copy': 1, 'exists': 1, 'skip': 1, 'unchanged': 0}
+    assert plan.report()[0] == '3 sources: 1 convert, 1 copy, 1 exists, 1 skip'
+
+
+def test_estimate_size():
+    cbr = SimpleNamespace(bitrate=320, mode='cbr')
+    assert estimate_size(cbr, 'aac', 100, 10 ** 7) == 4000000
+    assert estimate_size(SimpleNamespace(bitrate=90, mode='tvbr'), 'aac', 100, 0) == 3200000
+    assert estimate_size(SimpleNamespace(), 'wavpack', 100, 12345) == 12345
@@ -0,0 +1,55 @@
+from myTunes.service.progress import FFmpegProgress, QaacProgress
+
+
+FFMPEG_OUTPUT = (
+    b'out_time_us=5000000\nout_time=00:00:05.000000\ntotal_size=1024\nspeed=10.0x\nprogress=continue\n'
+    b'[aac @ 0x1] Error while encoding\n'
+    b'out_time_us=10000000\nout_time=00:00:10.000000\ntotal_size=2048\nspeed=20.0x\nprogress=end\n'
+)
+
+
+def test_ffmpeg_progress():
+    parser = FFmpegProgress(duration=20, interval=0)
+    # blocks are not aligned with lines
+    events = parser.feed(FFMPEG_OUTPUT[:30]) + parser.feed(FFMPEG_OUTPUT[30:])
+
+    assert [e.percent for e in events if not e.error] == [25, 50]
+    assert [e.error for e in events if e.error] == ['[aac @ 0x1] Error while encoding']
+
+    last = events[-1]
+    assert last.outTime == 10
+    assert last.size == 2048
+    assert last.speed == 20
+    assert last.eta == 0.5
+
+    assert parser.finish().percent == 100
+
+
+def test_ffmpeg_progress_interval():
+    parser = FFmpegProgress(duration=20, interval=60)
+    events = parser.feed(FFMPEG_OUTPUT)
+
+    # first event and the end are emitted, second block is skipped by interval
+    assert [e.percent for e in events if not e.error] == [25, 50]
+    parser = FFmpegProgress(duration=20, interval=60)
+    events = parser.feed(FFMPEG_OUTPUT.replace(b'progress=end', b'progress=continue'))
+    assert [e.percent for e in events if not e.error] == [25]
+
+
+def test_qaac_progress():
+    parser = QaacProgress(interval=0)
+    events = parser.feed(b'[45.5%] 0:30.000/1:05.000 (30.0x), ETA 0:01.500\r[50.0%] 0:32.5')
+
+    assert len(events) == 1
+    assert events[0].percent == 45
+    assert events[0].outTime == 30
+    assert events[0].speed == 30
+    assert events[0].eta == 1.5
+
+
+def test_qaac_progress_stdin():
+    parser = QaacProgress(duration=60, interval=0)
+    events = parser.feed(b'0:30.000 (15.0x)\r')
+
+    assert events[0].percent == 50
+    assert events[0].eta == 2
@@ -0,0 +1,52 @@
+import os
+import wave
+
+import pytest
+
+from myTunes.service.cancel import CancelToken, Cancelled
+
+
+av = pytest.importorskip('av')
+
+
+@pytest.fixture
+def pyav(cfg):
+    from myTunes.service.pyav import PyAV
+    # only in-process encode is tested, commands are not built
+    return PyAV(None)
+
+
+def make_wav(path: str, seconds=2.0, rate=44100) -> str:
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(b'\x00\x01\x00\xff' * int(seconds * rate))
+    return path
+
+
+def test_encode(tmp_path, pyav):
+    fileOut = str(tmp_path / 'out.m4a')
+    events = list(pyav.encode(make_wav(str(tmp_path / 'in.wav')), fileOut, interval=0))
+
+    assert events[-1].percent == 100
+    assert all(i.percent < 100 for i in events[:-1])
+    assert events[-1].outTime == pytest.approx(2.0, abs=.1)
+    assert events[-1].size == os.path.getsize(fileOut) > 0
+    with av.open(fileOut) as f:
+        assert f.streams.audio[0].codec_context.name == 'aac'
+
+
+def test_cancel(tmp_path, pyav):
+    token = CancelToken()
+    frames = []
+
+    def on_frame(frame) -> None:
+        frames.append(frame.samples)
+        token.cancel(kill=False)
+
+    with pytest.raises(Cancelled):
+        list(pyav.encode(make_wav(str(tmp_path / 'in.wav')), str(tmp_path / 'out.m4a'), token=token,
+                         onFrame=on_frame))
+    # frame of cancel is the last one
+    assert len(frames) == 1
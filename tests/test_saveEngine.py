@@ -0,0 +1,74 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from myTunes.service.saveEngine import SaveEngine, SaveJob
+
+
+class FakeFile(dict):
+    def __init__(self, filename: str, **tags):
+        super().__init__(tags)
+        self.filename = filename
+
+    def get(self, name):
+        return SimpleNamespace(type=int if name == 'tracknumber' else str)
+
+
+def test_apply():
+    afile = FakeFile('a.mp3', album='old', genre='rock')
+    SaveJob(afile, {'album': 'new', 'genre': '', 'tracknumber': '3', 'artwork': b'img'}).apply(afile)
+    assert afile == {'album': 'new', 'tracknumber': 3, 'artwork': b'img'}
+
+
+def test_run():
+    running = set()
+    peak = []
+    lock = threading.Lock()
+
+    saved = {}
+
+    def save(afile) -> bool:
+        saved[afile.filename] = afile
+        if afile.filename == 'bad':
+            raise OSError('read only')
+        with lock:
+            running.add(afile.filename)
+            peak.append(len(running))
+        time.sleep(.02)
+        with lock:
+            running.discard(afile.filename)
+        return afile.filename == '0'
+
+    engine = SaveEngine(FakeFile, save, threads=3)
+    jobs = [SaveJob(FakeFile(str(i)), {'album': 'x'}) for i in range(10)] + [SaveJob(FakeFile('bad'), {})]
+    batches = []
+    engine.run(jobs, batches.append, interval=0.05)
+
+    results = {r.job.afile.filename: r for b in batches for r in b}
+    assert len(results) == 11 and engine.done == 11
+    assert len(batches) < 11
+    assert max(peak) == 3
+    assert results['0'].kind == 'rewritten' and results['1'].kind == 'save'
+    assert results['bad'].kind == 'error' and results['bad'].message == 'read only'
+    # copies are saved, files of jobs are not changed by workers
+    assert all(saved[j.afile.filename]['album'] == 'x' and 'album' not in j.afile for j in jobs[:10])
+
+
+def test_cancel():
+    started = []
+
+    def save(afile) -> bool:
+        started.append(afile.filename)
+        engine.cancel()
+        return False
+
+    engine = SaveEngine(FakeFile, save, threads=1)
+    batches = []
+    engine.run([SaveJob(FakeFile(str(i)), {}) for i in range(5)], batches.append)
+    kinds = [r.kind for b in batches for r in b]
+    assert started == ['0']
+    assert sorted(kinds) == ['cancel'] * 4 + ['save']
+
+    # next run starts with new token
+    engine.run([SaveJob(FakeFile('5'), {})], batches.append)
+    assert started == ['0', '5']
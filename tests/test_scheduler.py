@@ -0,0 +1,62 @@
+import pytest
+
+from myTunes.service.codec import StreamInfo
+from myTunes.service.converterTask import ConverterBatch
+from myTunes.service.scheduler import CostModel, Scheduler
+
+
+class Task:
+    def __init__(self, name: str, duration: float, lossless=True):
+        self.name = name
+        self.stream = StreamInfo('flac' if lossless else 'mp3', duration, lossless=lossless)
+
+
+def take_all(scheduler: Scheduler, slot: int):
+    tasks = []
+    while (task := scheduler.next(slot)) is not None:
+        tasks.append(task.name)
+    return tasks
+
+
+def test_lpt_plan():
+    tasks = [Task(str(i), d) for i, d in enumerate((60, 600, 120, 4200, 300))]
+    scheduler = Scheduler(tasks, 2, CostModel(), 'FFmpeg')
+
+    # long mix is alone, other tasks are on second worker
+    assert [t.name for _, t in scheduler.queues[0]] == ['3']
+    assert [t.name for _, t in scheduler.queues[1]] == ['1', '4', '2', '0']
+
+
+def test_work_stealing():
+    tasks = [Task(str(i), d) for i, d in enumerate((300, 200, 100, 50))]
+    scheduler = Scheduler(tasks, 2, CostModel(), 'FFmpeg')
+
+    assert scheduler.next(0).name == '0'
+    # worker 0 is done with own tasks and steals the longest task of worker 1
+    assert take_all(scheduler, 0) == ['3', '1', '2']
+    assert scheduler.next(1) is None
+
+
+def test_fifo():
+    tasks = [Task(str(i), d) for i, d in enumerate((60, 600, 120))]
+    scheduler = Scheduler(tasks, 3, CostModel(), 'FFmpeg', lpt=False)
+
+    assert scheduler.next(2).name == '0'
+    assert scheduler.next(0).name == '1'
+    assert scheduler.next(1).name == '2'
+
+
+def test_cost_model(tmp_path):
+    model = CostModel(f'{tmp_path}/costs.json')
+    copy = Task('copy', 100, lossless=False)
+    batch = ConverterBatch([Task('a', 10), Task('b', 20)])
+
+    assert model.cost('QAAC', copy) == 100 * CostModel.COPY
+    assert model.cost('QAAC', batch) == 30 * CostModel.ENCODE
+
+    model.learn('QAAC:flac', 100, 10)
+    model.learn('QAAC:flac', 100, 20)
+    assert model.factor('QAAC:flac') == pytest.approx(0.1 + CostModel.ALPHA * 0.1)
+    model.save()
+
+    assert CostModel(f'{tmp_path}/costs.json').factors == model.factors
@@ -0,0 +1,53 @@
+import pytest
+
+from myTunes.service.segment import Segment, concat_list, frame_grid, plan_segments
+
+
+def test_frame_grid():
+    # AAC and HE-AAC frames at 44.1 kHz and at 48 kHz
+    grid = frame_grid(44100)
+    for frame in (1024 / 44100, 2048 / 44100, 1024 / 48000, 2048 / 48000):
+        assert grid / frame == pytest.approx(round(grid / frame))
+
+    assert frame_grid(48000) == pytest.approx(2048 / 48000)
+
+
+def test_plan_segments():
+    grid = frame_grid(44100)
+    segments = plan_segments(3600, 4, grid)
+
+    assert len(segments) == 4
+    assert segments[0].start == 0 and segments[0].preroll == 0
+    for prev, segment in zip(segments, segments[1:]):
+        # no gaps and borders on grid
+        assert prev.start + prev.length == pytest.approx(segment.start)
+        assert segment.start / grid == pytest.approx(round(segment.start / grid))
+        assert segment.preroll > 0
+
+    last = segments[-1]
+    assert last.length == 0 and last.postroll == 0
+    assert last.span() == (last.start - last.preroll, 0.0)
+
+
+def test_plan_short_source():
+    assert len(plan_segments(10, 1, frame_grid(44100))) == 1
+    # segments shorter than grid are not made
+    assert len(plan_segments(8, 4, frame_grid(44100))) == 1
+
+
+def test_packets():
+    frame = 1024 / 44100
+    segment = Segment(10 * frame * 32, 100 * frame * 32, 32 * frame, 32 * frame)
+
+    first, end = segment.packets(frame)
+    assert first == 32
+    assert end == 32 + 3200
+    assert segment.span() == pytest.approx((segment.start - 32 * frame, 3264 * frame))
+
+    assert Segment(5.0, 0.0, 1.0).packets(frame)[1] == 0
+
+
+def test_concat_list():
+    text = concat_list(['/tmp/a.m4a', "C:\\tmp\\it's.m4a"])
+
+    assert text.splitlines() == ['ffconcat version 1.0', "file '/tmp/a.m4a'", "file 'C:/tmp/it'\\''s.m4a'"]
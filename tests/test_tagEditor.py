@@ -0,0 +1,97 @@
+import os
+import shutil
+import struct
+
+import music_tag
+import mutagen
+import pytest
+from mutagen.flac import FLAC
+from mutagen.id3 import ID3, TALB, TDRC, TIT2, TPE1, TRCK
+
+from tests.test_codec import make_alac, make_wavpack, write
+
+
+SETTINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'myTunes', 'settings.ini')
+FRAMES = (b'\xff\xfb\x90\x00' + b'\x00' * 413) * 8
+
+
+@pytest.fixture(scope='module')
+def tagEditor(tmp_path_factory):
+    # settings are read from working directory on first import of config
+    root = tmp_path_factory.mktemp('config')
+    shutil.copyfile(SETTINGS, root / 'settings.ini')
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        from myTunes.service.tagEditor import TagEditor
+    finally:
+        os.chdir(cwd)
+    return TagEditor()
+
+
+def make_flac(path: str) -> str:
+    # 16 bit stereo 44100 Hz, 1 second, no frames. Full date and number with total are read by fallbacks
+    streaminfo = struct.pack('>HH3s3s', 4096, 4096, b'\0' * 3, b'\0' * 3)
+    streaminfo += ((44100 << 44) | (1 << 41) | (15 << 36) | 44100).to_bytes(8, 'big') + b'\0' * 16
+    write(path, b'fLaC' + b'\x80' + len(streaminfo).to_bytes(3, 'big') + streaminfo)
+
+    tags = FLAC(path)
+    tags.update({'artist': 'Artist', 'title': 'Title', 'album': 'Album', 'date': '2001-05-03',
+                 'tracknumber': '3/12', 'tracktotal': '12', 'composer': 'Composer'})
+    tags.save()
+    return path
+
+
+def make_mp3(path: str) -> str:
+    write(path, FRAMES)
+    tags = ID3()
+    for frame in (TPE1(text='Artist'), TIT2(text='Title'), TALB(text='Album'), TDRC(text='2001'),
+                  TRCK(text='3/12')):
+        tags.add(frame)
+    tags.save(path)
+    return path
+
+
+@pytest.mark.parametrize('source', (make_flac, make_mp3))
+def test_transfer_to_mp4(tmp_path, tagEditor, source):
+    metadata = music_tag.load_file(source(str(tmp_path / f'in.{source.__name__[5:]}')))
+    fileOut = make_alac(str(tmp_path / 'out.m4a'))
+
+    tagEditor.save_file(fileOut, metadata)
+    afile = music_tag.load_file(fileOut)
+    for name in ('artist', 'tracktitle', 'album'):
+        assert str(afile[name]) == str(metadata[name])
+    assert afile['year'].value == 2001
+    assert afile['tracknumber'].value == 3
+    assert afile['totaltracks'].value == 12
+
+
+def test_transfer_plan(tagEditor):
+    plan = tagEditor.transfer_plan(music_tag.flac.FlacFile, music_tag.mp4.Mp4File)
+    assert plan is tagEditor.transfer_plan(music_tag.flac.FlacFile, music_tag.mp4.Mp4File)
+    assert {'artist', 'tracktitle', 'year', 'tracknumber', 'artwork'} <= set(plan.keys)
+    assert not set(plan.keys) & set(plan.dropped)
+    assert tagEditor.transfer_plan(music_tag.id3.Mp3File, music_tag.mp4.Mp4File) is not plan
+
+
+def test_padding(tmp_path, tagEditor):
+    flac = mutagen.File(make_flac(str(tmp_path / 'a.flac')))
+    mp3 = mutagen.File(make_mp3(str(tmp_path / 'a.mp3')))
+    wavpack = mutagen.File(make_wavpack(str(tmp_path / 'a.wv')))
+    wavpack.add_tags()
+    assert tagEditor._has_padding(flac)
+    assert tagEditor._has_padding(mp3)
+    assert not tagEditor._has_padding(wavpack)
+
+    # tags which outgrow padding rewrite file once, then fit into reserved padding
+    afile = music_tag.load_file(flac.filename)
+    afile['comment'] = 'x' * (tagEditor.padding + 1000)
+    assert tagEditor.save(afile)
+    afile = music_tag.load_file(flac.filename)
+    afile['comment'] = 'y' * 100
+    assert not tagEditor.save(afile)
+    assert str(music_tag.load_file(flac.filename)['comment']) == 'y' * 100
+
+    afile = music_tag.load_file(wavpack.filename)
+    afile['comment'] = 'z'
+    assert not tagEditor.save(afile)